@@ -2,7 +2,7 @@
 Application configuration
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -31,8 +31,17 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
-    # Rate Limiting
+    # Rate Limiting (per client and route group; 0 disables)
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_ROUTES: Dict[str, int] = {
+        "/api/models/generate": 20,
+        "/api/models/jobs": 20,  # queued generations, held to the generate limit
+        "/api/models/test-connection": 5,
+    }
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per process) or "redis" (shared)
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_MAX_CLIENTS: int = 100000
+    TRUSTED_PROXY_HOPS: int = 0  # proxies appending X-Forwarded-For in front; 0 ignores it
     
     # AI Provider API Keys (should be set via environment variables)
     OPENAI_API_KEY: str = ""
@@ -40,6 +49,135 @@ class Settings(BaseSettings):
     DEEPSEEK_API_KEY: str = ""
     KIMI_API_KEY: str = ""
     
+    # Extra keys per provider, comma-separated; calls are spread across the pool
+    OPENAI_API_KEYS: str = ""
+    ANTHROPIC_API_KEYS: str = ""
+    DEEPSEEK_API_KEYS: str = ""
+    KIMI_API_KEYS: str = ""
+    KEY_POOL_COOLDOWN: float = 10.0  # seconds after a 429 without Retry-After, doubling
+    KEY_POOL_MAX_COOLDOWN: float = 300.0
+    KEY_POOL_AUTH_COOLDOWN: float = 900.0  # seconds out of rotation after a 401/403
+    KEY_POOL_MAX_ATTEMPTS: int = 3  # keys tried per request when one is rate limited
+    
+    # AI Provider Base URLs (point at a mock or proxy for testing)
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    ANTHROPIC_BASE_URL: str = "https://api.anthropic.com"
+    DEEPSEEK_BASE_URL: str = "https://api.deepseek.com/v1"
+    KIMI_BASE_URL: str = "https://api.moonshot.cn/v1"
+    
+    # Token Estimation (checked against the model's context window before sending)
+    CONTEXT_OVERFLOW_POLICY: str = "clamp"  # "clamp" lowers max_tokens to fit, "reject" refuses
+    TOKEN_ESTIMATE_MARGIN: float = 0.1  # safety margin for estimates without a local tokenizer
+    TOKEN_COUNT_CACHE_SIZE: int = 1024  # memoized system prompt counts
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = {}  # context window overrides by exact model name
+    
+    # Prompt Prefix Caching (provider-side)
+    PROMPT_CACHE_ENABLED: bool = True  # mark long Anthropic system prompts cacheable
+    PROMPT_CACHE_MIN_TOKENS: int = 1024  # smallest cacheable prefix (doubled for Haiku)
+    PROMPT_CACHE_KEY_ENABLED: bool = False  # send OpenAI prompt_cache_key per system prompt
+    ANTHROPIC_BETA: str = ""  # anthropic-beta header, for API versions gating prompt caching
+    
+    # Near-Duplicate Prompt Index
+    PROMPT_INDEX_ENABLED: bool = True
+    PROMPT_INDEX_MAX_ENTRIES: int = 50000  # prompts kept, oldest evicted first
+    PROMPT_INDEX_MAX_AGE: int = 86400  # seconds a response stays reusable
+    PROMPT_INDEX_SHINGLE_SIZE: int = 2  # longest shingle in words (1- to n-grams)
+    PROMPT_INDEX_BANDS: int = 24  # LSH bands; MinHash size is bands * rows
+    PROMPT_INDEX_ROWS: int = 5  # detection floor is (1/bands)^(1/rows), ~0.53
+    PROMPT_INDEX_SURFACE_THRESHOLD: float = 0.0  # report same-session matches at least this similar (0 = off)
+    
+    # Generation Scheduling (per provider: interactive ahead of bulk, fair across sessions)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_MAX_CONCURRENCY: int = 32  # provider calls running at once
+    SCHEDULER_INTERACTIVE_RESERVE: int = 8  # slots bulk work never takes
+    SCHEDULER_MAX_QUEUE: int = 1000  # queued calls; interactive arrivals preempt queued bulk when full
+    SCHEDULER_SESSION_WEIGHTS: Dict[str, float] = {}  # fair-share weight by session_id (default 1)
+    
+    # Generation Jobs (durable queue for long-running generations)
+    JOBS_DB_PATH: str = "./jobs.db"  # SQLite file holding queued jobs and results
+    JOBS_WORKERS: int = 4  # jobs run at once by this process; 0 only accepts them
+    JOBS_MAX_PENDING: int = 10000  # queued and running jobs before submissions are refused
+    JOBS_MAX_ATTEMPTS: int = 3
+    JOBS_RETRY_BACKOFF: float = 5.0  # seconds before the first retry, doubling
+    JOBS_RUN_TIMEOUT: float = 900.0  # seconds per attempt; an abandoned job is retried after this
+    JOBS_RESULT_TTL: int = 86400  # seconds finished jobs and idempotency keys are kept
+    JOBS_POLL_INTERVAL: float = 1.0  # seconds between checks for retries and other processes' jobs
+    
+    # Conversation History (server-side multi-turn context per session_id)
+    CONVERSATION_HISTORY_TOKENS: int = 4000  # most history tokens sent with a request
+    CONVERSATION_OVERFLOW_POLICY: str = "truncate"  # "truncate" drops old turns, "summarize" folds them
+    CONVERSATION_SUMMARY_TOKENS: int = 512  # max_tokens of rolling summaries
+    CONVERSATION_MAX_SESSIONS: int = 10000  # held in memory, least recently used evicted
+    CONVERSATION_MAX_TURNS: int = 200  # per session
+    CONVERSATION_MAX_AGE: int = 86400  # seconds idle before a conversation is forgotten
+    CONVERSATION_DB_PATH: str = ""  # SQLite file for persistence; empty keeps memory only
+    
+    # Feedback Retention (old raw feedback compacted into per-day rollups)
+    FEEDBACK_RETENTION_DAYS: int = 0  # days raw records are kept; 0 keeps them forever
+    FEEDBACK_ARCHIVE_PATH: str = ""  # gzip JSON-lines file compacted records are appended to; empty drops them
+    FEEDBACK_COMPACTION_INTERVAL: float = 3600.0  # seconds between compaction runs
+    FEEDBACK_COMPACTION_BATCH: int = 1000  # records compacted per step; writes proceed between steps
+    
+    # Feedback Search (BM25 full-text index over comments)
+    SEARCH_BM25_K1: float = 1.2  # term frequency saturation
+    SEARCH_BM25_B: float = 0.75  # comment length normalization, 0-1
+    SEARCH_TIMEOUT: float = 10.0  # seconds before a search is abandoned with 504
+    
+    # Analytics Cache
+    ANALYTICS_CACHE_SIZE: int = 256
+    ANALYTICS_CACHE_MAX_AGE: int = 3600  # seconds, for closed time windows
+    
+    # Model Leaderboard (Bradley-Terry scores from ratings and pairwise preferences)
+    LEADERBOARD_PRIOR_SD: float = 350.0  # Elo points an unrated model may plausibly be from 1500
+    LEADERBOARD_RATING_WEIGHT: float = 1.0  # games against the 3/5 reference one 1-5 rating counts as
+    LEADERBOARD_REFIT_INTERVAL: float = 60.0  # seconds between full refits after changes; 0 disables
+    LEADERBOARD_REFIT_ITERATIONS: int = 100
+    
+    # Live Analytics Streaming
+    LIVE_ANALYTICS_INTERVAL: float = 1.0  # seconds between coalesced updates
+    LIVE_ANALYTICS_QUEUE_SIZE: int = 32
+    LIVE_ANALYTICS_MAX_OVERFLOWS: int = 3
+    LIVE_ANALYTICS_KEEPALIVE: float = 15.0
+    
+    # Usage Accounting
+    USAGE_BUCKET_SECONDS: int = 3600
+    USAGE_RETENTION_HOURS: int = 24 * 30
+    USAGE_MAX_SESSIONS: int = 10000
+    
+    # Worker Pool (analytics, exports, rollups)
+    WORKER_POOL_SIZE: int = 2  # 0 runs bulk computations inline on the event loop
+    WORKER_POOL_MAX_PENDING: int = 64
+    WORKER_POOL_SWITCH_INTERVAL: float = 0.001  # seconds between forced GIL switches; 0 keeps Python's 5 ms
+    ANALYTICS_TIMEOUT: float = 30.0  # seconds
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # "text" or "json"
+    LOG_SAMPLE_RATE: float = 1.0  # fraction of successful requests to log
+    
+    # Response Compression (brotli is used only if the package is installed)
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; 0 disables compression
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    
+    # Request Tracing
+    SERVER_TIMING_ENABLED: bool = True  # per-phase Server-Timing response header
+    TRACING_EXPORT_FILE: str = ""  # append OTLP/JSON traces here; empty disables export
+    
+    # Profiling (off unless an admin token or sampling is configured)
+    PROFILING_ADMIN_TOKEN: str = ""  # enables X-Profile requests and /api/profiles
+    PROFILING_SAMPLE_EVERY: int = 0  # profile 1 in N requests; 0 disables sampling
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_MAX_PROFILES: int = 50
+    PROFILING_INTERVAL: float = 0.001  # seconds between samples (pyinstrument)
+    PROFILING_FORMAT: str = "speedscope"  # "speedscope" or "html"; "pstats" without pyinstrument
+    
+    # Startup and Shutdown
+    STARTUP_WARM_CONNECTIONS: bool = False  # open provider connections before reporting ready
+    SHUTDOWN_DRAIN_TIMEOUT: float = 30.0  # seconds to let in-flight generations finish
+    PROVIDER_MAX_CONNECTIONS: int = 100
+    PROVIDER_MAX_KEEPALIVE: int = 20
+    
     # Request Timeouts
     REQUEST_TIMEOUT: int = 60
     
@@ -1,6 +1,7 @@
 """
 Custom exceptions for the application
 """
+from typing import Optional
 
 
 class HFRLException(Exception):
@@ -42,3 +43,89 @@ class ResourceNotFoundError(HFRLException):
             f"{resource} with ID {resource_id} not found",
             status_code=404
         )
+
+
+class WorkerPoolSaturatedError(HFRLException):
+    """Raised when too many background computations are already queued"""
+    def __init__(self):
+        super().__init__(
+            "Server is busy with other computations, try again later",
+            status_code=503
+        )
+
+
+class ServiceDrainingError(HFRLException):
+    """Raised when new work arrives while the server is shutting down"""
+    def __init__(self):
+        super().__init__(
+            "Server is shutting down, retry against another instance",
+            status_code=503
+        )
+
+
+class ProviderKeysExhaustedError(HFRLException):
+    """Raised when every API key for a provider is cooling down"""
+    def __init__(self, provider: str, retry_after: float):
+        self.retry_after = max(0.0, retry_after)
+        super().__init__(
+            f"All {provider} API keys are rate limited or failing, retry in {int(self.retry_after) + 1}s",
+            status_code=503
+        )
+
+
+class ContextWindowExceededError(HFRLException):
+    """Raised when a request can't fit in its model's context window"""
+    def __init__(
+        self,
+        model: str,
+        prompt_tokens: int,
+        context_window: int,
+        max_tokens: Optional[int] = None,
+        available: Optional[int] = None
+    ):
+        message = (
+            f"Prompt of about {prompt_tokens} tokens exceeds the {context_window}-token "
+            f"context window of {model}"
+        )
+        if max_tokens is not None:
+            message = (
+                f"max_tokens={max_tokens} exceeds the {max(available or 0, 0)} output tokens "
+                f"{model} allows after a prompt of about {prompt_tokens} tokens"
+            )
+        super().__init__(message, status_code=400)
+
+
+class GenerationQueueFullError(HFRLException):
+    """Raised when a provider's generation queue has no room for a request"""
+    def __init__(self, provider: str, lane: str):
+        super().__init__(
+            f"Too many {lane} generations queued for {provider}, retry later",
+            status_code=503
+        )
+
+
+class GenerationPreemptedError(HFRLException):
+    """Raised when a queued bulk generation gives its place to interactive work"""
+    def __init__(self, provider: str):
+        super().__init__(
+            f"Queued bulk generation for {provider} was preempted by interactive work, retry later",
+            status_code=503
+        )
+
+
+class JobQueueFullError(HFRLException):
+    """Raised when too many generation jobs are already waiting"""
+    def __init__(self):
+        super().__init__(
+            "Too many generation jobs are pending, retry later",
+            status_code=503
+        )
+
+
+class JobConflictError(HFRLException):
+    """Raised when an idempotency key is reused for a different request"""
+    def __init__(self, idempotency_key: str):
+        super().__init__(
+            f"Idempotency key {idempotency_key} was already used for a different request",
+            status_code=409
+        )
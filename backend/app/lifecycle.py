@@ -0,0 +1,138 @@
+"""
+Application lifecycle - Warm startup, readiness and graceful drain
+"""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import asyncio
+import gc
+import logging
+import signal
+import threading
+import time
+
+from fastapi import FastAPI
+
+from app.config import settings
+from app.logging_config import setup_logging, shutdown_logging
+from app.schemas import AnalyticsRequest
+from app.services.ai_service import ai_service
+from app.services.analytics_service import analytics_service
+from app.services.conversation_store import conversation_store
+from app.services.job_queue import job_queue
+from app.services.leaderboard_service import leaderboard_service
+from app.services.live_analytics_service import live_analytics_service
+from app.services.rate_limiter import rate_limiter
+from app.services.retention_service import retention_service
+from app.services.search_index import search_index
+from app.services.worker_pool import worker_pool
+from app.tracing import trace_exporter
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Tracks whether the process should receive traffic
+    
+    The process is live as soon as it can answer requests, and ready only
+    once startup has finished and until a shutdown signal arrives. Load
+    balancers should route on readiness and restart on liveness.
+    """
+    
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.draining = False
+        self._previous_handler = None
+    
+    @property
+    def ready(self) -> bool:
+        return self.started_at is not None and not self.draining
+    
+    def begin_drain(self) -> None:
+        """Stop taking new work: fail readiness, refuse generations, end live streams"""
+        if self.draining:
+            return
+        logger.info(f"Draining: {ai_service.in_flight} provider call(s) in flight")
+        self.draining = True
+        ai_service.begin_drain()
+        job_queue.begin_drain()
+        live_analytics_service.close_all()
+    
+    def install_signal_handler(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start draining as soon as SIGTERM arrives
+        
+        The server's own handler (uvicorn's, for instance) is chained, so it
+        still stops accepting connections and waits for open requests.
+        When nothing else handles SIGTERM the default behaviour is kept.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+        if not callable(previous):
+            return
+        
+        def handle_sigterm(signum, frame):
+            loop.call_soon_threadsafe(self.begin_drain)
+            previous(signum, frame)
+        
+        self._previous_handler = previous
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    def restore_signal_handler(self) -> None:
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm up before serving traffic and drain in-flight work on the way out"""
+    started = time.perf_counter()
+    # A no-op on first start; restores queued logging after an earlier shutdown
+    setup_logging()
+    lifecycle.install_signal_handler(asyncio.get_running_loop())
+    
+    await ai_service.startup()
+    conversation_store.open()
+    await job_queue.start()
+    leaderboard_service.start()
+    search_index.rebuild()
+    retention_service.start()
+    try:
+        # Prime the analytics cache (and the worker pool) with the default view
+        await analytics_service.get_analytics_entry_async(AnalyticsRequest())
+    except Exception as e:
+        logger.warning(f"Analytics warm-up failed: {str(e)}")
+    # Modules, settings and warmed caches live as long as the process; keep
+    # every later full collection from walking them again. Unfrozen, those
+    # pauses made up most of the tail latency while analytics ran
+    gc.collect()
+    gc.freeze()
+    
+    lifecycle.started_at = time.time()
+    logger.info(f"Startup complete in {time.perf_counter() - started:.3f}s")
+    
+    try:
+        yield
+    finally:
+        lifecycle.begin_drain()
+        remaining = await ai_service.drain(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        if remaining:
+            logger.warning(f"Shutting down with {remaining} provider call(s) still in flight")
+        # Jobs still running go back to the queue for the next start
+        await job_queue.stop()
+        await leaderboard_service.stop()
+        await retention_service.stop()
+        await ai_service.aclose()
+        conversation_store.close()
+        await rate_limiter.backend.close()
+        worker_pool.shutdown(wait=False)
+        if trace_exporter is not None:
+            trace_exporter.close()
+        lifecycle.restore_signal_handler()
+        shutdown_logging()
+
+
+# Create singleton instance
+lifecycle = Lifecycle()
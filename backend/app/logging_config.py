@@ -0,0 +1,102 @@
+"""
+Logging configuration - Non-blocking, optionally structured log output
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+import atexit
+import json
+import logging
+import queue
+
+from app.config import settings
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+# Root logger state replaced by setup_logging(), put back on shutdown
+_previous_handlers: List[logging.Handler] = []
+_previous_level = logging.WARNING
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects, including ``extra`` fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exception"] = record.exc_text or self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        return json.dumps(payload, default=str)
+
+
+class _QueuePassthroughHandler(QueueHandler):
+    """
+    QueueHandler that enqueues records as-is
+    
+    The stock prepare() folds the traceback into the message and clears
+    ``exc_info``, so the listener's formatter (e.g. JSON) couldn't lay it out
+    itself. Arguments are still rendered here so the record is safe to
+    format later on another thread.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+def setup_logging() -> None:
+    """
+    Route all logging through a queue drained by a background thread
+    
+    Callers (including the event loop) only pay for an unbounded queue put;
+    formatting and writing happen on the listener thread. Safe to call
+    again after shutdown_logging().
+    """
+    global _listener, _previous_handlers, _previous_level
+    if _listener is not None:
+        return
+    
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    _previous_handlers, _previous_level = root.handlers[:], root.level
+    root.handlers[:] = [_QueuePassthroughHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL)
+    
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the listener thread and restore the root logger"""
+    global _listener
+    if _listener is not None:
+        # Detach the queue first so nothing is enqueued after the last drain
+        root = logging.getLogger()
+        root.handlers[:] = _previous_handlers
+        root.setLevel(_previous_level)
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
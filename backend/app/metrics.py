@@ -0,0 +1,237 @@
+"""
+Metrics - In-process counters, gauges and histograms in Prometheus text format
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Shared bookkeeping for a labelled metric family"""
+    type_name = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Updates may come from worker threads as well as the event loop;
+        # an uncontended lock costs well under a microsecond
+        self._lock = threading.Lock()
+    
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+    
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    type_name = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+    
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set"""
+    type_name = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+    
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+    
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+    
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations in fixed buckets per label set
+    
+    Observing increments a single (non-cumulative) bucket; cumulative counts
+    are only computed at scrape time.
+    """
+    type_name = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+    
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+    
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+        lines = self._header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds metric families and scrape-time collectors
+    
+    Collectors are callables returning ``(name, type, help, value)`` tuples
+    for values that are cheaper to read at scrape time than to track, such
+    as store sizes and cache hit ratios.
+    """
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, float]]]] = []
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS)
+        self._metrics.append(metric)
+        return metric
+    
+    def register_collector(
+        self,
+        collector: Callable[[], Iterable[Tuple[str, str, str, float]]]
+    ) -> None:
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            for name, type_name, documentation, value in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                lines.append(f"{name} {_format_value(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+# Create singleton registry and the application's metric families
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    "hfrl_http_requests_total",
+    "HTTP requests handled",
+    ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "hfrl_http_request_duration_seconds",
+    "HTTP request latency until the response completed",
+    ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "hfrl_http_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+http_requests_in_flight.set(0)
+provider_requests_total = registry.counter(
+    "hfrl_provider_requests_total",
+    "AI provider calls by outcome",
+    ("provider", "outcome")
+)
+provider_cache_tokens_total = registry.counter(
+    "hfrl_provider_cache_tokens_total",
+    "Prompt tokens read from or written to provider prompt caches",
+    ("provider", "kind")
+)
+provider_request_duration_seconds = registry.histogram(
+    "hfrl_provider_request_duration_seconds",
+    "AI provider call latency",
+    ("provider",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+)
@@ -0,0 +1,157 @@
+"""
+Compression middleware - Negotiated brotli/gzip for large responses
+"""
+from typing import Dict, Optional
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Media types that are already compressed or must not be buffered
+_SKIP_MEDIA_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+
+# Content codings this middleware applies, and so may suffix ETags with
+_CODINGS = ("br", "gzip")
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    ETag of a compressed representation
+    
+    A strong ETag identifies one exact body, so the compressed body gets
+    its own (RFC 9110 section 8.8.3), e.g. ``"abc"`` becomes ``"abc-gzip"``.
+    Weak ETags only promise equivalent content and are left alone.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoding(etag: str) -> str:
+    """Undo encoded_etag, so If-None-Match can be compared with the stored tag"""
+    for coding in _CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class CompressionMiddleware:
+    """
+    Compresses single-message responses above a size threshold
+    
+    Brotli is preferred when the client accepts it and the ``brotli`` package
+    is installed, otherwise gzip. Streaming responses (more than one body
+    message) pass through untouched so live streams are never buffered.
+    A strong ETag on a compressed response gets the coding appended (see
+    encoded_etag); handlers comparing If-None-Match use strip_encoding.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    @staticmethod
+    def _qvalues(accept: str) -> Dict[str, float]:
+        """Quality value per content coding in an Accept-Encoding header"""
+        qvalues = {}
+        for token in accept.split(","):
+            coding, *params = token.split(";")
+            coding = coding.strip().lower()
+            if not coding:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            qvalues[coding] = q
+        return qvalues
+    
+    def _choose_encoding(self, scope: Scope) -> Optional[str]:
+        qvalues = self._qvalues(Headers(scope=scope).get("accept-encoding", ""))
+        wildcard = qvalues.get("*", 0.0)
+        codings = ("br", "gzip") if brotli is not None else ("gzip",)
+        # Highest q wins, brotli on a tie; q=0 (or "*;q=0") refuses a coding
+        best, best_q = None, 0.0
+        for coding in codings:
+            q = qvalues.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+    
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message: Optional[Message] = None
+        passthrough = False
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "")
+                if headers.get("content-encoding") or media_type.startswith(_SKIP_MEDIA_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the start message until we know the body size
+                    start_message = message
+                return
+            
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                await send(message)
+                return
+            
+            compressed = self._compress(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], encoding)
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+        
+        await self.app(scope, receive, send_wrapper)
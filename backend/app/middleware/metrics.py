@@ -0,0 +1,66 @@
+"""
+Metrics middleware - Per-route request counts, latency and in-flight gauge
+"""
+from typing import Any, Dict
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import (
+    http_request_duration_seconds,
+    http_requests_in_flight,
+    http_requests_total,
+)
+
+
+class MetricsMiddleware:
+    """
+    Records request metrics labelled by route template
+    
+    The route label is the matched path template (``/api/feedback/{feedback_id}``)
+    rather than the raw path, so label cardinality stays bounded; requests
+    that match no route are labelled ``unmatched``.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._templates: Dict[Any, str] = {}
+    
+    def _route_template(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self._templates.get(endpoint)
+        if template is None:
+            template = "unmatched"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            self._templates[endpoint] = template
+        return template
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = self._route_template(scope)
+            http_requests_total.inc(scope["method"], route, str(status_code))
+            http_request_duration_seconds.observe(
+                time.perf_counter() - start_time, scope["method"], route
+            )
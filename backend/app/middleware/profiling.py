@@ -0,0 +1,82 @@
+"""
+Profiling middleware - Runs selected requests under a profiler
+"""
+from typing import Optional
+from urllib.parse import parse_qs
+import logging
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.profiling_service import ProfilingService
+from app.services.worker_pool import worker_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles admin-flagged requests and a 1-in-N sample of the rest
+    
+    Flagged requests get an ``X-Profile-Id`` response header naming the
+    capture, which can then be downloaded from ``/api/profiles/{id}``.
+    Only added to the app when profiling is configured, so it costs
+    nothing otherwise.
+    """
+    
+    def __init__(self, app: ASGIApp, service: ProfilingService):
+        self.app = app
+        self.service = service
+    
+    def _mode(self, scope: Scope) -> Optional[str]:
+        headers = Headers(scope=scope)
+        flagged = "x-profile" in headers or "profile" in parse_qs(scope.get("query_string", b"").decode())
+        if flagged and self.service.is_admin(headers.get("x-admin-token")):
+            return "on-demand"
+        if self.service.should_sample():
+            return "sampled"
+        return None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        mode = self._mode(scope)
+        profile = self.service.start() if mode else None
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        
+        profile_id = self.service.new_id()
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if mode == "on-demand":
+                    MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+        
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            self.service.finish(profile)
+            try:
+                # The response has been sent; render off the event loop
+                await worker_pool.run(
+                    self.service.save,
+                    profile,
+                    profile_id,
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    duration,
+                    mode
+                )
+            except Exception as e:
+                logger.warning(f"Could not save profile {profile_id}: {str(e)}")
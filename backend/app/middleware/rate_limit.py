@@ -0,0 +1,105 @@
+"""
+Rate limit middleware - Per-client limits with 429 and RateLimit-* headers
+"""
+from typing import Iterable
+import json
+import math
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import registry
+from app.services.rate_limiter import RateLimitDecision, RateLimiter
+from app.tracing import span
+
+rate_limited_requests_total = registry.counter(
+    "hfrl_rate_limited_requests_total",
+    "Requests rejected by the inbound rate limiter",
+    ("group",)
+)
+
+
+class RateLimitMiddleware:
+    """
+    Applies the rate limiter to HTTP requests
+    
+    Clients are identified by IP address. Behind ``trusted_proxy_hops``
+    proxies, that is the ``X-Forwarded-For`` entry the outermost of them
+    appended, counting from the right: entries further left come from the
+    client and can be forged. ``X-API-Key`` is never used: it carries the
+    caller's own provider key, which nothing checks, so keying on it would
+    let a client mint a fresh allowance per request. Admitted responses
+    carry ``RateLimit-Limit``/``-Remaining``/``-Reset`` headers; rejected
+    ones get ``429`` with ``Retry-After`` as well.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: RateLimiter,
+        exempt_paths: Iterable[str] = (),
+        trusted_proxy_hops: int = 0
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = frozenset(exempt_paths)
+        self.trusted_proxy_hops = max(0, trusted_proxy_hops)
+    
+    def _client_key(self, scope: Scope) -> str:
+        if self.trusted_proxy_hops:
+            forwarded = Headers(scope=scope).get("x-forwarded-for")
+            addresses = [address.strip() for address in forwarded.split(",")] if forwarded else []
+            if addresses:
+                # Fewer entries than proxies: all of them were appended by ours
+                return "ip:" + addresses[-min(self.trusted_proxy_hops, len(addresses))]
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+    
+    @staticmethod
+    def _headers(decision: RateLimitDecision) -> dict:
+        return {
+            "RateLimit-Limit": str(decision.limit),
+            "RateLimit-Remaining": str(decision.remaining),
+            "RateLimit-Reset": str(math.ceil(decision.reset_after)),
+        }
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        group, limit = self.limiter.resolve(scope["path"])
+        if limit <= 0:
+            await self.app(scope, receive, send)
+            return
+        
+        with span("ratelimit"):
+            decision = await self.limiter.check(group, limit, self._client_key(scope))
+        headers = self._headers(decision)
+        
+        if not decision.allowed:
+            # Unconfigured groups come from arbitrary paths; keep labels bounded
+            rate_limited_requests_total.inc(group if self.limiter.is_configured(group) else "default")
+            retry_after = str(max(1, math.ceil(decision.retry_after)))
+            body = json.dumps({
+                "detail": "Rate limit exceeded",
+                "retry_after": int(retry_after)
+            }).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", retry_after.encode()),
+                ] + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+        
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,74 @@
+"""
+Request logging middleware - Pure ASGI request timing and access logs
+"""
+from typing import Optional
+import logging
+import random
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("app.access")
+
+
+class RequestLoggingMiddleware:
+    """
+    Times every HTTP request and writes one access log line for it
+    
+    Implemented as plain ASGI rather than ``@app.middleware("http")`` so it
+    adds no extra task or body buffering per request and leaves streaming
+    responses alone. Successful requests are logged with probability
+    ``sample_rate``; server errors and exceptions are always logged.
+    """
+    
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        status_code: Optional[int] = None
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", f"{time.perf_counter() - start_time:.6f}")
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error(
+                "Request failed: %s %s Error: %s",
+                scope["method"], scope["path"], e,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "duration_ms": round((time.perf_counter() - start_time) * 1000, 3),
+                }
+            )
+            raise
+        
+        failed = status_code is None or status_code >= 500
+        if not failed and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        
+        duration = time.perf_counter() - start_time
+        logger.log(
+            logging.ERROR if failed else logging.INFO,
+            "%s %s Status: %s Time: %.3fs",
+            scope["method"], scope["path"], status_code, duration,
+            extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+            }
+        )
@@ -0,0 +1,78 @@
+"""
+Server-Timing middleware - Per-phase request timing for devtools and trace export
+"""
+from typing import Optional, Sequence
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.tracing import OTLPFileExporter, Trace, end_trace, parse_traceparent, start_trace
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the spans of each request into a ``Server-Timing`` header
+    
+    Phases are recorded by ``app.tracing.span()`` in the routes and
+    services (validate, handler, queue, provider, storage, serialize), and
+    the header lists them with a ``total`` up to the response start, which
+    browser devtools show as a per-phase breakdown. Cross-origin pages can
+    only read the timings with ``Timing-Allow-Origin``, which is sent to the
+    CORS origins. With an exporter, each request is also written as an
+    OpenTelemetry trace, continuing an incoming W3C ``traceparent``.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        allow_origins: Sequence[str] = (),
+        exporter: Optional[OTLPFileExporter] = None,
+        emit_header: bool = True
+    ):
+        self.app = app
+        self.allow_origins = set(allow_origins)
+        self.exporter = exporter
+        self.emit_header = emit_header
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
+        trace_id, parent_id = parse_traceparent(headers.get("traceparent"))
+        trace = Trace(trace_id, parent_id)
+        origin = headers.get("origin")
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.emit_header:
+                    response_headers = MutableHeaders(scope=message)
+                    response_headers.append("Server-Timing", trace.server_timing(time.perf_counter() - trace.start))
+                    if origin and ("*" in self.allow_origins or origin in self.allow_origins):
+                        response_headers["Timing-Allow-Origin"] = origin
+            await send(message)
+        
+        token = start_trace(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_trace(token)
+            if self.exporter is not None:
+                route = scope.get("route")
+                template = getattr(route, "path", None) or scope["path"]
+                self.exporter.export(
+                    trace,
+                    f"{scope['method']} {template}",
+                    time.perf_counter() - trace.start,
+                    {
+                        "http.request.method": scope["method"],
+                        "http.route": template,
+                        "url.path": scope["path"],
+                        "http.response.status_code": status_code,
+                    }
+                )
@@ -0,0 +1,54 @@
+"""
+Fast JSON responses - Serialize already-validated data without a second pass
+"""
+from typing import Any, Dict, Optional
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from app.tracing import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def dumps_json(content: Any) -> bytes:
+    """Serialize JSON-compatible data to UTF-8 bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_json_response(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Build a JSON response for data that was validated when it was stored
+    
+    Returning a Response directly makes FastAPI skip ``response_model``
+    validation. With orjson installed, datetimes, dicts and lists are
+    serialized natively; anything else falls back to jsonable_encoder.
+    
+    Args:
+        content: JSON-compatible data (dicts, lists, datetimes, ...)
+        status_code: HTTP status code
+        headers: Optional extra headers
+    
+    Returns:
+        JSON response
+    """
+    with span("serialize"):
+        body = dumps_json(content)
+    return Response(
+        body,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json"
+    )
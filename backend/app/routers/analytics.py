@@ -1,17 +1,74 @@
 """
 Analytics router - Handles analytics and metrics
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime
-from app.schemas import AnalyticsRequest, AnalyticsResponse, Provider
+import asyncio
+import json
+from app.schemas import AnalyticsRequest, AnalyticsResponse, LeaderboardResponse, Provider
+from app.config import settings
+from app.exceptions import HFRLException
+from app.middleware.compression import strip_encoding
 from app.services.analytics_service import analytics_service
+from app.services.leaderboard_service import leaderboard_service
+from app.services.live_analytics_service import live_analytics_service
+from app.tracing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+
+async def _cached_analytics(
+    request: AnalyticsRequest,
+    http_request: Request
+) -> Response:
+    """
+    Resolve analytics through the cache and apply conditional-GET headers
+    
+    Args:
+        request: Analytics request with filters
+        http_request: Incoming HTTP request (for If-None-Match)
+    
+    Returns:
+        The cached JSON body, or an empty 304 if the client copy is current
+    """
+    try:
+        entry = await asyncio.wait_for(
+            analytics_service.get_analytics_entry_async(request),
+            timeout=settings.ANALYTICS_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analytics computation timed out")
+    except HFRLException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    
+    if analytics_service.cache.is_closed_window(request, entry.computed_at):
+        cache_control = f"private, max-age={settings.ANALYTICS_CACHE_MAX_AGE}"
+    else:
+        cache_control = "private, no-cache"
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+    
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match:
+        for tag in if_none_match.split(","):
+            tag = tag.strip().removeprefix("W/")
+            if tag == "*" or strip_encoding(tag) == entry.etag:
+                # Echo the client's tag: it names the encoding it holds
+                if tag != "*":
+                    headers["ETag"] = tag
+                return Response(status_code=304, headers=headers)
+    
+    # The entry already holds the serialized body; skip response_model
+    # revalidation and re-encoding
+    return Response(entry.body, media_type="application/json", headers=headers)
 
 
 @router.post("", response_model=AnalyticsResponse)
-async def get_analytics(request: AnalyticsRequest):
+async def get_analytics(
+    request: AnalyticsRequest,
+    http_request: Request
+):
     """
     Get analytics data
     
@@ -22,17 +79,21 @@ async def get_analytics(request: AnalyticsRequest):
         Analytics response with metrics
     """
     try:
-        return analytics_service.get_analytics(request)
+        return await _cached_analytics(request, http_request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("", response_model=AnalyticsResponse)
 async def get_analytics_query(
+    http_request: Request,
     start_date: Optional[datetime] = Query(None, description="Start date for analytics"),
     end_date: Optional[datetime] = Query(None, description="End date for analytics"),
     provider: Optional[Provider] = Query(None, description="Filter by provider"),
-    model: Optional[str] = Query(None, description="Filter by model")
+    model: Optional[str] = Query(None, description="Filter by model"),
+    approximate: bool = Query(False, description="Use per-day sketches instead of exact scans")
 ):
     """
     Get analytics data using query parameters
@@ -42,6 +103,7 @@ async def get_analytics_query(
         end_date: End date for analytics
         provider: Filter by provider
         model: Filter by model
+        approximate: Use per-day sketches instead of exact scans
     
     Returns:
         Analytics response with metrics
@@ -51,9 +113,112 @@ async def get_analytics_query(
             start_date=start_date,
             end_date=end_date,
             provider=provider,
-            model=model
+            model=model,
+            approximate=approximate
         )
-        return analytics_service.get_analytics(request)
+        return await _cached_analytics(request, http_request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    provider: Optional[Provider] = Query(None, description="Only rank this provider's models"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of entries")
+):
+    """
+    Rank models by Bradley-Terry strength from ratings and pairwise preferences
+    
+    Served from standings updated on every feedback write, so it costs the
+    same however much feedback is stored.
+    
+    Args:
+        provider: Optional provider filter
+        limit: Maximum number of entries
+    
+    Returns:
+        Models strongest first, with 95% intervals on the Elo scale
+    """
+    return leaderboard_service.leaderboard(provider=provider.value if provider else None, limit=limit)
+
+
+@router.get("/stream")
+async def stream_analytics():
+    """
+    Stream live analytics updates as Server-Sent Events
+    
+    The first event is a full snapshot; later events are coalesced deltas
+    (feedback count, rating sum, distribution and per-day bucket changes).
+    A client that falls behind receives a fresh snapshot instead of a backlog.
+    
+    Returns:
+        text/event-stream response
+    """
+    async def event_stream():
+        subscription = live_analytics_service.subscribe()
+        try:
+            message = await live_analytics_service.snapshot(subscription)
+            while True:
+                if message is not None:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+                    if message["type"] == "closed":
+                        return
+                try:
+                    message = await asyncio.wait_for(
+                        live_analytics_service.next_message(subscription),
+                        timeout=settings.LIVE_ANALYTICS_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    message = None
+                    yield ": keepalive\n\n"
+        finally:
+            live_analytics_service.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def analytics_websocket(websocket: WebSocket):
+    """
+    Push live analytics updates over a WebSocket
+    
+    Sends the same snapshot/delta messages as the SSE stream.
+    """
+    await websocket.accept()
+    subscription = live_analytics_service.subscribe()
+    # Keep a receive pending so a client disconnect is noticed even while
+    # no updates are flowing
+    receiver = asyncio.ensure_future(websocket.receive())
+    sender = None
+    try:
+        await websocket.send_json(await live_analytics_service.snapshot(subscription))
+        while True:
+            sender = asyncio.ensure_future(live_analytics_service.next_message(subscription))
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    return
+                receiver = asyncio.ensure_future(websocket.receive())
+            
+            if sender in done:
+                message = sender.result()
+                await websocket.send_json(message)
+                if message["type"] == "closed":
+                    await websocket.close()
+                    return
+            else:
+                sender.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        if sender is not None:
+            sender.cancel()
+        live_analytics_service.unsubscribe(subscription)
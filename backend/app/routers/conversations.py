@@ -0,0 +1,57 @@
+"""
+Conversations router - Server-side conversation history per session
+"""
+from datetime import datetime
+from fastapi import APIRouter, HTTPException
+from app.schemas import ConversationResponse, ConversationTurn
+from app.services.conversation_store import conversation_store
+from app.tracing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get("/{session_id}", response_model=ConversationResponse)
+async def get_conversation(session_id: str):
+    """
+    Get the stored conversation of a session
+    
+    Args:
+        session_id: Session ID
+    
+    Returns:
+        Stored turns, oldest first, and the rolling summary of older ones
+    """
+    conversation = await conversation_store.get(session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="No conversation stored for session")
+    turns = list(conversation.turns)
+    return ConversationResponse(
+        session_id=session_id,
+        turns=[
+            ConversationTurn(
+                role=turn.role,
+                content=turn.content,
+                tokens=turn.tokens,
+                created=datetime.fromtimestamp(turn.created)
+            )
+            for turn in turns
+        ],
+        summary=conversation.summary,
+        total_tokens=sum(turn.tokens for turn in turns) + conversation.summary_tokens
+    )
+
+
+@router.delete("/{session_id}")
+async def delete_conversation(session_id: str):
+    """
+    Forget the stored conversation of a session
+    
+    Args:
+        session_id: Session ID
+    
+    Returns:
+        Success message
+    """
+    if not await conversation_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="No conversation stored for session")
+    return {"message": "Conversation deleted successfully"}
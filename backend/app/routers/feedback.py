@@ -3,10 +3,18 @@ Feedback router - Handles feedback operations
 """
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
-from app.schemas import FeedbackCreate, FeedbackResponse
+from datetime import datetime
+import asyncio
+from app.config import settings
+from app.exceptions import HFRLException
+from app.schemas import FeedbackCreate, FeedbackResponse, FeedbackSearchResponse
+from app.responses import fast_json_response
 from app.services.feedback_service import feedback_service
+from app.services.search_index import search_index
+from app.services.worker_pool import worker_pool
+from app.tracing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post("", response_model=FeedbackResponse)
@@ -26,6 +34,58 @@ async def create_feedback(feedback: FeedbackCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search", response_model=FeedbackSearchResponse)
+async def search_feedback(
+    q: str = Query(..., min_length=1, max_length=500, description="Search terms"),
+    session_id: Optional[str] = Query(None, description="Filter by session ID"),
+    min_rating: Optional[int] = Query(None, ge=1, le=5, description="Lowest rating"),
+    max_rating: Optional[int] = Query(None, ge=1, le=5, description="Highest rating"),
+    start_date: Optional[datetime] = Query(None, description="Earliest feedback time"),
+    end_date: Optional[datetime] = Query(None, description="Latest feedback time"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, le=10000, description="Offset for pagination")
+):
+    """
+    Search feedback comments, best matches first
+    
+    Comments matching any of the query's words are ranked by BM25; case
+    and common words are ignored.
+    
+    Args:
+        q: Search terms
+        session_id: Optional session ID filter
+        min_rating: Optional lowest rating
+        max_rating: Optional highest rating
+        start_date: Optional earliest feedback time
+        end_date: Optional latest feedback time
+        limit: Maximum number of results
+        offset: Offset for pagination
+    
+    Returns:
+        A page of scored feedback and whether more follow
+    """
+    try:
+        results, has_more = await asyncio.wait_for(
+            worker_pool.run(
+                search_index.search, q, limit, offset,
+                session_id, min_rating, max_rating, start_date, end_date
+            ),
+            timeout=settings.SEARCH_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except HFRLException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    # Stored records were validated on create; serialize them directly
+    return fast_json_response({
+        "query": q,
+        "results": [{"score": score, "feedback": record} for score, record in results],
+        "offset": offset,
+        "limit": limit,
+        "has_more": has_more
+    })
+
+
 @router.get("/{feedback_id}", response_model=FeedbackResponse)
 async def get_feedback(feedback_id: str):
     """
@@ -61,9 +121,12 @@ async def get_all_feedback(
         List of feedback responses
     """
     try:
-        if session_id:
-            return feedback_service.get_feedback_by_session(session_id)
-        return feedback_service.get_all_feedback(limit=limit, offset=offset)
+        # Stored records were validated on create; serialize them directly
+        # instead of rebuilding and revalidating up to 1000 models
+        records = feedback_service.list_feedback_data(
+            session_id=session_id, limit=limit, offset=offset
+        )
+        return fast_json_response(records)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,171 @@
+"""
+Jobs router - Asynchronous generation jobs
+"""
+from datetime import datetime
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.config import settings
+from app.exceptions import HFRLException
+from app.schemas import JobResponse, JobStatus, ModelRequest, ModelResponse
+from app.services.job_queue import Job, job_queue
+from app.tracing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+# Seconds of silence before a stream sends a keepalive comment
+KEEPALIVE_INTERVAL = 15.0
+
+
+def _job_response(job: Job) -> JobResponse:
+    return JobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        attempts=job.attempts,
+        created_at=datetime.fromtimestamp(job.created),
+        updated_at=datetime.fromtimestamp(job.updated),
+        expires_at=datetime.fromtimestamp(job.expires) if job.expires is not None else None,
+        error=job.error
+    )
+
+
+async def _get_job(job_id: str) -> Job:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.post("", response_model=JobResponse, status_code=202)
+async def submit_job(
+    request: ModelRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200)
+):
+    """
+    Queue a generation and return at once
+    
+    The job runs with the server's configured API keys, in the bulk lane
+    unless ``priority`` is given. Resubmitting with the same
+    ``Idempotency-Key`` header returns the original job.
+    
+    Args:
+        request: Model generation request
+        idempotency_key: Optional client-chosen key for safe retries
+    
+    Returns:
+        The queued job
+    """
+    try:
+        job = await job_queue.submit(request, idempotency_key)
+    except HFRLException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _job_response(job)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status of a job
+    
+    Args:
+        job_id: Job ID
+    
+    Returns:
+        Job status, attempts and last error
+    """
+    return _job_response(await _get_job(job_id))
+
+
+@router.get("/{job_id}/result", response_model=ModelResponse)
+async def get_job_result(job_id: str):
+    """
+    Get the generated response of a finished job
+    
+    Args:
+        job_id: Job ID
+    
+    Returns:
+        The generated content; 409 while the job is pending or if it failed
+    """
+    job = await _get_job(job_id)
+    if job.status != JobStatus.SUCCEEDED:
+        detail = f"Job is {job.status.value}" + (f": {job.error}" if job.error else "")
+        raise HTTPException(status_code=409, detail=detail)
+    return job.result
+
+
+@router.get("/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Stream a job's progress as Server-Sent Events
+    
+    A ``status`` event is sent now and at every change, then a ``result``
+    event with the generated response (or an ``error`` event) once the job
+    finishes, and the stream ends.
+    
+    Args:
+        job_id: Job ID
+    
+    Returns:
+        text/event-stream response
+    """
+    job = await _get_job(job_id)
+    
+    async def event_stream():
+        current = job
+        last_seen = None
+        idle = 0.0
+        while current is not None:
+            state = (current.status, current.attempts, current.updated)
+            if state != last_seen:
+                last_seen, idle = state, 0.0
+                yield f"event: status\ndata: {_job_response(current).model_dump_json()}\n\n"
+            if current.finished:
+                if current.status == JobStatus.SUCCEEDED:
+                    yield f"event: result\ndata: {current.result.model_dump_json()}\n\n"
+                else:
+                    yield f"event: error\ndata: {json.dumps({'detail': current.error})}\n\n"
+                return
+            # Take the change event before re-reading, so no change is missed;
+            # jobs run by other processes are noticed by polling
+            changed = job_queue.changes(job_id)
+            current = await job_queue.get(job_id)
+            if current is None or (current.status, current.attempts, current.updated) != last_seen:
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=settings.JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                idle += settings.JOBS_POLL_INTERVAL
+                if idle >= KEEPALIVE_INTERVAL:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+            current = await job_queue.get(job_id)
+        yield f"event: error\ndata: {json.dumps({'detail': 'Job expired'})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """
+    Cancel a job that hasn't finished
+    
+    Args:
+        job_id: Job ID
+    
+    Returns:
+        The job as it stands; finished jobs are returned unchanged
+    """
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _job_response(job)
@@ -0,0 +1,23 @@
+"""
+Metrics router - Prometheus scrape endpoint
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.metrics import registry
+from app.tracing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Get service metrics in Prometheus text exposition format
+    
+    Returns:
+        Plain-text metrics for scraping
+    """
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
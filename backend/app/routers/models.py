@@ -10,9 +10,12 @@ from app.schemas import (
     ConnectionTest,
     ConnectionTestResponse
 )
+from app.exceptions import HFRLException
 from app.services.ai_service import ai_service
+from app.services.generation_scheduler import generation_scheduler
+from app.tracing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post("/generate", response_model=ModelResponse)
@@ -33,6 +36,8 @@ async def generate_content(
     try:
         response = await ai_service.generate(request, api_key=x_api_key)
         return response
+    except HFRLException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -114,3 +119,8 @@ async def get_providers():
         ]
     }
 
+
+@router.get("/scheduler")
+async def get_scheduler_status():
+    """Generations queued and running per provider and priority lane"""
+    return {"providers": generation_scheduler.status()}
@@ -0,0 +1,51 @@
+"""
+Profiles router - Lists and serves captured request profiles
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import List, Optional
+from app.schemas import ProfileInfo
+from app.services.profiling_service import profiling_service
+from app.tracing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Allow only requests carrying the profiling admin token"""
+    if not profiling_service.admin_token:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not profiling_service.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get("", response_model=List[ProfileInfo], dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    List captured profiles, newest first
+    
+    Returns:
+        Profile metadata
+    """
+    return profiling_service.list_profiles()
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """
+    Download a captured profile
+    
+    Speedscope profiles open in https://www.speedscope.app, HTML ones in a
+    browser and pstats ones with ``python -m pstats`` or snakeviz.
+    
+    Args:
+        profile_id: Profile ID (from the list or the X-Profile-Id header)
+    
+    Returns:
+        The profile file
+    """
+    found = profiling_service.get_profile(profile_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    info, path, media_type = found
+    return FileResponse(path, media_type=media_type, filename=path.rsplit("/", 1)[-1])
@@ -2,11 +2,14 @@
 Settings router - Handles application settings
 """
 from fastapi import APIRouter, HTTPException
-from app.schemas import SettingsUpdate, SettingsResponse
+from typing import List
+from app.schemas import ApiKeyStatus, SettingsUpdate, SettingsResponse
+from app.services.ai_service import ai_service
+from app.tracing import TimedRoute
 from datetime import datetime
 import os
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 # In-memory settings storage (replace with database in production)
 settings_storage = {
@@ -69,9 +72,35 @@ async def update_settings(settings: SettingsUpdate):
             os.environ["KIMI_API_KEY"] = settings.kimi_api_key
             settings_storage["providers_configured"]["kimi"] = True
         
+        # Pooled keys replace the provider's extra keys (an empty list clears them)
+        pooled_keys = {
+            "openai": settings.openai_api_keys,
+            "anthropic": settings.anthropic_api_keys,
+            "deepseek": settings.deepseek_api_keys,
+            "kimi": settings.kimi_api_keys,
+        }
+        for provider, keys in pooled_keys.items():
+            if keys is not None:
+                os.environ[f"{provider.upper()}_API_KEYS"] = ",".join(key.strip() for key in keys)
+                if any(key.strip() for key in keys):
+                    settings_storage["providers_configured"][provider] = True
+        
+        # Pick the new keys up without a restart
+        ai_service.reload_keys()
         settings_storage["updated_at"] = datetime.now()
         
         return SettingsResponse(**settings_storage)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/keys", response_model=List[ApiKeyStatus])
+async def get_key_status():
+    """
+    Get the state of every pooled provider API key
+    
+    Returns:
+        Per-key availability, cooldown, rate-limit headroom and call counts,
+        with the keys themselves masked
+    """
+    return ai_service.key_status()
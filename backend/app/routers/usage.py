@@ -0,0 +1,61 @@
+"""
+Usage router - Handles token usage and throughput accounting
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+from app.schemas import UsageResponse, Provider
+from app.services.usage_service import usage_service
+from app.tracing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get("", response_model=UsageResponse)
+async def get_usage(
+    start_date: Optional[datetime] = Query(None, description="Start date for usage"),
+    end_date: Optional[datetime] = Query(None, description="End date for usage"),
+    provider: Optional[Provider] = Query(None, description="Filter by provider"),
+    model: Optional[str] = Query(None, description="Filter by model")
+):
+    """
+    Get token usage, latency and throughput
+    
+    Args:
+        start_date: Start date for usage
+        end_date: End date for usage
+        provider: Filter by provider
+        model: Filter by model
+    
+    Returns:
+        Usage totals, per-model breakdown and time series
+    """
+    try:
+        return usage_service.get_usage(
+            start_date=start_date,
+            end_date=end_date,
+            provider=provider.value if provider else None,
+            model=model
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/session/{session_id}")
+async def get_session_usage(session_id: str):
+    """
+    Get token usage for a session
+    
+    Args:
+        session_id: Session ID
+    
+    Returns:
+        Session usage totals
+    """
+    usage = usage_service.get_session_usage(session_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="No usage recorded for session")
+    return {
+        "session_id": session_id,
+        **usage.model_dump()
+    }
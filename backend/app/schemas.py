@@ -1,7 +1,7 @@
 """
 Pydantic schemas for request/response validation
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -15,6 +15,12 @@ class Provider(str, Enum):
     KIMI = "kimi"
 
 
+class Priority(str, Enum):
+    """Scheduling lane of a generation"""
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
 class ModelRequest(BaseModel):
     """Request schema for model generation"""
     prompt: str = Field(..., min_length=1, max_length=50000, description="Input prompt for the model")
@@ -23,6 +29,24 @@ class ModelRequest(BaseModel):
     temperature: float = Field(0.7, ge=0.0, le=2.0, description="Temperature parameter")
     max_tokens: int = Field(1000, ge=1, le=32000, description="Maximum tokens to generate")
     system_prompt: Optional[str] = Field(None, max_length=10000, description="System prompt")
+    session_id: Optional[str] = Field(None, max_length=100, description="Session ID for usage accounting")
+    reuse_threshold: Optional[float] = Field(
+        None, ge=0.0, le=1.0, description="Return a prior response for a prompt at least this similar (0-1)"
+    )
+    use_history: bool = Field(
+        False, description="Send the session's stored conversation ahead of the prompt and store this turn"
+    )
+    priority: Priority = Field(
+        Priority.INTERACTIVE, description="Scheduling lane: interactive work runs ahead of bulk jobs"
+    )
+
+
+class NearDuplicate(BaseModel):
+    """A previously answered prompt similar to the request's"""
+    similarity: float = Field(..., description="Estimated Jaccard similarity of the prompts")
+    reused: bool = Field(..., description="Whether the prior response was returned instead of generating")
+    content: Optional[str] = Field(None, description="Prior response content, when not reused")
+    generated_at: datetime = Field(..., description="When the prior response was generated")
 
 
 class ModelResponse(BaseModel):
@@ -31,10 +55,69 @@ class ModelResponse(BaseModel):
     model: str = Field(..., description="Model used")
     provider: str = Field(..., description="Provider used")
     tokens_used: Optional[int] = Field(None, description="Tokens used")
+    prompt_tokens: Optional[int] = Field(None, description="Input tokens used")
+    completion_tokens: Optional[int] = Field(None, description="Output tokens generated")
+    estimated_prompt_tokens: Optional[int] = Field(None, description="Input tokens estimated locally before sending")
+    cache_read_tokens: Optional[int] = Field(None, description="Input tokens served from the provider's prompt cache")
+    cache_write_tokens: Optional[int] = Field(None, description="Input tokens written to the provider's prompt cache")
+    latency: Optional[float] = Field(None, description="Provider call latency in seconds")
     finish_reason: Optional[str] = Field(None, description="Finish reason")
+    near_duplicate: Optional[NearDuplicate] = Field(None, description="Similar earlier prompt, if any")
+    history_turns: Optional[int] = Field(None, description="Earlier conversation turns sent with the prompt")
+    history_truncated: Optional[bool] = Field(None, description="Whether older turns were left out to fit")
+    queue_time: Optional[float] = Field(None, description="Seconds spent waiting for a provider slot")
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class JobStatus(str, Enum):
+    """Lifecycle state of a generation job"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobResponse(BaseModel):
+    """Schema for a generation job"""
+    job_id: str
+    status: JobStatus
+    attempts: int = Field(..., description="Attempts started so far")
+    created_at: datetime
+    updated_at: datetime
+    expires_at: Optional[datetime] = Field(None, description="When a finished job and its result are removed")
+    error: Optional[str] = Field(None, description="Error of the last failed attempt")
+
+
+class ConversationTurn(BaseModel):
+    """One stored message of a conversation"""
+    role: str
+    content: str
+    tokens: int = Field(..., description="Estimated tokens, message formatting included")
+    created: datetime
+
+
+class ConversationResponse(BaseModel):
+    """Schema for a stored conversation"""
+    session_id: str
+    turns: List[ConversationTurn]
+    summary: Optional[str] = Field(None, description="Rolling summary of turns no longer stored")
+    total_tokens: int
+
+
+class ModelRef(BaseModel):
+    """A provider and one of its models"""
+    provider: Provider
+    model: str = Field(..., min_length=1, max_length=100)
+
+
+class Preference(str, Enum):
+    """Outcome of a response against another shown alongside it"""
+    WIN = "win"
+    LOSS = "loss"
+    TIE = "tie"
+
+
 class FeedbackCreate(BaseModel):
     """Schema for creating feedback"""
     session_id: Optional[str] = Field(None, max_length=100, description="Session ID")
@@ -45,6 +128,20 @@ class FeedbackCreate(BaseModel):
         None, max_items=100, description="Inline feedback for specific words/phrases"
     )
     learning_rate: Optional[float] = Field(0.001, ge=0.0, le=1.0, description="Learning rate")
+    provider: Optional[Provider] = Field(None, description="Provider that generated the rated response")
+    model: Optional[str] = Field(None, max_length=100, description="Model that generated the rated response")
+    compared_with: Optional[ModelRef] = Field(None, description="Model of a response shown alongside it")
+    preference: Optional[Preference] = Field(
+        None, description="How the rated response fared against compared_with"
+    )
+    
+    @model_validator(mode="after")
+    def check_comparison(self) -> "FeedbackCreate":
+        if (self.preference is None) != (self.compared_with is None):
+            raise ValueError("preference and compared_with must be given together")
+        if self.preference is not None and (self.provider is None or not self.model):
+            raise ValueError("a preference needs the rated response's provider and model")
+        return self
 
 
 class FeedbackResponse(BaseModel):
@@ -56,16 +153,104 @@ class FeedbackResponse(BaseModel):
     response_id: Optional[str]
     inline_feedback: Optional[List[Dict[str, Any]]]
     learning_rate: float
+    provider: Optional[Provider] = None
+    model: Optional[str] = None
+    compared_with: Optional[ModelRef] = None
+    preference: Optional[Preference] = None
     timestamp: datetime
     created_at: datetime
 
 
+class FeedbackSearchResult(BaseModel):
+    """One ranked feedback search hit"""
+    score: float = Field(..., description="BM25 relevance of the comments to the query")
+    feedback: FeedbackResponse
+
+
+class FeedbackSearchResponse(BaseModel):
+    """Schema for a page of feedback search results"""
+    query: str
+    results: List[FeedbackSearchResult]
+    offset: int
+    limit: int
+    has_more: bool = Field(..., description="Whether a further page has results")
+
+
 class AnalyticsRequest(BaseModel):
     """Schema for analytics queries"""
     start_date: Optional[datetime] = Field(None, description="Start date for analytics")
     end_date: Optional[datetime] = Field(None, description="End date for analytics")
     provider: Optional[Provider] = Field(None, description="Filter by provider")
     model: Optional[str] = Field(None, description="Filter by model")
+    approximate: bool = Field(
+        False, description="Answer from per-day sketches instead of scanning all feedback"
+    )
+
+
+class LeaderboardEntry(BaseModel):
+    """Standing of one model"""
+    rank: int
+    provider: str
+    model: str
+    score: float = Field(..., description="Bradley-Terry strength on the Elo scale; a 3/5 rating is 1500")
+    ci_lower: float = Field(..., description="Lower bound of the 95% interval")
+    ci_upper: float = Field(..., description="Upper bound of the 95% interval")
+    comparisons: int = Field(..., description="Pairwise preferences involving the model")
+    wins: int
+    losses: int
+    ties: int
+    ratings: int = Field(..., description="1-5 ratings of the model's responses")
+    average_rating: Optional[float] = None
+
+
+class LeaderboardResponse(BaseModel):
+    """Schema for the model leaderboard"""
+    entries: List[LeaderboardEntry]
+    events: int = Field(..., description="Ratings and preferences counted")
+    events_since_refit: int = Field(..., description="Applied online since the last full refit")
+    refitted_at: Optional[datetime] = None
+
+
+class ApproximateStats(BaseModel):
+    """Sketch-based estimates and their error bounds"""
+    distinct_sessions: int
+    distinct_sessions_error: float = Field(..., description="Relative standard error")
+    distinct_responses: int
+    distinct_responses_error: float = Field(..., description="Relative standard error")
+    rating_quantiles: Dict[str, Optional[float]]
+    rating_quantiles_rank_error: float = Field(..., description="Normalized rank error")
+    latency_quantiles: Optional[Dict[str, Optional[float]]] = Field(
+        None, description="Latency of successful provider calls in seconds"
+    )
+    latency_quantiles_rank_error: Optional[float] = Field(None, description="Normalized rank error")
+
+
+class UsageStats(BaseModel):
+    """Aggregated token usage and throughput"""
+    calls: int
+    errors: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_hit_ratio: Optional[float] = Field(None, description="Share of prompt tokens served from provider caches")
+    average_latency: Optional[float] = Field(None, description="Mean latency of successful calls in seconds")
+    tokens_per_second: Optional[float] = Field(None, description="Completion tokens per second of successful-call latency")
+
+
+class UsageBreakdown(UsageStats):
+    """Usage for a single provider/model pair"""
+    provider: str
+    model: str
+
+
+class UsageResponse(BaseModel):
+    """Schema for usage accounting response"""
+    totals: UsageStats
+    by_model: List[UsageBreakdown]
+    over_time: List[Dict[str, Any]]
+    latency_quantiles: Dict[str, Optional[float]]
 
 
 class AnalyticsResponse(BaseModel):
@@ -77,6 +262,8 @@ class AnalyticsResponse(BaseModel):
     response_times: Optional[List[float]]
     quality_over_time: Optional[List[Dict[str, Any]]]
     feedback_distribution: Optional[Dict[str, int]]
+    approximation: Optional[ApproximateStats] = None
+    usage: Optional[UsageStats] = None
 
 
 class SettingsUpdate(BaseModel):
@@ -85,6 +272,10 @@ class SettingsUpdate(BaseModel):
     anthropic_api_key: Optional[str] = None
     deepseek_api_key: Optional[str] = None
     kimi_api_key: Optional[str] = None
+    openai_api_keys: Optional[List[str]] = None
+    anthropic_api_keys: Optional[List[str]] = None
+    deepseek_api_keys: Optional[List[str]] = None
+    kimi_api_keys: Optional[List[str]] = None
     theme: Optional[str] = None
     primary_color: Optional[str] = None
     secondary_color: Optional[str] = None
@@ -100,6 +291,19 @@ class SettingsResponse(BaseModel):
     updated_at: datetime
 
 
+class ApiKeyStatus(BaseModel):
+    """Schema for the state of one pooled API key (secret masked)"""
+    provider: str
+    key: str
+    available: bool
+    cooldown_remaining: float
+    cooldown_reason: Optional[str] = None
+    headroom: float
+    in_flight: int
+    requests: int
+    errors: int
+
+
 class ConnectionTest(BaseModel):
     """Schema for connection test"""
     provider: Provider
@@ -112,3 +316,15 @@ class ConnectionTestResponse(BaseModel):
     message: str
     provider: str
 
+
+class ProfileInfo(BaseModel):
+    """Schema for a captured request profile"""
+    id: str
+    created_at: datetime
+    method: str
+    path: str
+    status_code: int
+    duration: float
+    mode: str = Field(..., description="on-demand or sampled")
+    format: str = Field(..., description="speedscope, html or pstats")
+    size: int
@@ -2,86 +2,571 @@
 AI Service - Handles interactions with various AI providers
 """
 import httpx
+import asyncio
+import importlib
 import os
 import logging
-from typing import Optional
-from app.schemas import Provider, ModelRequest, ModelResponse
+import time
+from collections import OrderedDict
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+from app.schemas import Provider, ModelRequest, ModelResponse, NearDuplicate, Priority
 from app.config import settings
+from app.exceptions import (
+    GenerationPreemptedError,
+    GenerationQueueFullError,
+    ProviderKeysExhaustedError,
+    ServiceDrainingError,
+)
+from app.metrics import (
+    provider_cache_tokens_total,
+    provider_request_duration_seconds,
+    provider_requests_total,
+)
+from app.tracing import span
+from app.services.generation_scheduler import generation_scheduler
+from app.services.key_pool import KeyPool, PooledKey
+from app.services.conversation_store import (
+    SUMMARY_INSTRUCTIONS,
+    SUMMARY_MAX_TRANSCRIPT_CHARS,
+    ConversationContext,
+    Turn,
+    conversation_store,
+)
+from app.services.prompt_index import prompt_index, prompt_index_lookups_total
+from app.services.prompt_cache import (
+    anthropic_cache_headers,
+    anthropic_messages,
+    anthropic_system,
+    cache_usage,
+    chat_messages,
+    openai_cache_options,
+)
+from app.services.token_counter import token_counter
+from app.services.usage_service import usage_service
+from app.services.worker_pool import worker_pool
 
 logger = logging.getLogger(__name__)
 
+# Provider SDKs imported at startup instead of on the first request
+PROVIDER_SDK_MODULES = ("openai", "anthropic")
+
+PROVIDER_BASE_URLS = {
+    Provider.OPENAI: settings.OPENAI_BASE_URL,
+    Provider.ANTHROPIC: settings.ANTHROPIC_BASE_URL,
+    Provider.DEEPSEEK: settings.DEEPSEEK_BASE_URL,
+    Provider.KIMI: settings.KIMI_BASE_URL,
+}
+
+# Environment variables holding each provider's key and extra pooled keys
+PROVIDER_KEY_SETTINGS = {
+    Provider.OPENAI: ("OPENAI_API_KEY", "OPENAI_API_KEYS"),
+    Provider.ANTHROPIC: ("ANTHROPIC_API_KEY", "ANTHROPIC_API_KEYS"),
+    Provider.DEEPSEEK: ("DEEPSEEK_API_KEY", "DEEPSEEK_API_KEYS"),
+    Provider.KIMI: ("KIMI_API_KEY", "KIMI_API_KEYS"),
+}
+
+# SDK clients kept per (provider, API key); header overrides can add more
+MAX_CACHED_CLIENTS = 64
+
+# Provider statuses (besides 5xx) that may succeed when simply tried again
+TRANSIENT_STATUSES = {408, 409, 429}
+# Provider statuses worth retrying on a different key
+FAIL_OVER_STATUSES = TRANSIENT_STATUSES | {401, 403}
+
+# Errors raised before a request is sent, not counted as provider errors
+_NOT_SENT_ERRORS = (ValueError, ProviderKeysExhaustedError, GenerationQueueFullError, GenerationPreemptedError)
+
+
+def _classify(error: Exception, statuses: Set[int]) -> bool:
+    cause = error.__cause__ or error
+    status_code = getattr(cause, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in statuses or status_code >= 500
+    # Both SDKs raise APIConnectionError (and its timeout subclass) when no
+    # response arrived
+    return any(cls.__name__ == "APIConnectionError" for cls in type(cause).__mro__)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether a failed provider call may succeed if tried again later"""
+    return _classify(error, TRANSIENT_STATUSES)
+
+
+def _should_fail_over(error: Exception) -> bool:
+    """Whether a failed call may succeed with another key"""
+    return _classify(error, FAIL_OVER_STATUSES)
+
+
+def _request_api_key(request: httpx.Request) -> Optional[str]:
+    """The API key an SDK request was sent with"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    return request.headers.get("x-api-key")
+
 
 class AIService:
     """Service for interacting with AI providers"""
     
     def __init__(self):
-        self.openai_api_key = os.getenv("OPENAI_API_KEY", settings.OPENAI_API_KEY)
-        self.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", settings.ANTHROPIC_API_KEY)
-        self.deepseek_api_key = os.getenv("DEEPSEEK_API_KEY", settings.DEEPSEEK_API_KEY)
-        self.kimi_api_key = os.getenv("KIMI_API_KEY", settings.KIMI_API_KEY)
         self.timeout = settings.REQUEST_TIMEOUT
+        # API keys per provider, reloadable from the environment
+        self.key_pools: Dict[Provider, KeyPool] = {
+            provider: KeyPool(
+                provider.value,
+                cooldown=settings.KEY_POOL_COOLDOWN,
+                max_cooldown=settings.KEY_POOL_MAX_COOLDOWN,
+                auth_cooldown=settings.KEY_POOL_AUTH_COOLDOWN
+            )
+            for provider in PROVIDER_KEY_SETTINGS
+        }
+        # Shared connection pool and SDK clients, built at startup or on first use
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: "OrderedDict[Tuple[Provider, str, Optional[int]], Any]" = OrderedDict()
+        # Provider calls currently running, and whether new ones are refused
+        self.in_flight = 0
+        self.draining = False
+        # Fire-and-forget work (conversation summaries), cancelled on close
+        self._background: Set[asyncio.Task] = set()
+        self.reload_keys()
+    
+    def reload_keys(self) -> None:
+        """
+        Re-read every provider's keys from the environment
+        
+        ``<PROVIDER>_API_KEY`` and the comma-separated ``<PROVIDER>_API_KEYS``
+        together form the pool. Keys that stay keep their cooldown and
+        headroom; clients for removed keys are dropped.
+        """
+        removed = set()
+        for provider, (key_name, pool_name) in PROVIDER_KEY_SETTINGS.items():
+            keys = [key.strip() for key in os.getenv(pool_name, getattr(settings, pool_name)).split(",")]
+            keys.append(os.getenv(key_name, getattr(settings, key_name)))
+            removed.update(self.key_pools[provider].set_keys(keys))
+        for client_key in [client_key for client_key in self._clients if client_key[1] in removed]:
+            del self._clients[client_key]
+    
+    def _configured_keys(self) -> List[Tuple[Provider, str]]:
+        return [
+            (provider, pooled_key)
+            for provider, pool in self.key_pools.items()
+            for pooled_key in pool.keys()
+        ]
+    
+    def key_status(self) -> List[Dict[str, Any]]:
+        """State of every pooled key, with secrets masked"""
+        return [status for pool in self.key_pools.values() for status in pool.status()]
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Connection pool shared by every provider SDK client"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.PROVIDER_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.PROVIDER_MAX_KEEPALIVE
+                ),
+                event_hooks={"response": [self._observe_response]}
+            )
+            self._clients.clear()
+        return self._http_client
+    
+    async def _observe_response(self, response: httpx.Response) -> None:
+        """Feed every provider response (SDK retries included) to its key's pool"""
+        api_key = _request_api_key(response.request)
+        if not api_key:
+            return
+        for pool in self.key_pools.values():
+            pooled = pool.get(api_key)
+            if pooled is not None:
+                pool.observe(pooled, response.status_code, response.headers)
+                return
+    
+    def _get_client(self, provider: Provider, api_key: str) -> Any:
+        """
+        Get a cached SDK client for a provider and API key
+        
+        Args:
+            provider: AI provider
+            api_key: API key the client authenticates with
+        
+        Returns:
+            AsyncAnthropic for Anthropic, otherwise an OpenAI-compatible AsyncOpenAI
+        """
+        http_client = self._get_http_client()
+        # With several pooled keys, retries go to another key (see generate)
+        # instead of back to the one that just failed
+        pool = self.key_pools[provider]
+        max_retries = 0 if len(pool) > 1 and pool.get(api_key) is not None else None
+        key = (provider, api_key, max_retries)
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+        
+        options: Dict[str, Any] = {}
+        if max_retries is not None:
+            options["max_retries"] = max_retries
+        if provider == Provider.ANTHROPIC:
+            import anthropic
+            
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                base_url=PROVIDER_BASE_URLS[provider],
+                http_client=http_client,
+                **options
+            )
+        else:
+            from openai import AsyncOpenAI
+            
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=PROVIDER_BASE_URLS[provider],
+                http_client=http_client,
+                **options
+            )
+        
+        self._clients[key] = client
+        while len(self._clients) > MAX_CACHED_CLIENTS:
+            self._clients.popitem(last=False)
+        return client
+    
+    async def startup(self) -> None:
+        """
+        Pre-import provider SDKs and build clients for configured keys
+        
+        With ``STARTUP_WARM_CONNECTIONS`` enabled, also opens a connection to
+        each configured provider so the first request skips the TLS handshake.
+        Failures are logged and never block startup.
+        """
+        for module in PROVIDER_SDK_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                logger.warning(f"Provider SDK '{module}' is not installed")
+        try:
+            # May download the tokenizer's encoding; keep it off the loop
+            await worker_pool.run(token_counter.warm)
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer: {str(e)}")
+        
+        http_client = self._get_http_client()
+        configured = self._configured_keys()
+        for provider, api_key in configured:
+            try:
+                self._get_client(provider, api_key)
+            except Exception as e:
+                logger.warning(f"Could not create {provider.value} client: {str(e)}")
+        
+        if settings.STARTUP_WARM_CONNECTIONS and configured:
+            urls = {PROVIDER_BASE_URLS[provider] for provider, _ in configured}
+            results = await asyncio.gather(
+                *(http_client.head(url, timeout=5.0) for url in urls),
+                return_exceptions=True
+            )
+            for url, result in zip(urls, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Could not warm connection to {url}: {str(result)}")
+    
+    def begin_drain(self) -> None:
+        """Refuse new provider calls; running ones are left to finish"""
+        self.draining = True
+    
+    async def drain(self, timeout: float) -> int:
+        """
+        Wait for in-flight provider calls to finish
+        
+        Args:
+            timeout: Maximum seconds to wait
+        
+        Returns:
+            Number of calls still running when the deadline passed
+        """
+        self.begin_drain()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.in_flight and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        return self.in_flight
+    
+    async def aclose(self) -> None:
+        """Cancel background work and close the shared connection pool"""
+        for task in list(self._background):
+            task.cancel()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self._clients.clear()
     
     async def generate(
         self,
         request: ModelRequest,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        use_index: bool = True
     ) -> ModelResponse:
         """
         Generate content using the specified AI provider
         
+        With ``reuse_threshold`` set, a response already generated for a
+        prompt at least that similar (same provider, model, system prompt,
+        max_tokens and temperature) is returned without calling the
+        provider. Otherwise the call waits for a provider slot in its
+        priority lane.
+        
         Args:
             request: Model request with prompt and parameters
             api_key: Optional API key override
+            use_index: Whether the near-duplicate prompt index may answer and
+                record the call; internal calls such as summaries opt out
         
         Returns:
             ModelResponse with generated content
         
         Raises:
-            ValueError: If provider is unsupported or configuration is invalid
+            ValueError: If provider is unsupported, configuration is invalid or
+                reuse_threshold is below the prompt index's detection floor
+            ServiceDrainingError: If the server is shutting down
+            ContextWindowExceededError: If the request can't fit the model's context window
+            GenerationQueueFullError: If too many generations are already waiting for the provider
+            GenerationPreemptedError: If a queued bulk request gave way to interactive ones
             Exception: If API call fails
         """
+        if self.draining:
+            raise ServiceDrainingError()
+        
         logger.info(f"Generating content with provider: {request.provider}, model: {request.model}")
         
+        if request.use_history and not request.session_id:
+            raise ValueError("use_history requires a session_id")
+        # A prompt answered within a conversation depends on its history
+        use_index = use_index and settings.PROMPT_INDEX_ENABLED and not request.use_history
+        
+        match = signature = None
+        if use_index:
+            with span("dedupe"):
+                if request.reuse_threshold is not None:
+                    match, signature = prompt_index.lookup(request, request.reuse_threshold)
+                    if match is not None:
+                        prompt_index_lookups_total.inc("reused")
+                        return match.response.model_copy(update={"near_duplicate": NearDuplicate(
+                            similarity=match.similarity,
+                            reused=True,
+                            generated_at=match.response.timestamp
+                        )})
+                # Only answers from the caller's own session are surfaced
+                if settings.PROMPT_INDEX_SURFACE_THRESHOLD > 0:
+                    match, signature = prompt_index.lookup(
+                        request,
+                        max(settings.PROMPT_INDEX_SURFACE_THRESHOLD, prompt_index.floor),
+                        same_session=True,
+                        sig=signature
+                    )
+            prompt_index_lookups_total.inc("surfaced" if match is not None else "miss")
+        
+        # Refuse (or clamp) what the provider would reject, before any network call
+        with span("tokenize"):
+            request, estimate = token_counter.precheck(request)
+        
+        context = None
+        if request.use_history:
+            # Whatever history fits next to the prompt and its output
+            with span("history"):
+                context = await conversation_store.context(request, token_counter.headroom(estimate))
+            estimate.prompt_tokens += context.tokens
+        
+        scheduler = generation_scheduler.for_provider(request.provider.value) if settings.SCHEDULER_ENABLED else None
+        scheduled = False
+        start_time = time.perf_counter()
+        self.in_flight += 1
         try:
-            if request.provider == Provider.OPENAI:
-                return await self._generate_openai(request, api_key)
-            elif request.provider == Provider.ANTHROPIC:
-                return await self._generate_anthropic(request, api_key)
-            elif request.provider == Provider.DEEPSEEK:
-                return await self._generate_deepseek(request, api_key)
-            elif request.provider == Provider.KIMI:
-                return await self._generate_kimi(request, api_key)
-            else:
-                raise ValueError(f"Unsupported provider: {request.provider}")
+            if scheduler is not None:
+                with span("schedule", lane=request.priority.value):
+                    queue_time = await scheduler.acquire(
+                        request.priority,
+                        request.session_id or "",
+                        estimate.prompt_tokens + request.max_tokens
+                    )
+                scheduled = True
+                # Provider latency starts once the call has a slot
+                start_time = time.perf_counter()
+            with span("provider", provider=request.provider.value, model=request.model):
+                if api_key:
+                    response = await self._dispatch(request, api_key, context)
+                else:
+                    response = await self._generate_pooled(
+                        request, tokens=estimate.prompt_tokens + request.max_tokens, context=context
+                    )
         except Exception as e:
             logger.error(f"Generation failed: {str(e)}", exc_info=True)
+            # Configuration and scheduling errors never reached the provider
+            if not isinstance(e, _NOT_SENT_ERRORS):
+                provider_requests_total.inc(request.provider.value, "error")
+                provider_request_duration_seconds.observe(
+                    time.perf_counter() - start_time, request.provider.value
+                )
+                usage_service.record(
+                    provider=request.provider.value,
+                    model=request.model,
+                    latency=time.perf_counter() - start_time,
+                    session_id=request.session_id,
+                    error=True
+                )
             raise
+        finally:
+            self.in_flight -= 1
+            if scheduled:
+                scheduler.release(request.priority)
+        
+        latency = time.perf_counter() - start_time
+        response.latency = round(latency, 4)
+        if scheduled:
+            response.queue_time = round(queue_time, 4)
+        response.estimated_prompt_tokens = estimate.prompt_tokens
+        provider_requests_total.inc(request.provider.value, "success")
+        provider_request_duration_seconds.observe(latency, request.provider.value)
+        usage_service.record(
+            provider=request.provider.value,
+            model=request.model,
+            # Compatible providers may omit usage; fall back to the estimate
+            prompt_tokens=response.prompt_tokens or estimate.prompt_tokens,
+            completion_tokens=response.completion_tokens or 0,
+            latency=response.latency,
+            session_id=request.session_id,
+            cache_read_tokens=response.cache_read_tokens or 0,
+            cache_write_tokens=response.cache_write_tokens or 0
+        )
+        if response.cache_read_tokens:
+            provider_cache_tokens_total.inc(request.provider.value, "read", amount=response.cache_read_tokens)
+        if response.cache_write_tokens:
+            provider_cache_tokens_total.inc(request.provider.value, "write", amount=response.cache_write_tokens)
+        
+        if context is not None:
+            response.history_turns = context.turns
+            response.history_truncated = context.truncated
+            await conversation_store.append(request, response.content)
+            overflow = conversation_store.take_overflow(request.session_id)
+            if overflow is not None:
+                self._start_background(self._summarize(request, *overflow))
+        
+        if use_index:
+            prompt_index.add(request, response, signature)
+            if match is not None:
+                response = response.model_copy(update={"near_duplicate": NearDuplicate(
+                    similarity=match.similarity,
+                    reused=False,
+                    content=match.response.content,
+                    generated_at=match.response.timestamp
+                )})
+        return response
+    
+    def _start_background(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def _summarize(self, request: ModelRequest, turns: List[Turn], summary: Optional[str]) -> None:
+        """
+        Fold a session's oldest turns into its rolling summary
+        
+        Runs after the reply that pushed the session over its history
+        budget has been returned; until it finishes, the turns are just
+        truncated. The summary is billed to the session like any call.
+        """
+        header = SUMMARY_INSTRUCTIONS + (f"Summary so far:\n{summary}\n\n" if summary else "") + "Conversation:\n"
+        transcript = "\n\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+        summary_request = ModelRequest(
+            # Keep the newest part of an over-long transcript
+            prompt=header + transcript[-SUMMARY_MAX_TRANSCRIPT_CHARS:],
+            provider=request.provider,
+            model=request.model,
+            temperature=0.0,
+            max_tokens=settings.CONVERSATION_SUMMARY_TOKENS,
+            session_id=request.session_id,
+            priority=Priority.BULK
+        )
+        try:
+            # A summary must come from the provider, and is no answer to offer others
+            response = await self.generate(summary_request, use_index=False)
+        except Exception as e:
+            logger.warning(f"Could not summarize conversation {request.session_id}: {str(e)}")
+            conversation_store.summary_failed(request.session_id)
+            return
+        conversation_store.apply_summary(request, response.content, turns[-1].seq)
+    
+    async def _generate_pooled(
+        self,
+        request: ModelRequest,
+        tokens: int = 0,
+        context: Optional[ConversationContext] = None
+    ) -> ModelResponse:
+        """
+        Call a provider with keys from its pool
+        
+        A call that fails in a way another key may avoid (rate limited,
+        rejected key, server or connection error) is retried on a different
+        key, up to ``KEY_POOL_MAX_ATTEMPTS`` keys.
+        
+        Args:
+            request: Model request
+            tokens: Estimated tokens the call will count against the key's quota
+            context: Stored conversation to send ahead of the prompt
+        """
+        pool = self.key_pools.get(request.provider)
+        if pool is None:
+            raise ValueError(f"Unsupported provider: {request.provider}")
+        attempts = max(1, min(settings.KEY_POOL_MAX_ATTEMPTS, len(pool)))
+        for attempt in range(attempts):
+            pooled: Optional[PooledKey] = pool.acquire(tokens)
+            try:
+                return await self._dispatch(request, pooled.key if pooled else None, context)
+            except Exception as e:
+                if attempt + 1 >= attempts or not _should_fail_over(e) or not pool.has_available():
+                    raise
+                logger.warning(
+                    f"{request.provider.value} call with key {pooled.masked} failed, "
+                    f"trying another key: {str(e)}"
+                )
+            finally:
+                if pooled is not None:
+                    pool.release(pooled)
+        raise AssertionError("unreachable")
+    
+    async def _dispatch(
+        self,
+        request: ModelRequest,
+        api_key: Optional[str],
+        context: Optional[ConversationContext] = None
+    ) -> ModelResponse:
+        """Call the request's provider with one API key"""
+        if request.provider == Provider.OPENAI:
+            return await self._generate_openai(request, api_key, context)
+        elif request.provider == Provider.ANTHROPIC:
+            return await self._generate_anthropic(request, api_key, context)
+        elif request.provider == Provider.DEEPSEEK:
+            return await self._generate_deepseek(request, api_key, context)
+        elif request.provider == Provider.KIMI:
+            return await self._generate_kimi(request, api_key, context)
+        raise ValueError(f"Unsupported provider: {request.provider}")
     
     async def _generate_openai(
         self,
         request: ModelRequest,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        context: Optional[ConversationContext] = None
     ) -> ModelResponse:
         """Generate content using OpenAI API"""
-        api_key = api_key or self.openai_api_key
         if not api_key:
             raise ValueError("OpenAI API key not configured")
         
         try:
-            from openai import AsyncOpenAI
-            
-            client = AsyncOpenAI(api_key=api_key)
-            
-            messages = []
-            if request.system_prompt:
-                messages.append({"role": "system", "content": request.system_prompt})
-            messages.append({"role": "user", "content": request.prompt})
+            client = self._get_client(Provider.OPENAI, api_key)
             
             response = await client.chat.completions.create(
                 model=request.model,
-                messages=messages,
+                messages=chat_messages(request, context),
                 temperature=request.temperature,
-                max_tokens=request.max_tokens
+                max_tokens=request.max_tokens,
+                **openai_cache_options(request)
             )
             
             return ModelResponse(
@@ -89,75 +574,70 @@ class AIService:
                 model=request.model,
                 provider="openai",
                 tokens_used=response.usage.total_tokens if response.usage else None,
+                prompt_tokens=response.usage.prompt_tokens if response.usage else None,
+                completion_tokens=response.usage.completion_tokens if response.usage else None,
+                cache_read_tokens=cache_usage(request.provider, response.usage)[0],
                 finish_reason=response.choices[0].finish_reason
             )
         except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            raise Exception(f"OpenAI API error: {str(e)}") from e
     
     async def _generate_anthropic(
         self,
         request: ModelRequest,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        context: Optional[ConversationContext] = None
     ) -> ModelResponse:
         """Generate content using Anthropic API"""
-        api_key = api_key or self.anthropic_api_key
         if not api_key:
             raise ValueError("Anthropic API key not configured")
         
         try:
-            import anthropic
-            
-            client = anthropic.AsyncAnthropic(api_key=api_key)
-            
-            system_prompt = request.system_prompt or ""
+            client = self._get_client(Provider.ANTHROPIC, api_key)
             
             response = await client.messages.create(
                 model=request.model,
                 max_tokens=request.max_tokens,
                 temperature=request.temperature,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": request.prompt}
-                ]
+                system=anthropic_system(request, context.summary if context else None),
+                messages=anthropic_messages(request, context),
+                extra_headers=anthropic_cache_headers()
             )
             
+            # input_tokens excludes the cached prefix; report the whole prompt
+            cache_read, cache_write = cache_usage(request.provider, response.usage)
+            prompt_tokens = response.usage.input_tokens + cache_read + cache_write
             return ModelResponse(
                 content=response.content[0].text,
                 model=request.model,
                 provider="anthropic",
-                tokens_used=response.usage.input_tokens + response.usage.output_tokens,
+                tokens_used=prompt_tokens + response.usage.output_tokens,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=response.usage.output_tokens,
+                cache_read_tokens=cache_read,
+                cache_write_tokens=cache_write,
                 finish_reason=response.stop_reason
             )
         except Exception as e:
-            raise Exception(f"Anthropic API error: {str(e)}")
+            raise Exception(f"Anthropic API error: {str(e)}") from e
     
     async def _generate_deepseek(
         self,
         request: ModelRequest,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        context: Optional[ConversationContext] = None
     ) -> ModelResponse:
         """Generate content using Deepseek API"""
-        api_key = api_key or self.deepseek_api_key
         if not api_key:
             raise ValueError("Deepseek API key not configured")
         
         try:
-            from openai import AsyncOpenAI
-            
             # Deepseek uses OpenAI-compatible API
-            client = AsyncOpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com/v1"
-            )
-            
-            messages = []
-            if request.system_prompt:
-                messages.append({"role": "system", "content": request.system_prompt})
-            messages.append({"role": "user", "content": request.prompt})
+            client = self._get_client(Provider.DEEPSEEK, api_key)
             
             response = await client.chat.completions.create(
                 model=request.model,
-                messages=messages,
+                messages=chat_messages(request, context),
                 temperature=request.temperature,
                 max_tokens=request.max_tokens
             )
@@ -167,38 +647,31 @@ class AIService:
                 model=request.model,
                 provider="deepseek",
                 tokens_used=response.usage.total_tokens if response.usage else None,
+                prompt_tokens=response.usage.prompt_tokens if response.usage else None,
+                completion_tokens=response.usage.completion_tokens if response.usage else None,
+                cache_read_tokens=cache_usage(request.provider, response.usage)[0],
                 finish_reason=response.choices[0].finish_reason
             )
         except Exception as e:
-            raise Exception(f"Deepseek API error: {str(e)}")
+            raise Exception(f"Deepseek API error: {str(e)}") from e
     
     async def _generate_kimi(
         self,
         request: ModelRequest,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        context: Optional[ConversationContext] = None
     ) -> ModelResponse:
         """Generate content using Kimi API"""
-        api_key = api_key or self.kimi_api_key
         if not api_key:
             raise ValueError("Kimi API key not configured")
         
         try:
-            from openai import AsyncOpenAI
-            
             # Kimi uses OpenAI-compatible API
-            client = AsyncOpenAI(
-                api_key=api_key,
-                base_url="https://api.moonshot.cn/v1"
-            )
-            
-            messages = []
-            if request.system_prompt:
-                messages.append({"role": "system", "content": request.system_prompt})
-            messages.append({"role": "user", "content": request.prompt})
+            client = self._get_client(Provider.KIMI, api_key)
             
             response = await client.chat.completions.create(
                 model=request.model,
-                messages=messages,
+                messages=chat_messages(request, context),
                 temperature=request.temperature,
                 max_tokens=request.max_tokens
             )
@@ -208,10 +681,13 @@ class AIService:
                 model=request.model,
                 provider="kimi",
                 tokens_used=response.usage.total_tokens if response.usage else None,
+                prompt_tokens=response.usage.prompt_tokens if response.usage else None,
+                completion_tokens=response.usage.completion_tokens if response.usage else None,
+                cache_read_tokens=cache_usage(request.provider, response.usage)[0],
                 finish_reason=response.choices[0].finish_reason
             )
         except Exception as e:
-            raise Exception(f"Kimi API error: {str(e)}")
+            raise Exception(f"Kimi API error: {str(e)}") from e
     
     async def test_connection(
         self,
@@ -239,7 +715,7 @@ class AIService:
             )
             
             # Try to generate a response
-            await self.generate(test_request, api_key)
+            await self.generate(test_request, api_key, use_index=False)
             return True
         except Exception:
             return False
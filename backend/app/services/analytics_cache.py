@@ -0,0 +1,127 @@
+"""
+Analytics Cache - Memoizes analytics results between feedback writes
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+import hashlib
+import threading
+
+from app.schemas import AnalyticsRequest, AnalyticsResponse
+
+CacheKey = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], bool]
+
+
+@dataclass
+class CacheEntry:
+    """A cached analytics result and the store state it was computed from"""
+    response: AnalyticsResponse
+    body: bytes
+    etag: str
+    computed_at: datetime
+    write_generation: int
+    delete_generation: int
+
+
+class AnalyticsCache:
+    """
+    Bounded LRU cache of analytics results.
+    
+    An entry stays valid while the feedback store's write generation is
+    unchanged. Windows whose end date had already passed when the entry was
+    computed ("closed" windows) can't be affected by new feedback, which is
+    always stamped with the current time, so they only invalidate on deletes.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(request: AnalyticsRequest) -> CacheKey:
+        """Normalize an analytics request into a hashable cache key"""
+        return (
+            request.start_date.isoformat() if request.start_date else None,
+            request.end_date.isoformat() if request.end_date else None,
+            request.provider.value if request.provider else None,
+            request.model,
+            request.approximate,
+        )
+    
+    @staticmethod
+    def is_closed_window(request: AnalyticsRequest, at: datetime) -> bool:
+        """Whether the requested window ended before the given time"""
+        end_date = request.end_date
+        if end_date is None:
+            return False
+        if end_date.tzinfo is not None:
+            at = at.astimezone(end_date.tzinfo)
+        return end_date < at
+    
+    def get(
+        self,
+        request: AnalyticsRequest,
+        write_generation: int,
+        delete_generation: int
+    ) -> Optional[CacheEntry]:
+        """Return a still-valid entry for the request, if any"""
+        key = self.make_key(request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.delete_generation == delete_generation and (
+                entry.write_generation == write_generation
+                or self.is_closed_window(request, entry.computed_at)
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(
+        self,
+        request: AnalyticsRequest,
+        response: AnalyticsResponse,
+        computed_at: datetime,
+        write_generation: int,
+        delete_generation: int
+    ) -> CacheEntry:
+        """Store a freshly computed result and return its entry"""
+        # Serialized once here: the body doubles as the ETag source and is
+        # sent on every hit. Usage changes with every provider call, not
+        # with feedback, so it is left out and attached per request
+        body = response.model_dump_json(exclude={"usage"}).encode()
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        entry = CacheEntry(
+            response=response,
+            body=body,
+            etag=f'"{etag}"',
+            computed_at=computed_at,
+            write_generation=write_generation,
+            delete_generation=delete_generation,
+        )
+        key = self.make_key(request)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+    
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+    
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of lookups served from the cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
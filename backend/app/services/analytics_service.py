@@ -1,15 +1,35 @@
 """
 Analytics Service - Handles analytics and metrics
 """
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from app.schemas import AnalyticsRequest, AnalyticsResponse, Provider
-from app.services.feedback_service import feedback_service
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+import asyncio
+import dataclasses
+import heapq
+from app.schemas import AnalyticsRequest, AnalyticsResponse, ApproximateStats, Provider
+from app.config import settings
+from app.metrics import registry
+from app.tracing import span
+from app.services.analytics_cache import AnalyticsCache, CacheEntry
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.sketch_index import BucketSketch, feedback_rollups, sketch_index
+from app.services.sketches import HyperLogLog
+from app.services.usage_service import usage_service
+from app.services.worker_pool import check_cancelled, worker_pool
+
+# Rating and latency quantiles reported in approximate mode
+APPROXIMATE_QUANTILES = {"p25": 0.25, "p50": 0.5, "p75": 0.75, "p90": 0.9, "p99": 0.99}
 
 
 class AnalyticsService:
     """Service for analytics and metrics"""
     
+    def __init__(self):
+        self.cache = AnalyticsCache(max_entries=settings.ANALYTICS_CACHE_SIZE)
+        # In-flight computations by cache key: [future, waiter count]
+        self._inflight: Dict[Any, List[Any]] = {}
+    
     def get_analytics(
         self,
         request: AnalyticsRequest
@@ -23,8 +43,188 @@ class AnalyticsService:
         Returns:
             Analytics response with metrics
         """
-        # Get all feedback
-        all_feedback = feedback_service.get_all_feedback(limit=10000)
+        return self.get_analytics_entry(request).response
+    
+    def get_analytics_entry(
+        self,
+        request: AnalyticsRequest
+    ) -> CacheEntry:
+        """
+        Get analytics data together with its cache metadata (ETag etc.)
+        
+        Results are reused until a feedback write could have changed them;
+        current usage totals are attached to every result.
+        Blocking and CPU-bound on a miss; async callers should use
+        get_analytics_entry_async instead.
+        
+        Args:
+            request: Analytics request with filters
+        
+        Returns:
+            Cache entry wrapping the analytics response
+        """
+        entry, state = self._lookup(request)
+        if entry is None:
+            entry = self._compute_and_store(request, state)
+        return self._with_usage(request, entry)
+    
+    async def get_analytics_entry_async(
+        self,
+        request: AnalyticsRequest
+    ) -> CacheEntry:
+        """
+        Get analytics data without blocking the event loop
+        
+        Cache hits are answered inline. Misses are computed in the worker
+        pool, and identical requests arriving meanwhile share that one
+        computation. It is cancelled once every waiter has gone away.
+        
+        Args:
+            request: Analytics request with filters
+        
+        Returns:
+            Cache entry wrapping the analytics response
+        """
+        entry, state = self._lookup(request)
+        if entry is not None:
+            return self._with_usage(request, entry)
+        
+        key = self.cache.make_key(request)
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            future = asyncio.ensure_future(
+                worker_pool.run(self._compute_and_store, request, state)
+            )
+            inflight = self._inflight[key] = [future, 0]
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        inflight[1] += 1
+        try:
+            entry = await asyncio.shield(inflight[0])
+        except asyncio.CancelledError:
+            if inflight[1] == 1:
+                inflight[0].cancel()
+            raise
+        finally:
+            inflight[1] -= 1
+        return self._with_usage(request, entry)
+    
+    def get_cached_entry(
+        self,
+        request: AnalyticsRequest
+    ) -> Optional[CacheEntry]:
+        """
+        Get analytics data only if a still-valid cached result exists
+        
+        Never computes, so it is safe to call on the event loop.
+        
+        Args:
+            request: Analytics request with filters
+        
+        Returns:
+            Cache entry with current usage attached, or None on a miss
+        """
+        entry, _ = self._lookup(request)
+        return self._with_usage(request, entry) if entry is not None else None
+    
+    def _lookup(
+        self,
+        request: AnalyticsRequest
+    ) -> Tuple[Optional[CacheEntry], Tuple[int, int, datetime]]:
+        """Check the cache, returning the store state a miss should be computed at"""
+        # Snapshot the store state before computing so a concurrent write
+        # can only make the entry look stale, never falsely fresh
+        write_generation = feedback_service.write_generation
+        delete_generation = feedback_service.delete_generation
+        computed_at = datetime.now()
+        
+        entry = self.cache.get(request, write_generation, delete_generation)
+        return entry, (write_generation, delete_generation, computed_at)
+    
+    def _compute_and_store(
+        self,
+        request: AnalyticsRequest,
+        state: Tuple[int, int, datetime]
+    ) -> CacheEntry:
+        """Compute analytics and cache them against the given store state"""
+        write_generation, delete_generation, computed_at = state
+        with span("analytics"):
+            response = self._compute_analytics(request)
+        with span("serialize"):
+            return self.cache.put(
+                request,
+                response,
+                computed_at=computed_at,
+                write_generation=write_generation,
+                delete_generation=delete_generation
+            )
+    
+    @staticmethod
+    def _with_usage(request: AnalyticsRequest, entry: CacheEntry) -> CacheEntry:
+        """
+        Attach current usage totals to a cached entry, outside the cache
+        
+        Approximate results also get latency quantiles from the usage
+        buckets' sketches, which change with provider calls as well.
+        """
+        approximation = entry.response.approximation
+        usage, latency, version = usage_service.get_window_totals(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            provider=request.provider.value if request.provider else None,
+            model=request.model,
+            latency=approximation is not None
+        )
+        update: Dict[str, Any] = {"usage": usage}
+        if latency is not None:
+            quantiles = latency.quantiles(APPROXIMATE_QUANTILES.values())
+            update["approximation"] = approximation.model_copy(update={
+                "latency_quantiles": dict(zip(APPROXIMATE_QUANTILES, quantiles)),
+                "latency_quantiles_rank_error": round(latency.rank_error, 4)
+            })
+        response = entry.response.model_copy(update=update)
+        if latency is not None:
+            body = response.model_dump_json().encode()
+        else:
+            # The cached body is a JSON object without "usage"; splice it in
+            # rather than serializing the whole response again
+            body = entry.body[:-1] + b',"usage":' + usage.model_dump_json().encode() + b"}"
+        return dataclasses.replace(
+            entry,
+            response=response,
+            body=body,
+            # Only calls landing in the window change its ETag, and a window
+            # that has closed keeps the cached entry's
+            etag=entry.etag if version is None else f'{entry.etag[:-1]}-{version}"'
+        )
+    
+    def _compute_analytics(
+        self,
+        request: AnalyticsRequest
+    ) -> AnalyticsResponse:
+        """
+        Compute analytics from the raw feedback store
+        
+        Days compacted out of the raw store count through their rollups,
+        aligned to whole days; once any are included, distinct sessions are
+        estimated with HyperLogLog.
+        """
+        if request.approximate:
+            return self._compute_approximate_analytics(request)
+        
+        # Get all feedback, snapshotted together with the rollups so a
+        # record being compacted meanwhile is counted once
+        with feedback_rollups.lock:
+            records = list(feedback_storage.values())
+            rollups = feedback_rollups.collect(
+                request.start_date.date() if request.start_date else None,
+                request.end_date.date() if request.end_date else None
+            )
+        # The newest 10000 records, read as the validated dicts they are
+        # stored as: building a model per record made this allocation-bound,
+        # and the garbage collector pauses it caused stalled the event loop
+        all_feedback = heapq.nlargest(10000, records, key=itemgetter("timestamp"))
+        check_cancelled()
         
         # Apply filters
         filtered_feedback = all_feedback
@@ -32,32 +232,45 @@ class AnalyticsService:
         if request.start_date:
             filtered_feedback = [
                 f for f in filtered_feedback
-                if f.timestamp >= request.start_date
+                if f["timestamp"] >= request.start_date
             ]
         
         if request.end_date:
             filtered_feedback = [
                 f for f in filtered_feedback
-                if f.timestamp <= request.end_date
+                if f["timestamp"] <= request.end_date
             ]
         
         # Calculate metrics
-        total_sessions = len(set(f.session_id for f in filtered_feedback if f.session_id))
-        total_feedback = len(filtered_feedback)
+        sessions = set(f["session_id"] for f in filtered_feedback if f.get("session_id"))
+        if rollups:
+            estimate = HyperLogLog()
+            for session_id in sessions:
+                estimate.add(session_id)
+            for rollup in rollups.values():
+                estimate.merge(rollup.sessions)
+            total_sessions = round(estimate.estimate())
+        else:
+            total_sessions = len(sessions)
+        total_feedback = len(filtered_feedback) + sum(rollup.count for rollup in rollups.values())
         
-        if filtered_feedback:
-            average_quality = sum(f.rating for f in filtered_feedback) / total_feedback
+        if total_feedback:
+            rating_sum = sum(f["rating"] for f in filtered_feedback)
+            rating_sum += sum(rollup.rating_sum for rollup in rollups.values())
+            average_quality = rating_sum / total_feedback
         else:
             average_quality = 0.0
         
+        check_cancelled()
+        
         # Calculate improvement rate
-        improvement_rate = self._calculate_improvement_rate(filtered_feedback)
+        improvement_rate = self._calculate_improvement_rate(filtered_feedback, rollups)
         
         # Get quality over time
-        quality_over_time = self._get_quality_over_time(filtered_feedback)
+        quality_over_time = self._get_quality_over_time(filtered_feedback, rollups)
         
         # Get feedback distribution
-        feedback_distribution = self._get_feedback_distribution(filtered_feedback)
+        feedback_distribution = self._get_feedback_distribution(filtered_feedback, rollups)
         
         return AnalyticsResponse(
             total_sessions=total_sessions,
@@ -69,20 +282,74 @@ class AnalyticsService:
             feedback_distribution=feedback_distribution
         )
     
+    def _compute_approximate_analytics(
+        self,
+        request: AnalyticsRequest
+    ) -> AnalyticsResponse:
+        """
+        Compute analytics by merging per-day sketches
+        
+        Counts, averages and the distribution stay exact; distinct sessions
+        and responses come from HyperLogLog and rating quantiles from KLL.
+        Latency quantiles are attached per request by _with_usage. The
+        date range is aligned to whole days.
+        """
+        merged, quality_over_time = sketch_index.summarize(request.start_date, request.end_date)
+        
+        improvement_rate = None
+        if merged.count >= 2:
+            first_rating = merged.first[1]
+            improvement_rate = round((merged.last[1] - first_rating) / first_rating * 100, 2)
+        
+        feedback_distribution = {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0}
+        feedback_distribution.update(merged.distribution)
+        
+        quantiles = merged.ratings.quantiles(APPROXIMATE_QUANTILES.values())
+        distinct_sessions = round(merged.sessions.estimate())
+        
+        return AnalyticsResponse(
+            total_sessions=distinct_sessions,
+            average_quality=round(merged.rating_sum / merged.count, 2) if merged.count else 0.0,
+            total_feedback=merged.count,
+            improvement_rate=improvement_rate,
+            response_times=None,
+            quality_over_time=quality_over_time,
+            feedback_distribution=feedback_distribution,
+            approximation=ApproximateStats(
+                distinct_sessions=distinct_sessions,
+                distinct_sessions_error=round(merged.sessions.relative_error, 4),
+                distinct_responses=round(merged.responses.estimate()),
+                distinct_responses_error=round(merged.responses.relative_error, 4),
+                rating_quantiles=dict(zip(APPROXIMATE_QUANTILES, quantiles)),
+                rating_quantiles_rank_error=round(merged.ratings.rank_error, 4)
+            )
+        )
+    
     def _calculate_improvement_rate(
         self,
-        feedbacks: List
+        feedbacks: List,
+        rollups: Optional[Dict[date, BucketSketch]] = None
     ) -> Optional[float]:
         """Calculate improvement rate over time"""
-        if len(feedbacks) < 2:
+        rollups = rollups or {}
+        if len(feedbacks) + sum(rollup.count for rollup in rollups.values()) < 2:
             return None
         
-        # Sort by timestamp
-        sorted_feedback = sorted(feedbacks, key=lambda x: x.timestamp)
-        
-        # Get first and last ratings
-        first_rating = sorted_feedback[0].rating
-        last_rating = sorted_feedback[-1].rating
+        # Get first and last ratings, as (timestamp, rating)
+        first = last = None
+        if feedbacks:
+            # Ties keep store order, as a stable sort would
+            first = min(feedbacks, key=itemgetter("timestamp"))
+            last = max(reversed(feedbacks), key=itemgetter("timestamp"))
+            first = (first["timestamp"], first["rating"])
+            last = (last["timestamp"], last["rating"])
+        for rollup in rollups.values():
+            if first is None or rollup.first[0] < first[0]:
+                first = rollup.first
+            if last is None or rollup.last[0] >= last[0]:
+                last = rollup.last
+        first_rating = first[1]
+        last_rating = last[1]
         
         if first_rating == 0:
             return None
@@ -92,36 +359,44 @@ class AnalyticsService:
     
     def _get_quality_over_time(
         self,
-        feedbacks: List
+        feedbacks: List,
+        rollups: Optional[Dict[date, BucketSketch]] = None
     ) -> List[Dict[str, Any]]:
         """Get quality metrics over time"""
-        if not feedbacks:
+        if not feedbacks and not rollups:
             return []
         
-        # Group by date
-        date_groups: Dict[str, List[float]] = {}
+        # Group by date, as [rating sum, count]
+        date_groups: Dict[str, List[int]] = {}
         
         for feedback in feedbacks:
-            date_key = feedback.timestamp.date().isoformat()
+            date_key = feedback["timestamp"].date().isoformat()
             if date_key not in date_groups:
-                date_groups[date_key] = []
-            date_groups[date_key].append(feedback.rating)
+                date_groups[date_key] = [0, 0]
+            date_groups[date_key][0] += feedback["rating"]
+            date_groups[date_key][1] += 1
+        
+        for day, rollup in (rollups or {}).items():
+            group = date_groups.setdefault(day.isoformat(), [0, 0])
+            group[0] += rollup.rating_sum
+            group[1] += rollup.count
         
         # Calculate average for each date
         quality_over_time = [
             {
-                "date": date,
-                "average_quality": sum(ratings) / len(ratings),
-                "count": len(ratings)
+                "date": date_key,
+                "average_quality": rating_sum / count,
+                "count": count
             }
-            for date, ratings in sorted(date_groups.items())
+            for date_key, (rating_sum, count) in sorted(date_groups.items())
         ]
         
         return quality_over_time
     
     def _get_feedback_distribution(
         self,
-        feedbacks: List
+        feedbacks: List,
+        rollups: Optional[Dict[date, BucketSketch]] = None
     ) -> Dict[str, int]:
         """Get distribution of feedback ratings"""
         distribution = {
@@ -133,13 +408,22 @@ class AnalyticsService:
         }
         
         for feedback in feedbacks:
-            rating_str = str(feedback.rating)
+            rating_str = str(feedback["rating"])
             if rating_str in distribution:
                 distribution[rating_str] += 1
         
+        for rollup in (rollups or {}).values():
+            for rating_str, count in rollup.distribution.items():
+                if rating_str in distribution:
+                    distribution[rating_str] += count
+        
         return distribution
 
 
 # Create singleton instance
 analytics_service = AnalyticsService()
-
+registry.register_collector(lambda: [
+    ("hfrl_analytics_cache_hits_total", "counter", "Analytics cache hits", analytics_service.cache.hits),
+    ("hfrl_analytics_cache_misses_total", "counter", "Analytics cache misses", analytics_service.cache.misses),
+    ("hfrl_analytics_cache_hit_ratio", "gauge", "Analytics cache hit ratio", analytics_service.cache.hit_ratio),
+])
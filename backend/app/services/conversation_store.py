@@ -0,0 +1,421 @@
+"""
+Conversation Store - Server-side multi-turn history keyed by session
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+from app.metrics import registry
+from app.schemas import ModelRequest
+from app.services.token_counter import TOKENS_PER_MESSAGE, token_counter
+
+logger = logging.getLogger(__name__)
+
+conversation_truncations_total = registry.counter(
+    "hfrl_conversation_truncations_total",
+    "Requests whose stored history was cut to fit the token budget",
+    ("policy",)
+)
+
+# How a rolling summary is introduced to the model
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for use as context in its continuation. "
+    "Keep facts, decisions, names and open questions; drop pleasantries. "
+    "Reply with the summary only.\n\n"
+)
+# Transcript sent for summarizing, within ModelRequest's prompt limit
+SUMMARY_MAX_TRANSCRIPT_CHARS = 40000
+
+
+@dataclass
+class Turn:
+    """One stored message"""
+    seq: int
+    role: str
+    content: str
+    tokens: int
+    created: float
+
+
+@dataclass
+class Conversation:
+    """A session's stored turns and the summary of turns folded out of them"""
+    session_id: str
+    turns: List[Turn] = field(default_factory=list)
+    summary: Optional[str] = None
+    summary_tokens: int = 0
+    next_seq: int = 0
+    last_active: float = field(default_factory=time.time)
+    summarizing: bool = False
+    
+    @property
+    def tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+
+@dataclass
+class ConversationContext:
+    """History to send ahead of a request's prompt"""
+    messages: List[Dict[str, str]]
+    summary: Optional[str]
+    tokens: int
+    turns: int
+    truncated: bool
+
+
+class ConversationStore:
+    """
+    Turns of multi-turn sessions, kept server-side
+    
+    Generations with ``use_history`` get the session's earlier turns sent
+    ahead of their prompt, newest first within a token budget (the
+    configured budget or what is left of the model's context window,
+    whichever is smaller), and their own prompt and reply appended. History
+    that no longer fits is either dropped (``truncate``) or folded into a
+    rolling summary (``summarize``), written by the model in the background
+    and sent as a system message. Turns are appended in user/assistant
+    pairs and dropped in pairs, so history always starts with a user turn.
+    
+    Memory is bounded by the number of sessions (least recently used are
+    evicted) and turns per session; idle sessions expire after ``max_age``.
+    With a database path, turns are also written to SQLite on a dedicated
+    thread and evicted sessions are reloaded on their next request.
+    """
+    
+    def __init__(
+        self,
+        history_tokens: int = 4000,
+        policy: str = "truncate",
+        max_sessions: int = 10000,
+        max_turns: int = 200,
+        max_age: float = 86400.0,
+        db_path: str = ""
+    ):
+        self.history_tokens = history_tokens
+        self.policy = policy
+        self.max_sessions = max_sessions
+        # Whole user/assistant pairs
+        self.max_turns = max(2, max_turns - max_turns % 2)
+        self.max_age = max_age
+        self.db_path = db_path
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._db: Optional[sqlite3.Connection] = None
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def _cached(self, session_id: str, now: float) -> Optional[Conversation]:
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                return None
+            if now - conversation.last_active > self.max_age:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return conversation
+    
+    def _remember(self, conversation: Conversation) -> Conversation:
+        with self._lock:
+            existing = self._sessions.get(conversation.session_id)
+            if existing is not None:
+                # Loaded concurrently by another request
+                return existing
+            self._sessions[conversation.session_id] = conversation
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return conversation
+    
+    async def get(self, session_id: str) -> Optional[Conversation]:
+        """
+        A session's conversation, loading it from the database if evicted
+        
+        Returns:
+            The conversation, or None if nothing is stored for the session
+        """
+        now = time.time()
+        conversation = self._cached(session_id, now)
+        if conversation is not None or self._executor is None:
+            return conversation
+        loaded = await asyncio.get_running_loop().run_in_executor(self._executor, self._load, session_id)
+        if loaded is None or now - loaded.last_active > self.max_age:
+            return None
+        return self._remember(loaded)
+    
+    async def context(self, request: ModelRequest, headroom: Optional[int] = None) -> ConversationContext:
+        """
+        History to send with a request
+        
+        Args:
+            request: Request with a session_id
+            headroom: Tokens left in the model's context window, if known
+        
+        Returns:
+            The newest turns (and summary) that fit the token budget
+        """
+        budget = self.history_tokens if headroom is None else min(self.history_tokens, headroom)
+        conversation = await self.get(request.session_id)
+        if conversation is None:
+            return ConversationContext(messages=[], summary=None, tokens=0, turns=0, truncated=False)
+        
+        with self._lock:
+            turns = list(conversation.turns)
+            summary, summary_tokens = conversation.summary, conversation.summary_tokens
+        used = 0
+        start = len(turns)
+        # Walk back a user/assistant pair at a time
+        while start >= 2:
+            pair_tokens = turns[start - 2].tokens + turns[start - 1].tokens
+            if used + pair_tokens > budget:
+                break
+            used += pair_tokens
+            start -= 2
+        truncated = start > 0
+        if summary is not None and used + summary_tokens <= budget:
+            used += summary_tokens
+        else:
+            truncated = truncated or summary is not None
+            summary = None
+        if truncated:
+            conversation_truncations_total.inc(self.policy)
+        return ConversationContext(
+            messages=[{"role": turn.role, "content": turn.content} for turn in turns[start:]],
+            summary=summary,
+            tokens=used,
+            turns=len(turns) - start,
+            truncated=truncated
+        )
+    
+    async def append(self, request: ModelRequest, reply: str) -> None:
+        """
+        Store a request's prompt and the model's reply as the next turns
+        
+        Args:
+            request: Request with a session_id, as sent
+            reply: Generated content
+        """
+        now = time.time()
+        conversation = await self.get(request.session_id)
+        if conversation is None:
+            conversation = self._remember(Conversation(request.session_id))
+        new_turns = []
+        with self._lock:
+            for role, content in (("user", request.prompt), ("assistant", reply)):
+                tokens = token_counter.count(request.provider, request.model, content)[0] + TOKENS_PER_MESSAGE
+                new_turns.append(Turn(conversation.next_seq, role, content, tokens, now))
+                conversation.next_seq += 1
+            conversation.turns.extend(new_turns)
+            conversation.last_active = now
+            dropped = len(conversation.turns) - self.max_turns
+            if dropped > 0:
+                del conversation.turns[:dropped]
+            first_seq = conversation.turns[0].seq
+        self._submit(self._write_turns, request.session_id, new_turns, first_seq)
+    
+    def take_overflow(self, session_id: str) -> Optional[Tuple[List[Turn], Optional[str]]]:
+        """
+        Turns to fold into the rolling summary, if the session outgrew its budget
+        
+        Only with the ``summarize`` policy, and one summary at a time per
+        session. The oldest pairs are taken until the rest fit in half the
+        budget, leaving room for the conversation to grow again. The caller
+        must report back with apply_summary() or summary_failed().
+        
+        Returns:
+            (turns to fold, current summary), or None if nothing to fold
+        """
+        if self.policy != "summarize":
+            return None
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None or conversation.summarizing or conversation.tokens <= self.history_tokens:
+                return None
+            remaining = conversation.tokens
+            count = 0
+            while count + 2 <= len(conversation.turns) and remaining > self.history_tokens // 2:
+                remaining -= conversation.turns[count].tokens + conversation.turns[count + 1].tokens
+                count += 2
+            if count == 0:
+                return None
+            conversation.summarizing = True
+            return list(conversation.turns[:count]), conversation.summary
+    
+    def apply_summary(self, request: ModelRequest, summary: str, through_seq: int) -> None:
+        """Replace the summary and drop the turns it now covers"""
+        text = SUMMARY_PREFIX + summary
+        tokens = token_counter.count(request.provider, request.model, text)[0] + TOKENS_PER_MESSAGE
+        with self._lock:
+            conversation = self._sessions.get(request.session_id)
+            if conversation is None:
+                return
+            conversation.summarizing = False
+            conversation.summary, conversation.summary_tokens = summary, tokens
+            conversation.turns = [turn for turn in conversation.turns if turn.seq > through_seq]
+        self._submit(self._write_summary, request.session_id, summary, tokens, through_seq)
+    
+    def summary_failed(self, session_id: str) -> None:
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is not None:
+                conversation.summarizing = False
+    
+    async def delete(self, session_id: str) -> bool:
+        """
+        Forget a session's conversation
+        
+        Returns:
+            Whether anything was stored for it
+        """
+        existed = await self.get(session_id) is not None
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self._submit(self._delete, session_id)
+        return existed
+    
+    # Persistence runs on one dedicated thread, so reads see earlier writes
+    
+    def open(self) -> None:
+        """Open the database, if configured, and prune expired sessions"""
+        if not self.db_path or self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hfrl-conversations")
+        self._submit(self._connect)
+    
+    def close(self) -> None:
+        """Finish pending writes and close the database"""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.submit(self._disconnect)
+        executor.shutdown(wait=True)
+    
+    def _submit(self, func, *args) -> None:
+        if self._executor is not None:
+            self._executor.submit(self._guarded, func, *args)
+    
+    @staticmethod
+    def _guarded(func, *args) -> None:
+        try:
+            func(*args)
+        except sqlite3.Error as e:
+            logger.warning(f"Conversation store write failed: {str(e)}")
+    
+    def _connect(self) -> None:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversation_turns (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                through_seq INTEGER NOT NULL
+            );
+            """
+        )
+        cutoff = time.time() - self.max_age
+        with db:
+            expired = [row[0] for row in db.execute(
+                "SELECT session_id FROM conversation_turns GROUP BY session_id HAVING MAX(created) < ?",
+                (cutoff,)
+            )]
+            for session_id in expired:
+                self._delete_rows(db, session_id)
+        self._db = db
+    
+    def _disconnect(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def _write_turns(self, session_id: str, turns: List[Turn], first_seq: int) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversation_turns VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, t.seq, t.role, t.content, t.tokens, t.created) for t in turns]
+            )
+            self._db.execute(
+                "DELETE FROM conversation_turns WHERE session_id = ? AND seq < ?", (session_id, first_seq)
+            )
+    
+    def _write_summary(self, session_id: str, summary: str, tokens: int, through_seq: int) -> None:
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversation_summaries VALUES (?, ?, ?, ?)",
+                (session_id, summary, tokens, through_seq)
+            )
+            self._db.execute(
+                "DELETE FROM conversation_turns WHERE session_id = ? AND seq <= ?", (session_id, through_seq)
+            )
+    
+    def _delete(self, session_id: str) -> None:
+        with self._db:
+            self._delete_rows(self._db, session_id)
+    
+    @staticmethod
+    def _delete_rows(db: sqlite3.Connection, session_id: str) -> None:
+        db.execute("DELETE FROM conversation_turns WHERE session_id = ?", (session_id,))
+        db.execute("DELETE FROM conversation_summaries WHERE session_id = ?", (session_id,))
+    
+    def _load(self, session_id: str) -> Optional[Conversation]:
+        if self._db is None:
+            return None
+        rows = self._db.execute(
+            "SELECT seq, role, content, tokens, created FROM conversation_turns "
+            "WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.max_turns)
+        ).fetchall()
+        summary = self._db.execute(
+            "SELECT summary, tokens, through_seq FROM conversation_summaries WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if not rows and summary is None:
+            return None
+        turns = [Turn(*row) for row in reversed(rows)]
+        # Keep whole user/assistant pairs
+        if turns and turns[0].role != "user":
+            turns = turns[1:]
+        conversation = Conversation(session_id, turns=turns)
+        if summary is not None:
+            conversation.summary, conversation.summary_tokens = summary[0], summary[1]
+        conversation.next_seq = max([turn.seq + 1 for turn in turns] + [summary[2] + 1 if summary else 0])
+        conversation.last_active = max([turn.created for turn in turns], default=time.time())
+        return conversation
+
+
+# Create singleton instance
+conversation_store = ConversationStore(
+    history_tokens=settings.CONVERSATION_HISTORY_TOKENS,
+    policy=settings.CONVERSATION_OVERFLOW_POLICY,
+    max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+    max_turns=settings.CONVERSATION_MAX_TURNS,
+    max_age=settings.CONVERSATION_MAX_AGE,
+    db_path=settings.CONVERSATION_DB_PATH
+)
+registry.register_collector(lambda: [
+    ("hfrl_conversation_sessions", "gauge", "Conversations held in memory", len(conversation_store))
+])
@@ -1,12 +1,23 @@
 """
 Feedback Service - Handles feedback storage and retrieval
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from datetime import datetime
+from operator import itemgetter
 from app.schemas import FeedbackCreate, FeedbackResponse
+from app.metrics import registry
+from app.tracing import span
+import heapq
+import logging
 import uuid
 import json
 
+logger = logging.getLogger(__name__)
+
+# Called as listener(event, feedback_data) with event "created", "deleted"
+# or "compacted" (moved into rollups; aggregates still count the record)
+FeedbackListener = Callable[[str, Dict[str, Any]], None]
+
 
 # In-memory storage (replace with database in production)
 feedback_storage: Dict[str, Dict[str, Any]] = {}
@@ -15,6 +26,31 @@ feedback_storage: Dict[str, Dict[str, Any]] = {}
 class FeedbackService:
     """Service for managing feedback"""
     
+    def __init__(self):
+        # Bumped on every mutation so derived caches know when to invalidate.
+        # Creates always land at "now"; deletes can touch any time range.
+        self.write_generation = 0
+        self.delete_generation = 0
+        self._listeners: List[FeedbackListener] = []
+    
+    def add_listener(self, listener: FeedbackListener) -> None:
+        """Register a callback invoked after every feedback write"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+    
+    def remove_listener(self, listener: FeedbackListener) -> None:
+        """Unregister a previously added write callback"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _notify(self, event: str, feedback_data: Dict[str, Any]) -> None:
+        """Fan a write out to listeners; a failing listener never fails the write"""
+        for listener in self._listeners:
+            try:
+                listener(event, feedback_data)
+            except Exception as e:
+                logger.error(f"Feedback listener failed on {event}: {str(e)}", exc_info=True)
+    
     def create_feedback(self, feedback: FeedbackCreate) -> FeedbackResponse:
         """
         Create a new feedback entry
@@ -36,11 +72,18 @@ class FeedbackService:
             "response_id": feedback.response_id,
             "inline_feedback": feedback.inline_feedback or [],
             "learning_rate": feedback.learning_rate or 0.001,
+            "provider": feedback.provider.value if feedback.provider else None,
+            "model": feedback.model,
+            "compared_with": feedback.compared_with.model_dump(mode="json") if feedback.compared_with else None,
+            "preference": feedback.preference.value if feedback.preference else None,
             "timestamp": datetime.now(),
             "created_at": datetime.now()
         }
         
-        feedback_storage[feedback_id] = feedback_data
+        with span("storage"):
+            feedback_storage[feedback_id] = feedback_data
+            self.write_generation += 1
+            self._notify("created", feedback_data)
         
         return FeedbackResponse(**feedback_data)
     
@@ -55,7 +98,7 @@ class FeedbackService:
         """Get all feedback for a session"""
         feedbacks = [
             FeedbackResponse(**data)
-            for data in feedback_storage.values()
+            for data in list(feedback_storage.values())
             if data.get("session_id") == session_id
         ]
         return sorted(feedbacks, key=lambda x: x.timestamp, reverse=True)
@@ -63,23 +106,116 @@ class FeedbackService:
     def get_all_feedback(
         self,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        records: Optional[List[Dict[str, Any]]] = None
     ) -> List[FeedbackResponse]:
-        """Get all feedback with pagination"""
+        """Get all feedback (or the given snapshot of it) with pagination"""
+        # Snapshot the values first: this may run in a worker thread while
+        # the event loop keeps writing
+        if records is None:
+            records = list(feedback_storage.values())
         feedbacks = [
             FeedbackResponse(**data)
-            for data in feedback_storage.values()
+            for data in records
         ]
         feedbacks = sorted(feedbacks, key=lambda x: x.timestamp, reverse=True)
         return feedbacks[offset:offset + limit]
     
+    def list_feedback_data(
+        self,
+        session_id: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        List stored feedback records as plain dicts, newest first
+        
+        Records were validated when they were created, so this skips building
+        FeedbackResponse models; it backs the list endpoint's fast path.
+        Session queries return every record in the session, as before.
+        
+        Args:
+            session_id: Optional session ID filter
+            limit: Maximum number of results (ignored with session_id)
+            offset: Offset for pagination (ignored with session_id)
+        
+        Returns:
+            Feedback records (shared with the store; do not mutate)
+        """
+        with span("storage"):
+            records = list(feedback_storage.values())
+            by_timestamp = itemgetter("timestamp")
+            if session_id:
+                records = [data for data in records if data.get("session_id") == session_id]
+                return sorted(records, key=by_timestamp, reverse=True)
+            # A page near the front only needs a partial sort
+            if offset + limit < len(records):
+                return heapq.nlargest(offset + limit, records, key=by_timestamp)[offset:]
+            return sorted(records, key=by_timestamp, reverse=True)[offset:offset + limit]
+    
     def delete_feedback(self, feedback_id: str) -> bool:
         """Delete feedback by ID"""
         if feedback_id in feedback_storage:
-            del feedback_storage[feedback_id]
+            with span("storage"):
+                feedback_data = feedback_storage.pop(feedback_id)
+                self.write_generation += 1
+                self.delete_generation += 1
+                self._notify("deleted", feedback_data)
             return True
         return False
     
+    def list_expired_feedback(self, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        """
+        List the oldest stored records created before a cutoff
+        
+        The store keeps creation order, so this stops at the first newer
+        record instead of scanning everything.
+        
+        Args:
+            cutoff: Records with an earlier timestamp are returned
+            limit: Maximum number of records
+        
+        Returns:
+            Feedback records, oldest first (shared with the store; do not mutate)
+        """
+        records = []
+        for feedback_data in feedback_storage.values():
+            if len(records) >= limit or feedback_data["timestamp"] >= cutoff:
+                break
+            records.append(feedback_data)
+        return records
+    
+    def compact_feedback(self, records: List[Dict[str, Any]], rollups: Any) -> int:
+        """
+        Move records out of the raw store into per-day rollups
+        
+        Listeners get a "compacted" event rather than "deleted": the records
+        still count, through their rollups. Records deleted since they were
+        listed are skipped.
+        
+        Args:
+            records: Records to compact
+            rollups: RollupStore taking the records
+        
+        Returns:
+            Number of records compacted
+        """
+        compacted = []
+        with span("storage"):
+            with rollups.lock:
+                for feedback_data in records:
+                    if feedback_storage.pop(feedback_data["id"], None) is not None:
+                        rollups.add(feedback_data)
+                        compacted.append(feedback_data)
+            if compacted:
+                # Totals are unchanged, but a scan that ran meanwhile may have
+                # missed or double-counted a record, so cached results go stale
+                self.write_generation += 1
+                self.delete_generation += 1
+            for feedback_data in compacted:
+                self._notify("compacted", feedback_data)
+        return len(compacted)
+    
     def get_average_rating(self, session_id: Optional[str] = None) -> float:
         """Get average rating"""
         feedbacks = (
@@ -97,4 +233,6 @@ class FeedbackService:
 
 # Create singleton instance
 feedback_service = FeedbackService()
-
+registry.register_collector(lambda: [
+    ("hfrl_feedback_store_size", "gauge", "Feedback records held in memory", len(feedback_storage))
+])
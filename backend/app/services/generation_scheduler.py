@@ -0,0 +1,270 @@
+"""
+Generation Scheduler - Orders provider calls by lane and fair share across sessions
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+import asyncio
+import heapq
+import itertools
+import time
+
+from app.config import settings
+from app.exceptions import GenerationPreemptedError, GenerationQueueFullError
+from app.metrics import registry
+from app.schemas import Priority
+
+scheduler_queue_depth = registry.gauge(
+    "hfrl_scheduler_queue_depth",
+    "Generations waiting for a provider slot",
+    ("provider", "lane")
+)
+scheduler_running = registry.gauge(
+    "hfrl_scheduler_running",
+    "Generations holding a provider slot",
+    ("provider", "lane")
+)
+scheduler_wait_seconds = registry.histogram(
+    "hfrl_scheduler_wait_seconds",
+    "Time generations waited for a provider slot",
+    ("provider", "lane"),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+scheduler_rejections_total = registry.counter(
+    "hfrl_scheduler_rejections_total",
+    "Generations refused (queue full) or preempted before they started",
+    ("provider", "lane", "reason")
+)
+
+# Past this many sessions, flows whose finish tag the virtual clock has
+# passed are dropped; their next request would start at the clock anyway
+_FLOW_TABLE_PRUNE_SIZE = 10000
+
+
+@dataclass(order=True)
+class _Waiter:
+    """A queued generation, ordered by its fair-queuing start tag"""
+    start_tag: float
+    seq: int
+    lane: Priority = field(compare=False)
+    future: "asyncio.Future[None]" = field(compare=False)
+    enqueued: float = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+@dataclass
+class _Lane:
+    heap: List[_Waiter] = field(default_factory=list)
+    queued: int = 0
+    running: int = 0
+    # Start-time fair queuing: virtual time and each flow's last finish tag
+    virtual_time: float = 0.0
+    finish_tags: Dict[str, float] = field(default_factory=dict)
+
+
+class ProviderScheduler:
+    """
+    Slots for concurrent calls to one provider, handed out by lane and fair share
+    
+    Interactive generations always get the next free slot before bulk ones,
+    and ``interactive_reserve`` slots are never given to bulk work, so an
+    interactive request doesn't wait for bulk calls to finish unless
+    interactive load alone fills the provider. Within a lane, sessions
+    share slots by start-time fair queuing: each request is tagged with
+    its session's virtual finish time, advanced by its token cost divided
+    by the session's weight, and the smallest tag goes next. One session
+    submitting thousands of calls therefore can't delay another's for
+    longer than one of its own calls.
+    
+    When the queue is full, an interactive arrival preempts the most
+    recently queued bulk generation, which fails with a retryable error;
+    running calls are never interrupted.
+    """
+    
+    def __init__(
+        self,
+        provider: str,
+        capacity: int = 32,
+        interactive_reserve: int = 8,
+        max_queue: int = 1000,
+        weights: Optional[Mapping[str, float]] = None
+    ):
+        self.provider = provider
+        self.capacity = max(1, capacity)
+        self.interactive_reserve = min(max(0, interactive_reserve), self.capacity - 1)
+        self.max_queue = max_queue
+        self.weights = weights or {}
+        self._lanes: Dict[Priority, _Lane] = {lane: _Lane() for lane in Priority}
+        # Queued bulk waiters in arrival order, newest last, for preemption
+        self._bulk_waiters: "OrderedDict[int, _Waiter]" = OrderedDict()
+        self._seq = itertools.count()
+    
+    @property
+    def running(self) -> int:
+        return sum(lane.running for lane in self._lanes.values())
+    
+    @property
+    def queued(self) -> int:
+        return sum(lane.queued for lane in self._lanes.values())
+    
+    def _can_start(self, lane: Priority) -> bool:
+        if self.running >= self.capacity:
+            return False
+        if lane == Priority.BULK:
+            return self._lanes[Priority.BULK].running < self.capacity - self.interactive_reserve
+        return True
+    
+    def _tag(self, lane: Priority, flow: str, cost: float) -> float:
+        state = self._lanes[lane]
+        start = max(state.virtual_time, state.finish_tags.get(flow, 0.0))
+        state.finish_tags[flow] = start + max(cost, 1.0) / self.weights.get(flow, 1.0)
+        if len(state.finish_tags) > _FLOW_TABLE_PRUNE_SIZE:
+            state.finish_tags = {
+                key: tag for key, tag in state.finish_tags.items() if tag > state.virtual_time
+            }
+        return start
+    
+    async def acquire(self, lane: Priority, flow: str, cost: float) -> float:
+        """
+        Wait for a slot; release() it when the call is over
+        
+        Args:
+            lane: Scheduling lane
+            flow: Fair-share key (session or tenant)
+            cost: Estimated tokens of the call
+        
+        Returns:
+            Seconds spent waiting
+        
+        Raises:
+            GenerationQueueFullError: If the queue is full and nothing can be preempted
+            GenerationPreemptedError: If the queued bulk call was preempted
+        """
+        start_tag = self._tag(lane, flow, cost)
+        state = self._lanes[lane]
+        interactive_waiting = self._lanes[Priority.INTERACTIVE].queued
+        if not state.queued and (lane == Priority.INTERACTIVE or not interactive_waiting) and self._can_start(lane):
+            state.virtual_time = start_tag
+            self._started(lane)
+            scheduler_wait_seconds.observe(0.0, self.provider, lane.value)
+            return 0.0
+        
+        if self.queued >= self.max_queue:
+            if lane == Priority.BULK or not self._bulk_waiters:
+                scheduler_rejections_total.inc(self.provider, lane.value, "queue_full")
+                raise GenerationQueueFullError(self.provider, lane.value)
+            self._preempt_newest_bulk()
+        
+        enqueued = time.perf_counter()
+        waiter = _Waiter(start_tag, next(self._seq), lane, asyncio.get_running_loop().create_future(), enqueued)
+        heapq.heappush(state.heap, waiter)
+        state.queued += 1
+        if lane == Priority.BULK:
+            self._bulk_waiters[waiter.seq] = waiter
+        scheduler_queue_depth.inc(self.provider, lane.value)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Granted a slot just as the caller went away
+                self.release(lane)
+            elif not waiter.cancelled:
+                self._forget(waiter)
+            raise
+        waited = time.perf_counter() - enqueued
+        scheduler_wait_seconds.observe(waited, self.provider, lane.value)
+        return waited
+    
+    def release(self, lane: Priority) -> None:
+        """Give back a slot and start whoever is next"""
+        self._lanes[lane].running -= 1
+        scheduler_running.dec(self.provider, lane.value)
+        self._dispatch()
+    
+    def _started(self, lane: Priority) -> None:
+        self._lanes[lane].running += 1
+        scheduler_running.inc(self.provider, lane.value)
+    
+    def _forget(self, waiter: _Waiter) -> None:
+        """Drop a waiter from the queue counts; its heap entry is skipped later"""
+        waiter.cancelled = True
+        self._lanes[waiter.lane].queued -= 1
+        self._bulk_waiters.pop(waiter.seq, None)
+        scheduler_queue_depth.dec(self.provider, waiter.lane.value)
+    
+    def _preempt_newest_bulk(self) -> None:
+        _, waiter = self._bulk_waiters.popitem(last=True)
+        self._forget(waiter)
+        scheduler_rejections_total.inc(self.provider, Priority.BULK.value, "preempted")
+        waiter.future.set_exception(GenerationPreemptedError(self.provider))
+    
+    def _next(self, lane: Priority) -> Optional[_Waiter]:
+        heap = self._lanes[lane].heap
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+    
+    def _dispatch(self) -> None:
+        while True:
+            for lane in (Priority.INTERACTIVE, Priority.BULK):
+                waiter = self._next(lane)
+                if waiter is not None and self._can_start(lane):
+                    break
+                if waiter is not None and lane == Priority.INTERACTIVE:
+                    # Interactive work is waiting for a slot; bulk can't overtake it
+                    return
+            else:
+                return
+            heapq.heappop(self._lanes[lane].heap)
+            self._forget(waiter)
+            self._lanes[lane].virtual_time = waiter.start_tag
+            self._started(lane)
+            waiter.future.set_result(None)
+    
+    def status(self) -> Dict[str, Dict[str, int]]:
+        return {
+            lane.value: {"queued": state.queued, "running": state.running}
+            for lane, state in self._lanes.items()
+        }
+
+
+class GenerationScheduler:
+    """One ProviderScheduler per provider, created on first use"""
+    
+    def __init__(
+        self,
+        capacity: int = 32,
+        interactive_reserve: int = 8,
+        max_queue: int = 1000,
+        weights: Optional[Mapping[str, float]] = None
+    ):
+        self.capacity = capacity
+        self.interactive_reserve = interactive_reserve
+        self.max_queue = max_queue
+        self.weights = weights or {}
+        self._providers: Dict[str, ProviderScheduler] = {}
+    
+    def for_provider(self, provider: str) -> ProviderScheduler:
+        scheduler = self._providers.get(provider)
+        if scheduler is None:
+            scheduler = self._providers[provider] = ProviderScheduler(
+                provider,
+                capacity=self.capacity,
+                interactive_reserve=self.interactive_reserve,
+                max_queue=self.max_queue,
+                weights=self.weights
+            )
+        return scheduler
+    
+    def status(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Queued and running generations per provider and lane"""
+        return {provider: scheduler.status() for provider, scheduler in self._providers.items()}
+
+
+# Create singleton instance
+generation_scheduler = GenerationScheduler(
+    capacity=settings.SCHEDULER_MAX_CONCURRENCY,
+    interactive_reserve=settings.SCHEDULER_INTERACTIVE_RESERVE,
+    max_queue=settings.SCHEDULER_MAX_QUEUE,
+    weights=settings.SCHEDULER_SESSION_WEIGHTS
+)
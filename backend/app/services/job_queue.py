@@ -0,0 +1,481 @@
+"""
+Job Queue - Durable asynchronous generation jobs backed by SQLite
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from app.config import settings
+from app.exceptions import HFRLException, JobConflictError, JobQueueFullError, ServiceDrainingError
+from app.metrics import registry
+from app.schemas import JobStatus, ModelRequest, ModelResponse, Priority
+from app.services.ai_service import ai_service, is_transient_error
+from app.services.token_counter import token_counter
+
+logger = logging.getLogger(__name__)
+
+jobs_total = registry.counter(
+    "hfrl_jobs_total",
+    "Generation job events by outcome",
+    ("outcome",)
+)
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+# Seconds between deletions of expired jobs
+_PURGE_INTERVAL = 60.0
+
+_COLUMNS = (
+    "job_id, idempotency_key, fingerprint, request, status, attempts, result, error, "
+    "created, updated, run_after, lease_until, expires"
+)
+
+
+@dataclass
+class Job:
+    """A stored generation job"""
+    job_id: str
+    idempotency_key: Optional[str]
+    fingerprint: str
+    request: ModelRequest
+    status: JobStatus
+    attempts: int
+    result: Optional[ModelResponse]
+    error: Optional[str]
+    created: float
+    updated: float
+    run_after: float
+    lease_until: Optional[float]
+    expires: Optional[float]
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "Job":
+        (job_id, key, fingerprint, request, status, attempts, result, error,
+         created, updated, run_after, lease_until, expires) = row
+        return cls(
+            job_id=job_id,
+            idempotency_key=key,
+            fingerprint=fingerprint,
+            request=ModelRequest.model_validate_json(request),
+            status=JobStatus(status),
+            attempts=attempts,
+            result=ModelResponse.model_validate_json(result) if result else None,
+            error=error,
+            created=created,
+            updated=updated,
+            run_after=run_after,
+            lease_until=lease_until,
+            expires=expires
+        )
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+
+def _retryable(error: Exception) -> bool:
+    """Whether a failed attempt may succeed later"""
+    if isinstance(error, HFRLException):
+        return error.status_code >= 500 or error.status_code == 429
+    # Only provider timeouts, conflicts, rate limits, 5xx and lost
+    # connections; invalid requests and bugs fail the same way every time
+    return is_transient_error(error)
+
+
+class JobQueue:
+    """
+    Generation jobs that outlive the HTTP request (and the process) that submitted them
+    
+    Submitting stores the request in SQLite and returns at once; workers in
+    every process using the same database claim queued jobs, run them
+    through ai_service in the bulk lane unless the request asked otherwise,
+    and store the response for ``result_ttl`` seconds. A failed attempt is
+    retried with exponential backoff when the error is transient. A claim
+    is a lease of ``run_timeout`` seconds: a job whose process died is
+    taken over once its lease runs out, and jobs still running at a
+    graceful shutdown are put back in the queue. An idempotency key makes
+    a resubmission return the original job.
+    """
+    
+    def __init__(
+        self,
+        db_path: str = "./jobs.db",
+        workers: int = 4,
+        max_pending: int = 10000,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+        run_timeout: float = 900.0,
+        result_ttl: float = 86400.0,
+        poll_interval: float = 1.0
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.run_timeout = run_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        # job_id -> event set at the job's next change, for streams
+        self._changes: Dict[str, asyncio.Event] = {}
+        self._draining = False
+        self._next_purge = 0.0
+    
+    @property
+    def running(self) -> int:
+        return len(self._running)
+    
+    async def start(self) -> None:
+        """Open the database and start this process's workers"""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hfrl-jobs")
+        await self._call(self._connect)
+        self._draining = False
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+    
+    def begin_drain(self) -> None:
+        """Stop claiming jobs; running ones carry on"""
+        self._draining = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def stop(self) -> None:
+        """Requeue jobs still running, stop the workers and close the database"""
+        self._draining = True
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.submit(self._disconnect)
+        executor.shutdown(wait=True)
+    
+    async def _call(self, func, *args) -> Any:
+        if self._executor is None:
+            raise RuntimeError("Job queue is not started")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def submit(self, request: ModelRequest, idempotency_key: Optional[str] = None) -> Job:
+        """
+        Store a generation for the workers to run
+        
+        Args:
+            request: Model request; runs in the bulk lane unless ``priority`` is set
+            idempotency_key: Client-chosen key; resubmitting it returns the same job
+        
+        Returns:
+            The new job, or the existing one for the idempotency key
+        
+        Raises:
+            ValueError: If the request is invalid
+            ContextWindowExceededError: If the request can't fit the model's context window
+            JobConflictError: If the key was used for a different request
+            JobQueueFullError: If too many jobs are pending
+        """
+        if request.use_history and not request.session_id:
+            raise ValueError("use_history requires a session_id")
+        # Refuse now what every attempt would refuse
+        token_counter.precheck(request)
+        if "priority" not in request.model_fields_set:
+            request = request.model_copy(update={"priority": Priority.BULK})
+        payload = request.model_dump_json()
+        fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        job_id = uuid.uuid4().hex
+        job = await self._call(self._insert, job_id, idempotency_key, fingerprint, payload, time.time())
+        if job.fingerprint != fingerprint:
+            raise JobConflictError(idempotency_key)
+        if job.job_id == job_id:
+            jobs_total.inc("submitted")
+            if self._wakeup is not None:
+                self._wakeup.set()
+        return job
+    
+    async def get(self, job_id: str) -> Optional[Job]:
+        """A job, or None if unknown or expired"""
+        job = await self._call(self._select, job_id)
+        if job is None or (job.expires is not None and job.expires < time.time()):
+            return None
+        return job
+    
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job that hasn't finished
+        
+        A queued job is never started; a job running in this process is
+        interrupted. A job running in another process finishes its current
+        attempt but is not retried.
+        
+        Returns:
+            The job as it stands, or None if unknown or expired
+        """
+        job = await self._call(
+            self._finish, job_id, JobStatus.CANCELLED, None, "Cancelled", time.time(),
+            (JobStatus.QUEUED, JobStatus.RUNNING)
+        )
+        if job is None:
+            return await self.get(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+        jobs_total.inc("cancelled")
+        self._changed(job_id)
+        return job
+    
+    def changes(self, job_id: str) -> asyncio.Event:
+        """Event set at the job's next change in this process; take it before reading the job"""
+        event = self._changes.get(job_id)
+        if event is None:
+            event = self._changes[job_id] = asyncio.Event()
+        return event
+    
+    def _changed(self, job_id: str) -> None:
+        event = self._changes.pop(job_id, None)
+        if event is not None:
+            event.set()
+    
+    # Workers
+    
+    async def _work(self) -> None:
+        while not self._draining:
+            self._wakeup.clear()
+            try:
+                now = time.time()
+                if now >= self._next_purge:
+                    self._next_purge = now + _PURGE_INTERVAL
+                    for job_id in await self._call(self._purge, now):
+                        self._changes.pop(job_id, None)
+                job = await self._call(self._claim, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue read failed: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if job.status == JobStatus.FAILED:
+                # Abandoned by a worker that died on its last attempt
+                jobs_total.inc("failed")
+                self._changed(job.job_id)
+                continue
+            self._changed(job.job_id)
+            task = asyncio.create_task(self._run(job))
+            self._running[job.job_id] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.done():
+                    # Cancelled through the API before it started
+                    self._cancelled.discard(job.job_id)
+                    continue
+                # Shutting down: give the job back to the queue
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await self._call(self._requeue, job.job_id, job.attempts - 1, time.time(), None)
+                raise
+            finally:
+                self._running.pop(job.job_id, None)
+    
+    async def _run(self, job: Job) -> None:
+        try:
+            response = await asyncio.wait_for(ai_service.generate(job.request), timeout=self.run_timeout)
+        except asyncio.CancelledError:
+            if job.job_id in self._cancelled:
+                self._cancelled.discard(job.job_id)
+                return
+            raise
+        except ServiceDrainingError:
+            # Claimed just as the server began shutting down; not the job's fault
+            await self._call(self._requeue, job.job_id, job.attempts - 1, time.time() + self.poll_interval, None)
+            self._changed(job.job_id)
+            return
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if isinstance(e, asyncio.TimeoutError):
+                error = f"Attempt timed out after {self.run_timeout:.0f}s"
+            now = time.time()
+            if _retryable(e) and job.attempts < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                logger.info(f"Job {job.job_id} attempt {job.attempts} failed, retrying in {delay:.1f}s: {error}")
+                await self._call(self._requeue, job.job_id, job.attempts, now + delay, error)
+                jobs_total.inc("retried")
+            else:
+                logger.warning(f"Job {job.job_id} failed after {job.attempts} attempt(s): {error}")
+                await self._call(self._finish, job.job_id, JobStatus.FAILED, None, error, now)
+                jobs_total.inc("failed")
+            self._changed(job.job_id)
+            return
+        await self._call(
+            self._finish, job.job_id, JobStatus.SUCCEEDED, response.model_dump_json(), None, time.time()
+        )
+        jobs_total.inc("succeeded")
+        self._changed(job.job_id)
+    
+    # Persistence runs on one dedicated thread; claims are transactions, so
+    # several processes can share the database
+    
+    def _connect(self) -> None:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS generation_jobs (
+                job_id TEXT PRIMARY KEY,
+                idempotency_key TEXT UNIQUE,
+                fingerprint TEXT NOT NULL,
+                request TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                run_after REAL NOT NULL,
+                lease_until REAL,
+                expires REAL
+            );
+            CREATE INDEX IF NOT EXISTS generation_jobs_runnable ON generation_jobs (status, run_after);
+            CREATE INDEX IF NOT EXISTS generation_jobs_expires ON generation_jobs (expires);
+            """
+        )
+        self._db = db
+    
+    def _disconnect(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def _select(self, job_id: str) -> Optional[Job]:
+        row = self._db.execute(f"SELECT {_COLUMNS} FROM generation_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+    
+    def _insert(self, job_id: str, key: Optional[str], fingerprint: str, payload: str, now: float) -> Job:
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            if key is not None:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM generation_jobs WHERE idempotency_key = ? "
+                    "AND (expires IS NULL OR expires >= ?)",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    return Job.from_row(row)
+                # An expired job frees its key
+                self._db.execute("DELETE FROM generation_jobs WHERE idempotency_key = ?", (key,))
+            pending = self._db.execute(
+                "SELECT COUNT(*) FROM generation_jobs WHERE status IN (?, ?)",
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFullError()
+            self._db.execute(
+                "INSERT INTO generation_jobs (job_id, idempotency_key, fingerprint, request, status, "
+                "created, updated, run_after) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, fingerprint, payload, JobStatus.QUEUED.value, now, now, now)
+            )
+        return self._select(job_id)
+    
+    def _claim(self, now: float) -> Optional[Job]:
+        """Lease the next runnable job: queued and due, or running with a lapsed lease"""
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM generation_jobs "
+                "WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY run_after LIMIT 1",
+                (JobStatus.QUEUED.value, now, JobStatus.RUNNING.value, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job = Job.from_row(row)
+            if job.status == JobStatus.RUNNING and job.attempts >= self.max_attempts:
+                self._db.execute(
+                    "UPDATE generation_jobs SET status = ?, error = ?, updated = ?, lease_until = NULL, "
+                    "expires = ? WHERE job_id = ?",
+                    (JobStatus.FAILED.value, "Worker stopped responding", now, now + self.result_ttl, job.job_id)
+                )
+                job.status = JobStatus.FAILED
+                return job
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            self._db.execute(
+                "UPDATE generation_jobs SET status = ?, attempts = ?, updated = ?, lease_until = ? WHERE job_id = ?",
+                (job.status.value, job.attempts, now, now + self.run_timeout, job.job_id)
+            )
+            return job
+    
+    def _requeue(self, job_id: str, attempts: int, run_after: float, error: Optional[str]) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE generation_jobs SET status = ?, attempts = ?, run_after = ?, lease_until = NULL, "
+                "error = COALESCE(?, error), updated = ? WHERE job_id = ? AND status = ?",
+                (JobStatus.QUEUED.value, attempts, run_after, error, time.time(), job_id, JobStatus.RUNNING.value)
+            )
+    
+    def _finish(
+        self,
+        job_id: str,
+        status: JobStatus,
+        result: Optional[str],
+        error: Optional[str],
+        now: float,
+        from_statuses: Tuple[JobStatus, ...] = (JobStatus.RUNNING,)
+    ) -> Optional[Job]:
+        """Move a job to a finished status, unless it is no longer in one of ``from_statuses``"""
+        placeholders = ", ".join("?" * len(from_statuses))
+        with self._db:
+            # A job cancelled while running stays cancelled when its attempt ends
+            cursor = self._db.execute(
+                "UPDATE generation_jobs SET status = ?, result = ?, error = ?, updated = ?, lease_until = NULL, "
+                f"expires = ? WHERE job_id = ? AND status IN ({placeholders})",
+                (status.value, result, error, now, now + self.result_ttl, job_id)
+                + tuple(item.value for item in from_statuses)
+            )
+        return self._select(job_id) if cursor.rowcount else None
+    
+    def _purge(self, now: float) -> List[str]:
+        with self._db:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT job_id FROM generation_jobs WHERE expires < ?", (now,)
+            )]
+            self._db.execute("DELETE FROM generation_jobs WHERE expires < ?", (now,))
+        return expired
+
+
+# Create singleton instance
+job_queue = JobQueue(
+    db_path=settings.JOBS_DB_PATH,
+    workers=settings.JOBS_WORKERS,
+    max_pending=settings.JOBS_MAX_PENDING,
+    max_attempts=settings.JOBS_MAX_ATTEMPTS,
+    retry_backoff=settings.JOBS_RETRY_BACKOFF,
+    run_timeout=settings.JOBS_RUN_TIMEOUT,
+    result_ttl=settings.JOBS_RESULT_TTL,
+    poll_interval=settings.JOBS_POLL_INTERVAL
+)
+registry.register_collector(lambda: [
+    ("hfrl_jobs_running", "gauge", "Generation jobs running in this process", job_queue.running)
+])
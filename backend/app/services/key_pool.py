@@ -0,0 +1,279 @@
+"""
+Key Pool - Spreads provider calls across several API keys per provider
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Mapping, Optional
+import random
+import re
+import time
+
+from app.exceptions import ProviderKeysExhaustedError
+from app.metrics import registry
+
+provider_key_cooldowns_total = registry.counter(
+    "hfrl_provider_key_cooldowns_total",
+    "API keys taken out of rotation, by reason",
+    ("provider", "reason")
+)
+
+# (limit, remaining, reset) headers per quota, OpenAI-style then Anthropic
+RATE_LIMIT_HEADERS = {
+    "requests": (
+        ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+        ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining",
+         "anthropic-ratelimit-requests-reset"),
+    ),
+    "tokens": (
+        ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+        ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining",
+         "anthropic-ratelimit-tokens-reset"),
+    ),
+}
+
+# Keys reporting no headroom are still picked occasionally, in case the
+# reported quota has already been refilled
+MIN_WEIGHT = 0.001
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds until a quota resets
+    
+    Accepts OpenAI durations (``"1s"``, ``"6m0s"``, ``"20ms"``), RFC 3339
+    timestamps (Anthropic) and plain seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+        return sum(float(number) * scale[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` or ``retry-after`` (seconds or HTTP date)"""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class PooledKey:
+    """One API key and what the provider last told us about its quota"""
+    key: str
+    requests: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    consecutive_rate_limits: int = 0
+    cooldown_until: float = 0.0
+    cooldown_reason: str = ""
+    # Fraction of each quota left, valid until the matching reset time
+    request_headroom: Optional[float] = None
+    request_reset_at: float = 0.0
+    token_headroom: Optional[float] = None
+    token_reset_at: float = 0.0
+    token_limit: Optional[float] = None
+    
+    @property
+    def masked(self) -> str:
+        return "..." + self.key[-4:] if len(self.key) > 8 else "..."
+    
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+    
+    def headroom(self, now: float) -> float:
+        """Smallest fraction left across the known quotas; 1.0 if unknown or reset"""
+        fractions = [1.0]
+        if self.request_headroom is not None and now < self.request_reset_at:
+            fractions.append(self.request_headroom)
+        if self.token_headroom is not None and now < self.token_reset_at:
+            fractions.append(self.token_headroom)
+        return min(fractions)
+
+
+class KeyPool:
+    """
+    API keys for one provider, chosen by remaining rate-limit headroom
+    
+    Each pick is a weighted random choice among keys that aren't cooling
+    down, weighted by the fraction of quota the provider last reported
+    left (``x-ratelimit-*`` / ``anthropic-ratelimit-*`` headers) and
+    divided among calls already running on the key. A 429 cools a key down
+    for its ``Retry-After``, or an exponentially growing delay; auth
+    failures take it out of rotation for longer, as it is likely revoked.
+    """
+    
+    def __init__(
+        self,
+        provider: str,
+        cooldown: float = 10.0,
+        max_cooldown: float = 300.0,
+        auth_cooldown: float = 900.0
+    ):
+        self.provider = provider
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        self._keys: Dict[str, PooledKey] = {}
+        self._rng = random.Random()
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def set_keys(self, keys: Iterable[str]) -> List[str]:
+        """
+        Replace the pool's keys, keeping the state of keys that remain
+        
+        Returns:
+            Keys that were removed
+        """
+        keys = list(dict.fromkeys(key for key in keys if key))
+        removed = [key for key in self._keys if key not in keys]
+        self._keys = {key: self._keys.get(key) or PooledKey(key) for key in keys}
+        return removed
+    
+    def keys(self) -> List[str]:
+        return list(self._keys)
+    
+    def get(self, key: str) -> Optional[PooledKey]:
+        return self._keys.get(key)
+    
+    def has_available(self) -> bool:
+        now = time.monotonic()
+        return any(pooled.available(now) for pooled in self._keys.values())
+    
+    def acquire(self, tokens: int = 0) -> Optional[PooledKey]:
+        """
+        Pick a key for one call; release() it when the call is over
+        
+        The call's estimated tokens are taken off the key's token headroom
+        straight away, so concurrent large calls spread across keys before
+        the provider's headers catch up.
+        
+        Args:
+            tokens: Estimated prompt plus maximum output tokens of the call
+        
+        Returns:
+            The chosen key, or None if the pool has no keys
+        
+        Raises:
+            ProviderKeysExhaustedError: If every key is cooling down
+        """
+        if not self._keys:
+            return None
+        now = time.monotonic()
+        candidates = [pooled for pooled in self._keys.values() if pooled.available(now)]
+        if not candidates:
+            retry_after = min(pooled.cooldown_until for pooled in self._keys.values()) - now
+            raise ProviderKeysExhaustedError(self.provider, retry_after)
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        else:
+            weights = [
+                max(pooled.headroom(now), MIN_WEIGHT) / (1 + pooled.in_flight)
+                for pooled in candidates
+            ]
+            chosen = self._rng.choices(candidates, weights)[0]
+        chosen.in_flight += 1
+        if tokens and chosen.token_limit and chosen.token_headroom is not None and now < chosen.token_reset_at:
+            chosen.token_headroom = max(0.0, chosen.token_headroom - tokens / chosen.token_limit)
+        return chosen
+    
+    def release(self, pooled: PooledKey) -> None:
+        pooled.in_flight -= 1
+    
+    def observe(self, pooled: PooledKey, status_code: int, headers: Mapping[str, str]) -> None:
+        """
+        Update a key from a provider response
+        
+        Args:
+            pooled: Key the request was made with
+            status_code: Response status
+            headers: Response headers (case-insensitive mapping)
+        """
+        now = time.monotonic()
+        pooled.requests += 1
+        for quota, families in RATE_LIMIT_HEADERS.items():
+            for limit_name, remaining_name, reset_name in families:
+                limit, remaining = headers.get(limit_name), headers.get(remaining_name)
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    limit_value, remaining_value = float(limit), float(remaining)
+                except ValueError:
+                    break
+                fraction = remaining_value / limit_value if limit_value > 0 else 0.0
+                reset = parse_reset(headers.get(reset_name))
+                reset_at = now + (reset if reset is not None else 60.0)
+                if quota == "requests":
+                    pooled.request_headroom, pooled.request_reset_at = fraction, reset_at
+                else:
+                    pooled.token_headroom, pooled.token_reset_at = fraction, reset_at
+                    pooled.token_limit = limit_value
+                break
+        
+        if status_code == 429:
+            pooled.errors += 1
+            pooled.consecutive_rate_limits += 1
+            delay = parse_retry_after(headers)
+            if delay is None:
+                delay = self.cooldown * 2 ** (pooled.consecutive_rate_limits - 1)
+            self._cool_down(pooled, now, min(delay, self.max_cooldown), "rate_limited")
+        elif status_code in (401, 403):
+            pooled.errors += 1
+            self._cool_down(pooled, now, self.auth_cooldown, "auth")
+        elif status_code < 400:
+            pooled.consecutive_rate_limits = 0
+    
+    def _cool_down(self, pooled: PooledKey, now: float, seconds: float, reason: str) -> None:
+        pooled.cooldown_until = max(pooled.cooldown_until, now + seconds)
+        pooled.cooldown_reason = reason
+        provider_key_cooldowns_total.inc(self.provider, reason)
+    
+    def status(self) -> List[Dict[str, object]]:
+        """State of every key, with the secret masked"""
+        now = time.monotonic()
+        return [
+            {
+                "provider": self.provider,
+                "key": pooled.masked,
+                "available": pooled.available(now),
+                "cooldown_remaining": round(max(0.0, pooled.cooldown_until - now), 3),
+                "cooldown_reason": pooled.cooldown_reason if not pooled.available(now) else None,
+                "headroom": round(pooled.headroom(now), 4),
+                "in_flight": pooled.in_flight,
+                "requests": pooled.requests,
+                "errors": pooled.errors,
+            }
+            for pooled in self._keys.values()
+        ]
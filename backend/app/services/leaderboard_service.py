@@ -0,0 +1,348 @@
+"""
+Leaderboard Service - Bradley-Terry model rankings kept up to date from feedback
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from app.config import settings
+from app.metrics import registry
+from app.schemas import LeaderboardEntry, LeaderboardResponse
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.worker_pool import worker_pool
+
+logger = logging.getLogger(__name__)
+
+# (provider, model); None is the fixed reference a 3/5 rating scores even against
+ModelKey = Tuple[str, str]
+REFERENCE = None
+
+# Elo points per unit of Bradley-Terry log-strength, and the reference's score
+ELO_SCALE = 400 / math.log(10)
+ELO_BASE = 1500.0
+Z_95 = 1.96
+
+_PREFERENCE_SCORES = {"win": 1.0, "tie": 0.5, "loss": 0.0}
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1 / (1 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1 + z)
+
+
+def comparisons(
+    feedback_data: Dict[str, Any],
+    rating_weight: float = 1.0
+) -> List[Tuple[ModelKey, Optional[ModelKey], float, float]]:
+    """
+    Games a feedback record stands for, as (model, opponent, score, weight)
+    
+    A 1-5 rating is a game against the reference scored (rating - 1) / 4,
+    so 3/5 is a draw. A preference is a game against the other model,
+    scored 1, 0.5 or 0 for the rated model. Records without a model count
+    for nothing.
+    """
+    if not feedback_data.get("provider") or not feedback_data.get("model"):
+        return []
+    key = (feedback_data["provider"], feedback_data["model"])
+    games = [(key, REFERENCE, (feedback_data["rating"] - 1) / 4, rating_weight)]
+    other = feedback_data.get("compared_with")
+    preference = feedback_data.get("preference")
+    if other and preference in _PREFERENCE_SCORES:
+        opponent = (other["provider"], other["model"])
+        if opponent != key:
+            games.append((key, opponent, _PREFERENCE_SCORES[preference], 1.0))
+    return games
+
+
+def fit_bradley_terry(
+    pairs: Dict[Tuple[Optional[ModelKey], Optional[ModelKey]], Tuple[float, float]],
+    prior_precision: float,
+    iterations: int = 100,
+    tolerance: float = 1e-6,
+    initial: Optional[Dict[ModelKey, float]] = None
+) -> Dict[ModelKey, Tuple[float, float]]:
+    """
+    Maximum a posteriori Bradley-Terry log-strengths from aggregated games
+    
+    Coordinate-wise Newton steps on the log-likelihood of fractional
+    outcomes plus a Gaussian prior centred on the reference (held at 0),
+    which also keeps models with one-sided records finite. Precision is the
+    diagonal of the Hessian at the optimum, a slightly optimistic
+    approximation that ignores correlation between models.
+    
+    Args:
+        pairs: (a, b) -> (games, total score of a)
+        prior_precision: Inverse prior variance, in log-strength units
+        iterations: Most sweeps over the models
+        tolerance: Stop once no strength moves more than this
+        initial: Starting strengths, e.g. the online estimates
+    
+    Returns:
+        model -> (log-strength, precision)
+    """
+    neighbours: Dict[ModelKey, List[Tuple[Optional[ModelKey], float, float]]] = {}
+    for (a, b), (games, score) in pairs.items():
+        if games <= 0:
+            continue
+        if a is not REFERENCE:
+            neighbours.setdefault(a, []).append((b, games, score))
+        if b is not REFERENCE:
+            neighbours.setdefault(b, []).append((a, games, games - score))
+    theta = {model: (initial or {}).get(model, 0.0) for model in neighbours}
+    precision: Dict[ModelKey, float] = {}
+    for _ in range(iterations):
+        largest_step = 0.0
+        for model, games_against in neighbours.items():
+            strength = theta[model]
+            gradient = -prior_precision * strength
+            hessian = prior_precision
+            for opponent, games, score in games_against:
+                p = _sigmoid(strength - (theta[opponent] if opponent is not REFERENCE else 0.0))
+                gradient += score - games * p
+                hessian += games * p * (1 - p)
+            step = gradient / hessian
+            theta[model] = strength + step
+            precision[model] = hessian
+            largest_step = max(largest_step, abs(step))
+        if largest_step < tolerance:
+            break
+    return {model: (theta[model], precision[model]) for model in neighbours}
+
+
+@dataclass
+class ModelStanding:
+    """Running state of one model"""
+    theta: float
+    precision: float
+    wins: int = 0
+    losses: int = 0
+    ties: int = 0
+    ratings: int = 0
+    rating_sum: int = 0
+    
+    @property
+    def comparisons(self) -> int:
+        return self.wins + self.losses + self.ties
+
+
+class LeaderboardService:
+    """
+    Ranks models by Bradley-Terry strength from ratings and pairwise preferences
+    
+    Every feedback write is applied as it happens with one online Newton
+    step per game (the Elo update with a per-model step size that shrinks
+    as evidence accumulates), which costs O(1) and keeps the board current.
+    Games are also aggregated per model pair, so a full refit, run in the
+    worker pool every ``refit_interval`` seconds after changes, costs
+    O(pairs) rather than O(feedback) and corrects for the order dependence
+    of online updates and for deletes, which online updates can't undo.
+    Reading the board only sorts the precomputed standings.
+    """
+    
+    def __init__(
+        self,
+        prior_sd: float = 350.0,
+        rating_weight: float = 1.0,
+        refit_interval: float = 60.0,
+        refit_iterations: int = 100
+    ):
+        self.prior_precision = (ELO_SCALE / prior_sd) ** 2
+        self.rating_weight = rating_weight
+        self.refit_interval = refit_interval
+        self.refit_iterations = refit_iterations
+        self._standings: Dict[ModelKey, ModelStanding] = {}
+        # (a, b) -> [games, total score of a]
+        self._pairs: Dict[Tuple[Optional[ModelKey], Optional[ModelKey]], List[float]] = {}
+        self._events = 0
+        self._events_since_refit = 0
+        self._refitted_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refitter: Optional[asyncio.Task] = None
+        feedback_service.add_listener(self.on_feedback_event)
+    
+    def __len__(self) -> int:
+        return len(self._standings)
+    
+    def on_feedback_event(self, event: str, feedback_data: Dict[str, Any]) -> None:
+        """Apply a feedback write to the standings"""
+        # Compaction keeps a record's games; only deletes take them back
+        if event == "compacted":
+            return
+        games = comparisons(feedback_data, self.rating_weight)
+        if not games:
+            return
+        sign = 1 if event == "created" else -1
+        with self._lock:
+            for model, opponent, score, weight in games:
+                self._count(model, opponent, score, sign)
+                self._aggregate(model, opponent, score, weight * sign)
+                if sign > 0:
+                    self._update(model, opponent, score, weight)
+            self._events += sign
+            self._events_since_refit += 1
+    
+    def _standing(self, model: ModelKey) -> ModelStanding:
+        standing = self._standings.get(model)
+        if standing is None:
+            standing = self._standings[model] = ModelStanding(theta=0.0, precision=self.prior_precision)
+        return standing
+    
+    def _count(self, model: ModelKey, opponent: Optional[ModelKey], score: float, sign: int) -> None:
+        standing = self._standing(model)
+        if opponent is REFERENCE:
+            standing.ratings += sign
+            standing.rating_sum += sign * round(score * 4 + 1)
+            return
+        other = self._standing(opponent)
+        if score == 0.5:
+            standing.ties += sign
+            other.ties += sign
+        elif score > 0.5:
+            standing.wins += sign
+            other.losses += sign
+        else:
+            standing.losses += sign
+            other.wins += sign
+    
+    def _aggregate(self, model: ModelKey, opponent: Optional[ModelKey], score: float, weight: float) -> None:
+        # Keyed with the reference (or the smaller model) first; totals are its score
+        if opponent is REFERENCE or opponent < model:
+            key, first_score = (opponent, model), 1 - score
+        else:
+            key, first_score = (model, opponent), score
+        totals = self._pairs.setdefault(key, [0.0, 0.0])
+        totals[0] += weight
+        totals[1] += weight * first_score
+        if totals[0] <= 1e-9:
+            del self._pairs[key]
+    
+    def _update(self, model: ModelKey, opponent: Optional[ModelKey], score: float, weight: float) -> None:
+        """One online Newton step for a game (Elo with evidence-weighted step sizes)"""
+        standing = self._standings[model]
+        other = self._standings.get(opponent) if opponent is not REFERENCE else None
+        p = _sigmoid(standing.theta - (other.theta if other is not None else 0.0))
+        information = weight * p * (1 - p)
+        standing.precision += information
+        standing.theta += weight * (score - p) / standing.precision
+        if other is not None:
+            other.precision += information
+            other.theta -= weight * (score - p) / other.precision
+    
+    def leaderboard(self, provider: Optional[str] = None, limit: Optional[int] = None) -> LeaderboardResponse:
+        """
+        Current standings, strongest first
+        
+        Args:
+            provider: Only rank this provider's models
+            limit: Most entries returned
+        
+        Returns:
+            Leaderboard with 95% intervals
+        """
+        with self._lock:
+            rows = [
+                (model, standing.theta, standing.precision, standing.wins, standing.losses,
+                 standing.ties, standing.ratings, standing.rating_sum)
+                for model, standing in self._standings.items()
+                if (standing.ratings > 0 or standing.comparisons > 0)
+                and (provider is None or model[0] == provider)
+            ]
+            events, since_refit, refitted_at = self._events, self._events_since_refit, self._refitted_at
+        rows.sort(key=lambda row: row[1], reverse=True)
+        entries = []
+        for rank, (model, theta, precision, wins, losses, ties, ratings, rating_sum) in enumerate(rows[:limit], 1):
+            margin = Z_95 / math.sqrt(precision)
+            entries.append(LeaderboardEntry(
+                rank=rank,
+                provider=model[0],
+                model=model[1],
+                score=round(ELO_BASE + ELO_SCALE * theta, 1),
+                ci_lower=round(ELO_BASE + ELO_SCALE * (theta - margin), 1),
+                ci_upper=round(ELO_BASE + ELO_SCALE * (theta + margin), 1),
+                comparisons=wins + losses + ties,
+                wins=wins,
+                losses=losses,
+                ties=ties,
+                ratings=ratings,
+                average_rating=round(rating_sum / ratings, 3) if ratings else None
+            ))
+        return LeaderboardResponse(
+            entries=entries,
+            events=events,
+            events_since_refit=since_refit,
+            refitted_at=datetime.fromtimestamp(refitted_at) if refitted_at is not None else None
+        )
+    
+    def rebuild(self) -> None:
+        """Recount every game from the raw feedback store (e.g. at startup)"""
+        records = list(feedback_storage.values())
+        with self._lock:
+            self._standings.clear()
+            self._pairs.clear()
+            self._events = 0
+            for feedback_data in records:
+                games = comparisons(feedback_data, self.rating_weight)
+                for model, opponent, score, weight in games:
+                    self._count(model, opponent, score, 1)
+                    self._aggregate(model, opponent, score, weight)
+                self._events += 1 if games else 0
+            self._events_since_refit = self._events
+    
+    async def refit(self) -> None:
+        """Refit every model's strength from the aggregated games, in the worker pool"""
+        with self._lock:
+            pairs = {key: (games, score) for key, (games, score) in self._pairs.items()}
+            initial = {model: standing.theta for model, standing in self._standings.items()}
+            applied = self._events_since_refit
+        fitted = await worker_pool.run(
+            fit_bradley_terry, pairs, self.prior_precision, self.refit_iterations, 1e-6, initial
+        )
+        with self._lock:
+            for model, standing in self._standings.items():
+                standing.theta, standing.precision = fitted.get(model, (0.0, self.prior_precision))
+            # Writes during the fit were applied to the old strengths and are
+            # lost from them; they stay counted for the next refit
+            self._events_since_refit -= applied
+            self._refitted_at = time.time()
+    
+    async def _refit_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refit_interval)
+            if not self._events_since_refit:
+                continue
+            try:
+                await self.refit()
+            except Exception as e:
+                logger.warning(f"Leaderboard refit failed: {str(e)}")
+    
+    def start(self) -> None:
+        """Count existing feedback and start periodic refits"""
+        self.rebuild()
+        if self.refit_interval > 0 and self._refitter is None:
+            self._refitter = asyncio.get_running_loop().create_task(self._refit_loop())
+    
+    async def stop(self) -> None:
+        refitter, self._refitter = self._refitter, None
+        if refitter is not None:
+            refitter.cancel()
+            await asyncio.gather(refitter, return_exceptions=True)
+
+
+# Create singleton instance
+leaderboard_service = LeaderboardService(
+    prior_sd=settings.LEADERBOARD_PRIOR_SD,
+    rating_weight=settings.LEADERBOARD_RATING_WEIGHT,
+    refit_interval=settings.LEADERBOARD_REFIT_INTERVAL,
+    refit_iterations=settings.LEADERBOARD_REFIT_ITERATIONS
+)
+registry.register_collector(lambda: [
+    ("hfrl_leaderboard_models", "gauge", "Models ranked on the leaderboard", len(leaderboard_service))
+])
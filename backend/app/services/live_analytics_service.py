@@ -0,0 +1,238 @@
+"""
+Live Analytics Service - Pushes coalesced analytics deltas to subscribers
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from app.config import settings
+from app.metrics import registry
+from app.schemas import AnalyticsRequest
+from app.services.analytics_service import analytics_service
+from app.services.feedback_service import feedback_service
+
+logger = logging.getLogger(__name__)
+
+# Queued in place of deltas when a subscriber fell behind; the consumer
+# answers it with a fresh full snapshot
+RESYNC = {"type": "resync"}
+
+# Final message for a subscriber that was dropped for falling behind
+CLOSED = {"type": "closed", "reason": "slow consumer"}
+
+# Final message for every subscriber when the server starts shutting down
+SHUTDOWN = {"type": "closed", "reason": "server shutting down"}
+
+# Snapshots computed in the worker pool that a write raced before one is
+# computed inline instead
+SNAPSHOT_ATTEMPTS = 3
+
+
+def _empty_delta() -> Dict[str, Any]:
+    return {
+        "total_feedback": 0,
+        "rating_sum": 0,
+        "distribution": {},
+        "buckets": {},
+    }
+
+
+class Subscription:
+    """A single connected dashboard with a bounded outbound queue"""
+    
+    def __init__(self, max_queue: int):
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+        # Writes since the last published delta (guarded by the service lock)
+        self.pending = _empty_delta()
+    
+    def offer(self, message: Dict[str, Any]) -> bool:
+        """
+        Enqueue a message without blocking the publisher
+        
+        When the queue is full, pending deltas are discarded and replaced by
+        a single resync marker, so a slow consumer costs at most
+        ``max_queue`` messages of memory.
+        
+        Returns:
+            False if the subscriber has overflowed too often and should be dropped
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        
+        self.overflows += 1
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+        return self.overflows <= settings.LIVE_ANALYTICS_MAX_OVERFLOWS
+    
+    def discard_deltas(self) -> None:
+        """Drop queued deltas and resyncs, keeping a final closed message"""
+        kept = []
+        while not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message["type"] == "closed":
+                kept.append(message)
+        for message in kept:
+            self.queue.put_nowait(message)
+
+
+class LiveAnalyticsService:
+    """
+    Coalesces feedback writes into periodic analytics deltas
+    
+    Writes are folded into each subscriber's pending delta as they happen.
+    A flusher task publishes them every ``LIVE_ANALYTICS_INTERVAL`` seconds
+    while anyone is subscribed, so bursts of writes cost one message per
+    interval. A snapshot resets its subscriber's pending and queued deltas
+    at the moment it is known to include every write so far, so no write is
+    counted both in the snapshot and in a later delta.
+    """
+    
+    def __init__(self):
+        self.interval = settings.LIVE_ANALYTICS_INTERVAL
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._flusher: Optional[asyncio.Task] = None
+        feedback_service.add_listener(self.on_feedback_event)
+    
+    def on_feedback_event(self, event: str, feedback_data: Dict[str, Any]) -> None:
+        """Fold a single feedback write into every subscriber's pending delta"""
+        # Compacted records still count, through their rollups
+        if not self._subscriptions or event == "compacted":
+            return
+        
+        sign = 1 if event == "created" else -1
+        rating = feedback_data["rating"]
+        date_key = feedback_data["timestamp"].date().isoformat()
+        rating_key = str(rating)
+        
+        with self._lock:
+            for subscription in self._subscriptions:
+                delta = subscription.pending
+                delta["total_feedback"] += sign
+                delta["rating_sum"] += sign * rating
+                delta["distribution"][rating_key] = delta["distribution"].get(rating_key, 0) + sign
+                bucket = delta["buckets"].setdefault(date_key, {"count": 0, "rating_sum": 0})
+                bucket["count"] += sign
+                bucket["rating_sum"] += sign * rating
+    
+    def _take_pending(self, subscription: Subscription) -> Optional[Dict[str, Any]]:
+        """Swap out a subscriber's pending delta, returning None if nothing changed"""
+        with self._lock:
+            delta = subscription.pending
+            if not delta["buckets"]:
+                return None
+            subscription.pending = _empty_delta()
+        
+        return {
+            "type": "delta",
+            "total_feedback": delta["total_feedback"],
+            "rating_sum": delta["rating_sum"],
+            "distribution": delta["distribution"],
+            "buckets": [
+                {"date": date, **bucket}
+                for date, bucket in sorted(delta["buckets"].items())
+            ],
+        }
+    
+    def publish(self) -> None:
+        """Offer each subscriber its pending delta, dropping hopeless ones"""
+        messages = [
+            (subscription, self._take_pending(subscription))
+            for subscription in list(self._subscriptions)
+        ]
+        messages = [(subscription, message) for subscription, message in messages if message is not None]
+        if not messages:
+            return
+        
+        self._sequence += 1
+        for subscription, message in messages:
+            message["sequence"] = self._sequence
+            if subscription.offer(message):
+                continue
+            logger.warning("Dropping live analytics subscriber that keeps falling behind")
+            self.unsubscribe(subscription)
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(CLOSED)
+    
+    def close_all(self) -> None:
+        """End every subscription so open streams don't hold up shutdown"""
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(SHUTDOWN)
+    
+    async def _flush_loop(self) -> None:
+        """Publish coalesced deltas until the last subscriber leaves"""
+        while self._subscriptions:
+            await asyncio.sleep(self.interval)
+            self.publish()
+        self._flusher = None
+    
+    def subscribe(self) -> Subscription:
+        """Register a new subscriber and make sure the flusher is running"""
+        subscription = Subscription(max_queue=settings.LIVE_ANALYTICS_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Forget a subscriber; the flusher stops on its own once idle"""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+    
+    async def next_message(self, subscription: Subscription) -> Dict[str, Any]:
+        """Wait for the subscriber's next message, expanding resyncs into snapshots"""
+        message = await subscription.queue.get()
+        if message is RESYNC:
+            return await self.snapshot(subscription)
+        return message
+    
+    async def snapshot(self, subscription: Subscription) -> Dict[str, Any]:
+        """
+        Full analytics state to (re)synchronize a subscriber
+        
+        The subscriber's pending and queued deltas are discarded once the
+        snapshot is known to cover every write so far: a cache hit for the
+        entry means no write landed since it was computed. Entries raced by
+        writes are recomputed, inline after ``SNAPSHOT_ATTEMPTS`` tries.
+        """
+        request = AnalyticsRequest()
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            await analytics_service.get_analytics_entry_async(request)
+            entry = analytics_service.get_cached_entry(request)
+            if entry is not None:
+                break
+        else:
+            entry = analytics_service.get_analytics_entry(request)
+        
+        # Nothing is awaited between the check above and this reset
+        with self._lock:
+            subscription.pending = _empty_delta()
+        subscription.discard_deltas()
+        return {
+            "type": "snapshot",
+            "sequence": self._sequence,
+            "analytics": entry.response.model_dump(mode="json"),
+        }
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+# Create singleton instance
+live_analytics_service = LiveAnalyticsService()
+registry.register_collector(lambda: [
+    ("hfrl_live_analytics_subscribers", "gauge", "Connected live analytics subscribers", live_analytics_service.subscriber_count)
+])
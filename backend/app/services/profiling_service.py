@@ -0,0 +1,217 @@
+"""
+Profiling Service - Captures per-request profiles into a rotating disk buffer
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+import cProfile
+import hmac
+import itertools
+import logging
+import os
+import threading
+import uuid
+
+from app.config import settings
+from app.schemas import ProfileInfo
+
+try:
+    from pyinstrument import Profiler as _PyInstrumentProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - pyinstrument is optional
+    _PyInstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+# File extension and media type per output format
+PROFILE_FORMATS = {
+    "speedscope": (".speedscope.json", "application/json"),
+    "html": (".html", "text/html"),
+    "pstats": (".pstats", "application/octet-stream"),
+}
+
+
+class ActiveProfile:
+    """
+    A profiler running for one request
+    
+    With pyinstrument installed the profile is statistical and async-aware:
+    only the request's own task is attributed, and time spent awaiting is
+    shown under the awaiting call. The cProfile fallback is deterministic
+    but sees every coroutine the event loop runs meanwhile.
+    """
+    
+    def __init__(self, interval: float, output_format: str):
+        self.format = output_format
+        if _PyInstrumentProfiler is not None:
+            self._profiler = _PyInstrumentProfiler(interval=interval, async_mode="enabled")
+        else:
+            self.format = "pstats"
+            self._profiler = cProfile.Profile()
+    
+    def start(self) -> None:
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+    
+    def stop(self) -> None:
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+    
+    def render(self, path: str) -> None:
+        """Write the stopped profile to disk in its format"""
+        if self.format == "pstats":
+            self._profiler.dump_stats(path)
+            return
+        if self.format == "html":
+            content = self._profiler.output_html()
+        else:
+            content = self._profiler.output(renderer=SpeedscopeRenderer())
+        with open(path, "w") as f:
+            f.write(content)
+
+
+class ProfilingService:
+    """
+    On-demand and sampled request profiling
+    
+    An admin can profile a single request by sending ``X-Profile: 1`` (or
+    ``?profile=1``) with the ``X-Admin-Token`` header. Independently, one in
+    every ``PROFILING_SAMPLE_EVERY`` requests is profiled. Only one profile
+    runs at a time; captures go to ``PROFILING_DIR`` and the oldest are
+    deleted beyond ``PROFILING_MAX_PROFILES``. With neither an admin token
+    nor sampling configured the middleware is never installed.
+    """
+    
+    def __init__(self):
+        self.admin_token = settings.PROFILING_ADMIN_TOKEN
+        self.sample_every = settings.PROFILING_SAMPLE_EVERY
+        self.directory = settings.PROFILING_DIR
+        self.max_profiles = settings.PROFILING_MAX_PROFILES
+        self.interval = settings.PROFILING_INTERVAL
+        self.format = settings.PROFILING_FORMAT
+        self._counter = itertools.count(1)
+        self._active = threading.Lock()
+        self._files_lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token) or self.sample_every > 0
+    
+    def is_admin(self, token: Optional[str]) -> bool:
+        """Check an admin token in constant time"""
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+    
+    def should_sample(self) -> bool:
+        """Whether the next request falls on the 1-in-N sample"""
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+    
+    def start(self) -> Optional[ActiveProfile]:
+        """Start profiling, or return None if another profile is running"""
+        if not self._active.acquire(blocking=False):
+            return None
+        try:
+            profile = ActiveProfile(self.interval, self.format)
+            profile.start()
+            return profile
+        except Exception:
+            self._active.release()
+            raise
+    
+    def finish(self, profile: ActiveProfile) -> None:
+        """Stop a running profile and let the next one start"""
+        try:
+            profile.stop()
+        finally:
+            self._active.release()
+    
+    def save(
+        self,
+        profile: ActiveProfile,
+        profile_id: str,
+        method: str,
+        path: str,
+        status_code: int,
+        duration: float,
+        mode: str
+    ) -> ProfileInfo:
+        """
+        Render a finished profile to disk and rotate old captures
+        
+        Blocking; run it in the worker pool.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        extension, _ = PROFILE_FORMATS[profile.format]
+        profile_path = os.path.join(self.directory, profile_id + extension)
+        profile.render(profile_path)
+        
+        info = ProfileInfo(
+            id=profile_id,
+            created_at=datetime.now(),
+            method=method,
+            path=path,
+            status_code=status_code,
+            duration=round(duration, 6),
+            mode=mode,
+            format=profile.format,
+            size=os.path.getsize(profile_path),
+        )
+        with open(os.path.join(self.directory, profile_id + ".meta.json"), "w") as f:
+            f.write(info.model_dump_json())
+        
+        self._rotate()
+        return info
+    
+    @staticmethod
+    def new_id() -> str:
+        return datetime.now().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    
+    def _rotate(self) -> None:
+        with self._files_lock:
+            profiles = self.list_profiles()
+            for info in profiles[self.max_profiles:]:
+                self._delete(info.id, info.format)
+    
+    def _delete(self, profile_id: str, output_format: str) -> None:
+        extension, _ = PROFILE_FORMATS.get(output_format, (".prof", ""))
+        for name in (profile_id + extension, profile_id + ".meta.json"):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+    
+    def list_profiles(self) -> List[ProfileInfo]:
+        """Captured profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".meta.json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(ProfileInfo.model_validate_json(f.read()))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda info: info.created_at, reverse=True)
+    
+    def get_profile(self, profile_id: str) -> Optional[Tuple[ProfileInfo, str, str]]:
+        """
+        Find a captured profile
+        
+        Returns:
+            (metadata, file path, media type), or None if unknown
+        """
+        for info in self.list_profiles():
+            if info.id == profile_id:
+                extension, media_type = PROFILE_FORMATS[info.format]
+                return info, os.path.join(self.directory, profile_id + extension), media_type
+        return None
+
+
+# Create singleton instance
+profiling_service = ProfilingService()
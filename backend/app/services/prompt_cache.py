@@ -0,0 +1,148 @@
+"""
+Prompt Cache - Cache-friendly prompt prefixes and provider cache accounting
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+import hashlib
+
+from app.config import settings
+from app.schemas import ModelRequest, Provider
+from app.services.conversation_store import SUMMARY_PREFIX, ConversationContext
+from app.services.token_counter import token_counter
+
+# Cache-usage fields per provider: (read field path, write field path)
+CACHE_USAGE_FIELDS = {
+    Provider.OPENAI: (("prompt_tokens_details", "cached_tokens"), None),
+    Provider.ANTHROPIC: (("cache_read_input_tokens",), ("cache_creation_input_tokens",)),
+    Provider.DEEPSEEK: (("prompt_cache_hit_tokens",), None),
+    Provider.KIMI: (("cached_tokens",), None),
+}
+
+
+def _usage_field(usage: Any, path: Tuple[str, ...]) -> int:
+    """Read a possibly nested, possibly absent usage field from an SDK object or dict"""
+    value = usage
+    for name in path:
+        if value is None:
+            return 0
+        value = value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+    return int(value) if isinstance(value, (int, float)) else 0
+
+
+def cache_usage(provider: Provider, usage: Any) -> Tuple[int, int]:
+    """
+    Prompt tokens served from and written to the provider's prefix cache
+    
+    Args:
+        provider: Provider that returned the usage
+        usage: SDK usage object (or dict)
+    
+    Returns:
+        (cache read tokens, cache write tokens)
+    """
+    if usage is None:
+        return 0, 0
+    read_path, write_path = CACHE_USAGE_FIELDS[provider]
+    return _usage_field(usage, read_path), _usage_field(usage, write_path) if write_path else 0
+
+
+def _min_cacheable_tokens(model: str) -> int:
+    # Anthropic only caches prefixes above a size; Haiku needs twice as many
+    minimum = settings.PROMPT_CACHE_MIN_TOKENS
+    return minimum * 2 if "haiku" in model else minimum
+
+
+@lru_cache(maxsize=256)
+def _anthropic_system(system_prompt: str, cacheable: bool) -> Union[str, List[Dict[str, Any]]]:
+    if not cacheable:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def anthropic_system(
+    request: ModelRequest,
+    summary: Optional[str] = None
+) -> Union[str, List[Dict[str, Any]]]:
+    """
+    The ``system`` parameter for an Anthropic request
+    
+    A system prompt long enough to be cached is sent as a text block marked
+    ``cache_control: ephemeral``, so repeats within the cache lifetime read
+    it from the cache instead of reprocessing it. A conversation summary
+    follows as a separate block, after the cached prefix. The returned
+    value may be shared between requests; don't mutate it.
+    """
+    system_prompt = request.system_prompt or ""
+    cacheable = (
+        settings.PROMPT_CACHE_ENABLED
+        and bool(system_prompt)
+        and token_counter.count_cached(request.provider, request.model, system_prompt)[0]
+        >= _min_cacheable_tokens(request.model)
+    )
+    system = _anthropic_system(system_prompt, cacheable)
+    if summary is None:
+        return system
+    blocks = list(system) if isinstance(system, list) else ([{"type": "text", "text": system}] if system else [])
+    return blocks + [{"type": "text", "text": SUMMARY_PREFIX + summary}]
+
+
+def anthropic_messages(
+    request: ModelRequest,
+    context: Optional[ConversationContext] = None
+) -> List[Dict[str, str]]:
+    """Messages for an Anthropic request: stored conversation turns, then the prompt"""
+    messages = list(context.messages) if context is not None else []
+    messages.append({"role": "user", "content": request.prompt})
+    return messages
+
+
+@lru_cache(maxsize=256)
+def _system_message(system_prompt: str) -> Dict[str, str]:
+    return {"role": "system", "content": system_prompt}
+
+
+def chat_messages(
+    request: ModelRequest,
+    context: Optional[ConversationContext] = None
+) -> List[Dict[str, str]]:
+    """
+    Messages for an OpenAI-compatible chat request
+    
+    OpenAI (and Deepseek's and Kimi's context caches) reuse work for a
+    byte-identical prompt prefix, so the system prompt always comes first
+    and its message is built once and shared. Stored conversation turns
+    follow (they only grow at the end until truncated), then the prompt.
+    """
+    messages = []
+    if request.system_prompt:
+        messages.append(_system_message(request.system_prompt))
+    if context is not None:
+        if context.summary is not None:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + context.summary})
+        messages.extend(context.messages)
+    messages.append({"role": "user", "content": request.prompt})
+    return messages
+
+
+def openai_cache_options(request: ModelRequest) -> Dict[str, Any]:
+    """
+    Extra request options that route repeats of a system prompt to the same cache
+    
+    With ``PROMPT_CACHE_KEY_ENABLED``, OpenAI requests carry a
+    ``prompt_cache_key`` derived from the system prompt.
+    """
+    if not (settings.PROMPT_CACHE_ENABLED and settings.PROMPT_CACHE_KEY_ENABLED and request.system_prompt):
+        return {}
+    return {"extra_body": {"prompt_cache_key": prompt_cache_key(request.system_prompt)}}
+
+
+@lru_cache(maxsize=256)
+def prompt_cache_key(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:32]
+
+
+def anthropic_cache_headers() -> Optional[Dict[str, str]]:
+    """Beta header for API versions that still gate prompt caching"""
+    if settings.PROMPT_CACHE_ENABLED and settings.ANTHROPIC_BETA:
+        return {"anthropic-beta": settings.ANTHROPIC_BETA}
+    return None
@@ -0,0 +1,292 @@
+"""
+Prompt Index - MinHash/LSH index of recent prompts for near-duplicate reuse
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, List, Optional, Tuple, Union
+import operator
+import re
+import threading
+import time
+
+from app.config import settings
+from app.metrics import registry
+from app.schemas import ModelRequest, ModelResponse
+
+prompt_index_lookups_total = registry.counter(
+    "hfrl_prompt_index_lookups_total",
+    "Near-duplicate prompt lookups by outcome",
+    ("outcome",)
+)
+
+_WORD = re.compile(r"\w+")
+_MASK32 = 0xFFFFFFFF
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+# Offset added per bin when an empty bin borrows a neighbour's value, so
+# borrowed values don't collide with the neighbour's own (densification)
+_DENSIFY_OFFSET = 0x9E3779B1
+# Most candidates verified per lookup; bounds the cost of crowded buckets
+MAX_CANDIDATES = 64
+# Finish reasons of responses cut off at max_tokens (OpenAI-style, Anthropic)
+TRUNCATED_FINISH_REASONS = frozenset(("length", "max_tokens"))
+
+
+def shingles(text: str, size: int) -> List[int]:
+    """
+    Hashes of the word 1- to ``size``-grams of a prompt
+    
+    Single words keep a one-word edit from breaking most of a short
+    prompt's shingles (an 11-word prompt with one word changed keeps a
+    Jaccard similarity of 0.75 with 1-2-grams, 0.5 with 3-grams alone);
+    the longer grams keep word order. Case, punctuation and whitespace are
+    ignored, so prompts that differ only in those produce the same
+    shingles. Python's string hash is salted per process, which is fine for
+    an index that lives in memory.
+    """
+    words = _WORD.findall(text.casefold())
+    if not words:
+        return [hash(text)]
+    hashes = list(map(hash, words))
+    for n in range(2, size + 1):
+        hashes.extend(map(hash, zip(*[words[i:] for i in range(n)])))
+    return hashes
+
+
+def signature(hashes: List[int], num_perm: int) -> array:
+    """
+    One-permutation MinHash signature of a set of shingle hashes
+    
+    Each hash goes to one of ``num_perm`` bins and every bin keeps its
+    minimum, which costs O(shingles) rather than O(shingles * num_perm) for
+    classic MinHash. Empty bins borrow from the next filled bin, so the
+    fraction of equal bins still estimates Jaccard similarity.
+    """
+    bins = [-1] * num_perm
+    # Largest first, so the smallest hash of each bin is written last
+    for h in sorted((h & _MASK64 for h in hashes), reverse=True):
+        bins[h % num_perm] = (h // num_perm) & _MASK32
+    if -1 in bins:
+        # Walk right to left twice around, so each empty bin knows the
+        # nearest filled bin to its right (wrapping) when it is reached
+        empty = [value < 0 for value in bins]
+        next_filled = -1
+        for i in range(2 * num_perm - 1, -1, -1):
+            index = i % num_perm
+            if not empty[index]:
+                next_filled = i
+            elif i < num_perm:
+                distance = next_filled - i
+                bins[index] = (bins[next_filled % num_perm] + distance * _DENSIFY_OFFSET) & _MASK32
+    return array("I", bins)
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(operator.eq, a, b)) / len(a)
+
+
+@dataclass
+class IndexedPrompt:
+    """A generated response and the signature of the prompt that produced it"""
+    scope: int
+    signature: array
+    response: ModelResponse
+    indexed_at: float
+    session_id: Optional[str] = None
+
+
+@dataclass
+class PromptMatch:
+    """Closest indexed prompt found for a request"""
+    similarity: float
+    response: ModelResponse
+
+
+class PromptIndex:
+    """
+    Bounded index of recent prompts for finding near-duplicates
+    
+    Prompts are shingled into word 1- to n-grams, summarized as MinHash
+    signatures and split into LSH bands: two prompts share a band bucket
+    with high probability when their Jaccard similarity is above roughly
+    ``floor`` = (1/bands)^(1/rows), so a lookup only verifies the few
+    prompts sharing a bucket, whatever the index size. Below the floor
+    matches are mostly missed, so thresholds under it are refused. Prompts are only compared within the
+    same provider, model, system prompt, max_tokens and temperature, and
+    responses cut off at max_tokens are never indexed. Entries are evicted
+    oldest first past ``max_entries`` or ``max_age`` seconds.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 50000,
+        max_age: float = 86400.0,
+        shingle_size: int = 2,
+        bands: int = 24,
+        rows: int = 5
+    ):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self._entries: "OrderedDict[int, IndexedPrompt]" = OrderedDict()
+        # Band key -> entry id, or ids in insertion order once the bucket is
+        # shared (a dict, so evicting one is O(1) however crowded it gets)
+        self._buckets: Dict[int, Union[int, Dict[int, None]]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def floor(self) -> float:
+        """Similarity below which LSH banding mostly misses matches"""
+        return (1 / self.bands) ** (1 / self.rows)
+    
+    @staticmethod
+    def _scope(request: ModelRequest) -> int:
+        return hash((
+            request.provider.value,
+            request.model,
+            request.system_prompt or "",
+            request.max_tokens,
+            request.temperature
+        ))
+    
+    def _signature(self, request: ModelRequest) -> array:
+        return signature(shingles(request.prompt, self.shingle_size), self.num_perm)
+    
+    def _band_keys(self, scope: int, sig: array) -> List[int]:
+        # Bands take every bands-th bin rather than a contiguous run: empty
+        # bins copy their neighbours, so adjacent bins are correlated
+        bands = self.bands
+        return [hash((scope, band, sig[band::bands].tobytes())) for band in range(bands)]
+    
+    def lookup(
+        self,
+        request: ModelRequest,
+        threshold: float,
+        same_session: bool = False,
+        sig: Optional[array] = None
+    ) -> Tuple[Optional[PromptMatch], array]:
+        """
+        Find the most similar indexed prompt for a request
+        
+        Args:
+            request: Request about to be sent
+            threshold: Lowest estimated similarity worth returning, at least ``floor``
+            same_session: Only match prompts indexed for the request's session_id
+            sig: Signature from an earlier lookup(), to avoid computing it twice
+        
+        Returns:
+            The best match at or above the threshold (or None), and the
+            request's signature for a later add()
+        
+        Raises:
+            ValueError: If the threshold is below what the index can find
+        """
+        if threshold < self.floor:
+            raise ValueError(
+                f"Similarity threshold {threshold} is below the prompt index's detection floor of {self.floor:.2f}"
+            )
+        scope = self._scope(request)
+        if sig is None:
+            sig = self._signature(request)
+        if same_session and request.session_id is None:
+            return None, sig
+        cutoff = time.monotonic() - self.max_age
+        best: Optional[PromptMatch] = None
+        with self._lock:
+            candidates: Dict[int, None] = {}
+            for key in self._band_keys(scope, sig):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                if isinstance(bucket, int):
+                    candidates[bucket] = None
+                else:
+                    # Newest entries are at the end of a bucket
+                    candidates.update(dict.fromkeys(islice(reversed(bucket), MAX_CANDIDATES)))
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+            for entry_id in candidates:
+                entry = self._entries.get(entry_id)
+                if entry is None or entry.scope != scope or entry.indexed_at < cutoff:
+                    continue
+                if same_session and entry.session_id != request.session_id:
+                    continue
+                score = similarity(sig, entry.signature)
+                if score >= threshold and (best is None or score > best.similarity):
+                    best = PromptMatch(similarity=round(score, 4), response=entry.response)
+        return best, sig
+    
+    def add(self, request: ModelRequest, response: ModelResponse, sig: Optional[array] = None) -> None:
+        """
+        Index a generated response under its request's prompt
+        
+        A response cut off at max_tokens is not indexed: it is not a
+        complete answer to offer for another prompt.
+        
+        Args:
+            request: Request that produced the response
+            response: Response to offer for near-duplicate prompts
+            sig: Signature from lookup(), to avoid computing it twice
+        """
+        if response.finish_reason in TRUNCATED_FINISH_REASONS:
+            return
+        scope = self._scope(request)
+        if sig is None:
+            sig = self._signature(request)
+        now = time.monotonic()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = IndexedPrompt(scope, sig, response, now, request.session_id)
+            for key in self._band_keys(scope, sig):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = entry_id
+                elif isinstance(bucket, int):
+                    self._buckets[key] = {bucket: None, entry_id: None}
+                else:
+                    bucket[entry_id] = None
+            self._evict(now)
+    
+    def _evict(self, now: float) -> None:
+        cutoff = now - self.max_age
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and entry.indexed_at >= cutoff:
+                break
+            del self._entries[entry_id]
+            for key in self._band_keys(entry.scope, entry.signature):
+                bucket = self._buckets.get(key)
+                if bucket == entry_id:
+                    del self._buckets[key]
+                elif bucket is not None:
+                    bucket.pop(entry_id, None)
+                    if len(bucket) == 1:
+                        self._buckets[key] = next(iter(bucket))
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+
+# Create singleton instance
+prompt_index = PromptIndex(
+    max_entries=settings.PROMPT_INDEX_MAX_ENTRIES,
+    max_age=settings.PROMPT_INDEX_MAX_AGE,
+    shingle_size=settings.PROMPT_INDEX_SHINGLE_SIZE,
+    bands=settings.PROMPT_INDEX_BANDS,
+    rows=settings.PROMPT_INDEX_ROWS
+)
+registry.register_collector(lambda: [
+    ("hfrl_prompt_index_size", "gauge", "Prompts held in the near-duplicate index", len(prompt_index))
+])
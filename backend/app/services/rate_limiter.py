@@ -0,0 +1,222 @@
+"""
+Rate Limiter - GCRA request limiting with pluggable state backends
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import threading
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Window every limit is expressed over
+PERIOD_SECONDS = 60.0
+
+
+@dataclass
+class RateLimitDecision:
+    """Outcome of one limiter check, with the values for RateLimit-* headers"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float = 0.0
+
+
+class RateLimitBackend:
+    """
+    Stores the theoretical arrival time (TAT) per client key
+    
+    GCRA keeps a single timestamp per key: the time at which the key would
+    be back to a full allowance. A request is admitted if pushing the TAT
+    forward by one emission interval keeps it within one period of now.
+    """
+    
+    async def update(self, key: str, interval: float, period: float) -> Tuple[bool, float]:
+        """
+        Admit or reject one request for a key
+        
+        Args:
+            key: Client and route key
+            interval: Seconds of allowance one request consumes
+            period: Maximum seconds of allowance that may be in use
+        
+        Returns:
+            Whether the request was admitted, and the allowance in use after
+            it (TAT - now; over ``period`` when rejected)
+        """
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process backend; one timestamp per active client
+    
+    Keys are kept in least-recently-used order. A key whose TAT has passed
+    is indistinguishable from a new one, so idle keys are dropped from the
+    front as requests come in; ``max_keys`` bounds memory under key floods.
+    """
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    async def update(self, key: str, interval: float, period: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            used = tat + interval - now
+            allowed = used <= period
+            if allowed:
+                self._tats[key] = tat + interval
+                self._tats.move_to_end(key)
+            self._evict(now)
+        return allowed, used
+    
+    def _evict(self, now: float) -> None:
+        while self._tats:
+            key, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[key]
+    
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+# Atomic GCRA step evaluated inside Redis so every worker shares one clock
+_GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local used = tat + interval - now
+if used > period then
+    return {0, tostring(used)}
+end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil(used * 1000))
+return {1, tostring(used)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Shared backend for multi-worker deployments (requires the redis package)
+    
+    Keys expire on their own once their allowance is fully restored.
+    """
+    
+    def __init__(self, url: str, prefix: str = "hfrl:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_GCRA_SCRIPT)
+    
+    async def update(self, key: str, interval: float, period: float) -> Tuple[bool, float]:
+        allowed, used = await self._script(keys=[self.prefix + key], args=[interval, period])
+        return bool(int(allowed)), float(used)
+    
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class RateLimiter:
+    """
+    Limits requests per client and route group
+    
+    Each route group (a configured path prefix, or otherwise the first two
+    path segments such as ``/api/feedback``) has its own per-minute limit
+    and its own allowance per client, so a burst of generations can't
+    starve dashboard reads. Backend errors fail open.
+    """
+    
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        default_limit: int,
+        route_limits: Optional[Dict[str, int]] = None
+    ):
+        self.backend = backend
+        self.default_limit = default_limit
+        # Longest prefix wins
+        self.route_limits: List[Tuple[str, int]] = sorted(
+            (route_limits or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+    
+    def is_configured(self, group: str) -> bool:
+        """Whether a route group has its own configured limit"""
+        return any(prefix == group for prefix, _ in self.route_limits)
+    
+    def resolve(self, path: str) -> Tuple[str, int]:
+        """
+        Find the route group and per-minute limit for a request path
+        
+        Returns:
+            (group, limit); a limit of 0 means unlimited
+        """
+        for prefix, limit in self.route_limits:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return prefix, limit
+        group = "/".join(path.split("/")[:3])
+        return group, self.default_limit
+    
+    async def check(self, group: str, limit: int, client: str) -> RateLimitDecision:
+        """
+        Count one request against a client's allowance for a route group
+        
+        Args:
+            group: Route group from resolve()
+            limit: Requests per minute for the group
+            client: Client identity (hashed API key or IP address)
+        
+        Returns:
+            The decision and the values for RateLimit-* headers
+        """
+        interval = PERIOD_SECONDS / limit
+        try:
+            allowed, used = await self.backend.update(f"{group}|{client}", interval, PERIOD_SECONDS)
+        except Exception as e:
+            logger.warning(f"Rate limit backend failed, allowing request: {str(e)}")
+            return RateLimitDecision(allowed=True, limit=limit, remaining=limit, reset_after=0.0)
+        
+        if not allowed:
+            return RateLimitDecision(
+                allowed=False,
+                limit=limit,
+                remaining=0,
+                reset_after=used - interval,
+                retry_after=used - PERIOD_SECONDS
+            )
+        return RateLimitDecision(
+            allowed=True,
+            limit=limit,
+            remaining=max(0, int(math.floor((PERIOD_SECONDS - used) / interval + 1e-9))),
+            reset_after=used
+        )
+
+
+def _create_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+    return InMemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MAX_CLIENTS)
+
+
+# Create singleton instance
+rate_limiter = RateLimiter(
+    backend=_create_backend(),
+    default_limit=settings.RATE_LIMIT_PER_MINUTE,
+    route_limits=settings.RATE_LIMIT_ROUTES
+)
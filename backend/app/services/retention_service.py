@@ -0,0 +1,143 @@
+"""
+Retention Service - Compacts old feedback into rollups and a cold archive
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import gzip
+import json
+import logging
+import os
+
+from app.config import settings
+from app.metrics import registry
+from app.services.feedback_service import feedback_service
+from app.services.sketch_index import feedback_rollups
+from app.services.worker_pool import worker_pool
+
+logger = logging.getLogger(__name__)
+
+feedback_compacted_total = registry.counter(
+    "hfrl_feedback_compacted_total",
+    "Raw feedback records compacted into rollups, by where the record went",
+    ("destination",)
+)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def append_archive(path: str, records: List[Dict[str, Any]]) -> None:
+    """
+    Append records to a gzip JSON-lines archive, one JSON object per line
+    
+    Each call adds a gzip member; gzip readers (``gzip.open``, ``zcat``)
+    read a multi-member file as one stream.
+    
+    Args:
+        path: Archive file, created if missing
+        records: Feedback records to append
+    """
+    lines = "".join(json.dumps(record, default=_encode) + "\n" for record in records)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "ab") as archive:
+        archive.write(gzip.compress(lines.encode("utf-8")))
+        archive.flush()
+        os.fsync(archive.fileno())
+
+
+class RetentionService:
+    """
+    Moves raw feedback older than the retention period into per-day rollups
+    
+    A background task runs every ``interval`` seconds and takes the oldest
+    expired records in batches of ``batch_size``. Each batch is appended to
+    the archive (if one is configured) in the worker pool, then removed from
+    the raw store and folded into the rollups on the event loop in one step,
+    so writes go on between batches and never wait for the disk. Analytics
+    keep counting compacted records through the rollups.
+    """
+    
+    def __init__(
+        self,
+        retention_days: int,
+        archive_path: str = "",
+        interval: float = 3600.0,
+        batch_size: int = 1000
+    ):
+        self.retention_days = retention_days
+        self.archive_path = archive_path
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.last_run: Optional[datetime] = None
+        self._compactor: Optional[asyncio.Task] = None
+    
+    async def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Compact every record older than the retention period
+        
+        Args:
+            now: Reference time (defaults to the current time)
+        
+        Returns:
+            Number of records compacted
+        """
+        if self.retention_days <= 0:
+            return 0
+        cutoff = (now or datetime.now()) - timedelta(days=self.retention_days)
+        destination = "archived" if self.archive_path else "evicted"
+        compacted = 0
+        while True:
+            batch = feedback_service.list_expired_feedback(cutoff, self.batch_size)
+            if not batch:
+                break
+            if self.archive_path:
+                # Archive first so a failed write loses nothing; a record
+                # deleted meanwhile stays in the archive but is not compacted
+                await worker_pool.run(append_archive, self.archive_path, batch)
+            count = feedback_service.compact_feedback(batch, feedback_rollups)
+            feedback_compacted_total.inc(destination, amount=count)
+            compacted += count
+            # Let writes and requests in between batches
+            await asyncio.sleep(0)
+        self.last_run = datetime.now()
+        if compacted:
+            logger.info(f"Compacted {compacted} feedback record(s) older than {cutoff.isoformat()}")
+        return compacted
+    
+    async def _compaction_loop(self) -> None:
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Feedback compaction failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval)
+    
+    def start(self) -> None:
+        """Start periodic compaction, if a retention period is set"""
+        if self.retention_days > 0 and self._compactor is None:
+            self._compactor = asyncio.get_running_loop().create_task(self._compaction_loop())
+    
+    async def stop(self) -> None:
+        compactor, self._compactor = self._compactor, None
+        if compactor is not None:
+            compactor.cancel()
+            await asyncio.gather(compactor, return_exceptions=True)
+
+
+# Create singleton instance
+retention_service = RetentionService(
+    retention_days=settings.FEEDBACK_RETENTION_DAYS,
+    archive_path=settings.FEEDBACK_ARCHIVE_PATH,
+    interval=settings.FEEDBACK_COMPACTION_INTERVAL,
+    batch_size=settings.FEEDBACK_COMPACTION_BATCH
+)
+registry.register_collector(lambda: [
+    ("hfrl_feedback_rollup_records", "gauge", "Feedback records held only as rollups", feedback_rollups.records),
+    ("hfrl_feedback_rollup_days", "gauge", "Days of feedback with a rollup", len(feedback_rollups)),
+])
@@ -0,0 +1,232 @@
+"""
+Search Index - Incremental BM25 full-text index over feedback comments
+"""
+from collections import Counter
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Set, Tuple
+import heapq
+import math
+import re
+
+from app.config import settings
+from app.metrics import registry
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.worker_pool import check_cancelled
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Too common to tell comments apart; dropped from comments and queries alike
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or so "
+    "that the this to was were will with".split()
+)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase word tokens of a text, without stopwords"""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index of feedback comments, ranked with BM25
+    
+    Each term maps to {document number: term frequency}, kept current by
+    feedback events on the event loop, the only writer. Searches run in the
+    worker pool without a lock: a posting list being walked is snapshotted
+    with one ``list()`` call, and everything else is read with single dict
+    lookups, so writes never wait for a search.
+    
+    Scoring is term-at-a-time with MaxScore pruning. Terms are visited from
+    the rarest; once no document outside the current candidates can reach
+    the top ``k``, commoner terms only add to existing candidates by lookup
+    instead of walking their long posting lists.
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._numbers: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._next_number = 0
+        feedback_service.add_listener(self.on_feedback_event)
+    
+    def __len__(self) -> int:
+        return len(self._lengths)
+    
+    @property
+    def terms(self) -> int:
+        return len(self._postings)
+    
+    def on_feedback_event(self, event: str, feedback_data: Dict[str, Any]) -> None:
+        """Index a created comment, or drop a deleted or compacted one"""
+        if event == "created":
+            self._add(feedback_data)
+        else:
+            self._remove(feedback_data)
+    
+    def _add(self, feedback_data: Dict[str, Any]) -> None:
+        tokens = tokenize(feedback_data.get("comments"))
+        if not tokens or feedback_data["id"] in self._numbers:
+            return
+        number = self._next_number
+        self._next_number += 1
+        # Resolvable before it is reachable from any posting list
+        self._ids[number] = feedback_data["id"]
+        self._lengths[number] = len(tokens)
+        self._numbers[feedback_data["id"]] = number
+        self.total_length += len(tokens)
+        for term, frequency in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+            postings[number] = frequency
+    
+    def _remove(self, feedback_data: Dict[str, Any]) -> None:
+        number = self._numbers.pop(feedback_data["id"], None)
+        if number is None:
+            return
+        for term in set(tokenize(feedback_data.get("comments"))):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(number, None)
+                if not postings:
+                    del self._postings[term]
+        self.total_length -= self._lengths.pop(number)
+        del self._ids[number]
+    
+    def rebuild(self) -> None:
+        """Reindex every comment in the feedback store (e.g. at startup)"""
+        self._postings.clear()
+        self._lengths.clear()
+        self._numbers.clear()
+        self._ids.clear()
+        self.total_length = 0
+        for feedback_data in list(feedback_storage.values()):
+            self._add(feedback_data)
+    
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        session_id: Optional[str] = None,
+        min_rating: Optional[int] = None,
+        max_rating: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Tuple[List[Tuple[float, Dict[str, Any]]], bool]:
+        """
+        Rank comments matching any query term by BM25
+        
+        Args:
+            query: Search text, tokenized like comments
+            limit: Maximum number of results
+            offset: Results to skip, for pagination
+            session_id: Optional session ID filter
+            min_rating: Optional inclusive lowest rating
+            max_rating: Optional inclusive highest rating
+            start_date: Optional inclusive earliest timestamp
+            end_date: Optional inclusive latest timestamp
+        
+        Returns:
+            Tuple of ((score, feedback record) pairs, best first, and
+            whether more results follow)
+        """
+        documents = len(self._lengths)
+        if not documents:
+            return [], False
+        average_length = max(self.total_length, 1) / documents
+        k1, b = self.k1, self.b
+        wanted = offset + limit + 1
+        
+        weighted = []
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings:
+                frequency = len(postings)
+                idf = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+                weighted.append((idf, postings))
+        weighted.sort(key=itemgetter(0), reverse=True)
+        # Most a document can still gain from each term and all commoner ones
+        bounds = [0.0] * (len(weighted) + 1)
+        for i in range(len(weighted) - 1, -1, -1):
+            bounds[i] = bounds[i + 1] + weighted[i][0] * (k1 + 1)
+        
+        filters = (session_id, min_rating, max_rating, start_date, end_date)
+        filtered = any(value is not None for value in filters)
+        lengths = self._lengths
+        # BM25's length normalization, k1 * (1 - b + b * length / average),
+        # as base + slope * length
+        base, slope = k1 * (1 - b), k1 * b / average_length
+        scores: Dict[int, float] = {}
+        rejected: Set[int] = set()
+        threshold = 0.0
+        for i, (idf, postings) in enumerate(weighted):
+            check_cancelled()
+            weight = idf * (k1 + 1)
+            if len(scores) >= wanted and bounds[i] <= threshold:
+                # No new document can make the cut; only rescore candidates
+                if len(scores) < len(postings):
+                    entries = [(number, postings.get(number)) for number in scores]
+                else:
+                    entries = [entry for entry in list(postings.items()) if entry[0] in scores]
+                for number, frequency in entries:
+                    if frequency:
+                        length = lengths.get(number, average_length)
+                        scores[number] += weight * frequency / (frequency + base + slope * length)
+            else:
+                score_of = scores.get
+                for number, frequency in list(postings.items()):
+                    if filtered and number not in scores:
+                        if number in rejected or not self._accept(number, *filters):
+                            rejected.add(number)
+                            continue
+                    length = lengths.get(number, average_length)
+                    scores[number] = score_of(number, 0.0) + weight * frequency / (frequency + base + slope * length)
+            if len(scores) >= wanted:
+                threshold = heapq.nlargest(wanted, scores.values())[-1]
+        
+        page = []
+        ranked = heapq.nlargest(wanted, scores.items(), key=itemgetter(1))
+        for number, score in ranked[offset:offset + limit]:
+            # Deleted since it was scored
+            feedback_data = feedback_storage.get(self._ids.get(number))
+            if feedback_data is not None:
+                page.append((round(score, 4), feedback_data))
+        return page, len(ranked) > offset + limit
+    
+    def _accept(
+        self,
+        number: int,
+        session_id: Optional[str],
+        min_rating: Optional[int],
+        max_rating: Optional[int],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> bool:
+        """Whether the document's feedback still exists and passes the filters"""
+        feedback_data = feedback_storage.get(self._ids.get(number))
+        if feedback_data is None:
+            return False
+        if session_id is not None and feedback_data.get("session_id") != session_id:
+            return False
+        rating = feedback_data["rating"]
+        if (min_rating is not None and rating < min_rating) or (max_rating is not None and rating > max_rating):
+            return False
+        timestamp = feedback_data["timestamp"]
+        return not ((start_date is not None and timestamp < start_date) or (end_date is not None and timestamp > end_date))
+
+
+# Create singleton instance
+search_index = SearchIndex(k1=settings.SEARCH_BM25_K1, b=settings.SEARCH_BM25_B)
+registry.register_collector(lambda: [
+    ("hfrl_search_index_documents", "gauge", "Feedback comments in the search index", len(search_index)),
+    ("hfrl_search_index_terms", "gauge", "Distinct terms in the search index", search_index.terms),
+])
@@ -0,0 +1,242 @@
+"""
+Sketch Index - Per-day mergeable sketches over the feedback store
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+import threading
+
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.sketches import HyperLogLog, KLLSketch
+
+# Feedback events queued between summaries before the index gives up on
+# replaying them and rebuilds everything on the next query instead
+MAX_PENDING_EVENTS = 100000
+# Records created this close to a rebuild's snapshot may still have their
+# event queued afterwards, so their ids are remembered to skip it
+RECENT_WINDOW = timedelta(seconds=60)
+
+
+@dataclass
+class BucketSketch:
+    """Exact counters plus mergeable sketches for one day of feedback"""
+    count: int = 0
+    rating_sum: int = 0
+    distribution: Dict[str, int] = field(default_factory=dict)
+    first: Optional[Any] = None  # (timestamp, rating) of the earliest feedback
+    last: Optional[Any] = None  # (timestamp, rating) of the latest feedback
+    sessions: HyperLogLog = field(default_factory=HyperLogLog)
+    responses: HyperLogLog = field(default_factory=HyperLogLog)
+    ratings: KLLSketch = field(default_factory=KLLSketch)
+    
+    def add(self, feedback_data: Dict[str, Any]) -> None:
+        """Fold one feedback record into the bucket"""
+        rating = feedback_data["rating"]
+        timestamp = feedback_data["timestamp"]
+        self.count += 1
+        self.rating_sum += rating
+        key = str(rating)
+        self.distribution[key] = self.distribution.get(key, 0) + 1
+        if self.first is None or timestamp < self.first[0]:
+            self.first = (timestamp, rating)
+        if self.last is None or timestamp >= self.last[0]:
+            self.last = (timestamp, rating)
+        if feedback_data.get("session_id"):
+            self.sessions.add(feedback_data["session_id"])
+        if feedback_data.get("response_id"):
+            self.responses.add(feedback_data["response_id"])
+        self.ratings.add(rating)
+    
+    def merge(self, other: "BucketSketch") -> None:
+        """Fold another bucket into this one"""
+        self.count += other.count
+        self.rating_sum += other.rating_sum
+        for key, value in other.distribution.items():
+            self.distribution[key] = self.distribution.get(key, 0) + value
+        if other.first is not None and (self.first is None or other.first[0] < self.first[0]):
+            self.first = other.first
+        if other.last is not None and (self.last is None or other.last[0] >= self.last[0]):
+            self.last = other.last
+        self.sessions.merge(other.sessions)
+        self.responses.merge(other.responses)
+        self.ratings.merge(other.ratings)
+
+
+class RollupStore:
+    """
+    Per-day aggregates of feedback compacted out of the raw store
+    
+    Compaction removes a record from the raw store and adds it here while
+    holding ``lock``; readers combining both take the lock around their
+    reads of both, so each record is seen exactly once.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = 0
+        self._buckets: Dict[date, BucketSketch] = {}
+    
+    def __len__(self) -> int:
+        return len(self._buckets)
+    
+    def add(self, feedback_data: Dict[str, Any]) -> None:
+        """Fold a compacted record into its day's rollup (caller holds ``lock``)"""
+        day = feedback_data["timestamp"].date()
+        bucket = self._buckets.get(day)
+        if bucket is None:
+            bucket = self._buckets[day] = BucketSketch()
+        bucket.add(feedback_data)
+        self.records += 1
+    
+    def collect(
+        self,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None
+    ) -> Dict[date, BucketSketch]:
+        """
+        Copy the rollups of the days in a range (caller holds ``lock``)
+        
+        Args:
+            start_day: Optional inclusive first day
+            end_day: Optional inclusive last day
+        
+        Returns:
+            Rollup copies by day, safe to use after the lock is released
+        """
+        collected = {}
+        for day, bucket in self._buckets.items():
+            if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+                continue
+            collected[day] = BucketSketch()
+            collected[day].merge(bucket)
+        return collected
+
+
+class SketchIndex:
+    """
+    Maintains one BucketSketch per calendar day, updated on every write
+    
+    Writes run on the event loop while summaries may run in the worker
+    pool, so the write listener takes no lock: it only appends to a queue
+    that the next summary drains. Sketches can't un-count a value, so a
+    delete marks its day dirty and the day is rebuilt from the raw store and
+    its rollup when the queue is drained. Compaction changes neither, so
+    its events are ignored.
+    """
+    
+    def __init__(self):
+        self._buckets: Dict[date, BucketSketch] = {}
+        self._dirty: Set[date] = set()
+        self._events: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        # Ids of records in the last rebuild whose event may still be queued
+        self._counted: Set[str] = set()
+        self._tracking = False
+        self._overflowed = False
+        self._lock = threading.Lock()
+        feedback_service.add_listener(self.on_feedback_event)
+    
+    def on_feedback_event(self, event: str, feedback_data: Dict[str, Any]) -> None:
+        """Queue a feedback write for the next summary"""
+        if not self._tracking or event == "compacted":
+            return
+        if len(self._events) >= MAX_PENDING_EVENTS:
+            self._overflowed = True
+            return
+        self._events.append((event, feedback_data))
+    
+    def _drain(self) -> None:
+        """Apply queued events to the buckets (caller holds ``_lock``)"""
+        while self._events:
+            event, feedback_data = self._events.popleft()
+            day = feedback_data["timestamp"].date()
+            if event != "created":
+                self._dirty.add(day)
+            elif day not in self._dirty and feedback_data["id"] not in self._counted:
+                self._buckets.setdefault(day, BucketSketch()).add(feedback_data)
+    
+    def _rebuild(self, days: Optional[Set[date]] = None) -> Set[str]:
+        """
+        Recompute the given days (or everything) from the raw store and rollups
+        
+        Returns:
+            Ids of the recently created records counted by the rebuild
+        """
+        with feedback_rollups.lock:
+            records = list(feedback_storage.values())
+            fresh = feedback_rollups.collect()
+        recent = datetime.now() - RECENT_WINDOW
+        counted = set()
+        if days is not None:
+            fresh = {day: bucket for day, bucket in fresh.items() if day in days}
+        for feedback_data in records:
+            day = feedback_data["timestamp"].date()
+            if days is None or day in days:
+                fresh.setdefault(day, BucketSketch()).add(feedback_data)
+                if feedback_data.get("created_at", feedback_data["timestamp"]) >= recent:
+                    counted.add(feedback_data["id"])
+        
+        if days is None:
+            self._buckets = fresh
+        else:
+            for day in days:
+                if day in fresh:
+                    self._buckets[day] = fresh[day]
+                else:
+                    self._buckets.pop(day, None)
+        return counted
+    
+    def summarize(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Tuple[BucketSketch, List[Dict[str, Any]]]:
+        """
+        Merge the day buckets overlapping a date range
+        
+        The range is aligned to whole days.
+        
+        Args:
+            start_date: Optional inclusive start
+            end_date: Optional inclusive end
+        
+        Returns:
+            Tuple of (merged bucket, per-day quality rows sorted by day)
+        """
+        start_day = start_date.date() if start_date else None
+        end_day = end_date.date() if end_date else None
+        merged = BucketSketch()
+        quality_over_time = []
+        
+        with self._lock:
+            # Events queued before a rebuild are either in its snapshot or
+            # applied here first; ones queued after it skip what it counted
+            self._drain()
+            self._counted.clear()
+            if not self._tracking or self._overflowed:
+                self._tracking = True
+                self._overflowed = False
+                self._events.clear()
+                self._counted = self._rebuild()
+                self._dirty.clear()
+            elif self._dirty:
+                self._counted = self._rebuild(self._dirty)
+                self._dirty.clear()
+            self._drain()
+            
+            for day, bucket in sorted(self._buckets.items()):
+                if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+                    continue
+                merged.merge(bucket)
+                quality_over_time.append({
+                    "date": day.isoformat(),
+                    "average_quality": bucket.rating_sum / bucket.count,
+                    "count": bucket.count
+                })
+        
+        return merged, quality_over_time
+
+
+# Create singleton instance
+feedback_rollups = RollupStore()
+sketch_index = SketchIndex()
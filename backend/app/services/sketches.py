@@ -0,0 +1,160 @@
+"""
+Mergeable probabilistic sketches for approximate analytics
+"""
+from typing import Iterable, List, Optional, Tuple
+import hashlib
+import math
+import random
+
+
+def _hash64(value: str) -> int:
+    """Stable 64-bit hash (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter
+    
+    Uses 2^precision one-byte registers regardless of how many values are
+    added. Two sketches with the same precision merge by taking the
+    register-wise maximum.
+    """
+    
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+    
+    def add(self, value: str) -> None:
+        """Add a value to the sketch"""
+        x = _hash64(value)
+        index = x >> (64 - self.precision)
+        remaining = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other: "HyperLogLog") -> None:
+        """Fold another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def estimate(self) -> float:
+        """Estimated number of distinct values added"""
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            return m * math.log(m / zeros)
+        return raw
+    
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the estimate, relative to the true count"""
+        return 1.04 / math.sqrt(self.num_registers)
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch
+    
+    Keeps a hierarchy of compactors whose total size is O(k) no matter how
+    many values are added. Items at level h stand for 2^h original values.
+    Merging concatenates levels and re-compacts, so bucket sketches combine
+    across arbitrary ranges in constant memory.
+    """
+    
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.count = 0
+        self.compactors: List[List[float]] = [[]]
+        self._random = random.Random(seed)
+    
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+    
+    def _size(self) -> int:
+        return sum(len(c) for c in self.compactors)
+    
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+    
+    def _compress(self) -> None:
+        while self._size() > self._max_size():
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items.sort()
+                    offset = self._random.randint(0, 1)
+                    # An odd item out stays behind so no weight is lost
+                    keep = [items.pop()] if len(items) % 2 else []
+                    self.compactors[level + 1].extend(items[offset::2])
+                    self.compactors[level] = keep
+                    break
+    
+    def add(self, value: float) -> None:
+        """Add a value to the sketch"""
+        self.compactors[0].append(float(value))
+        self.count += 1
+        if len(self.compactors[0]) >= self._capacity(0):
+            self._compress()
+    
+    def update(self, values: Iterable[float]) -> None:
+        """Add several values to the sketch"""
+        for value in values:
+            self.add(value)
+    
+    def merge(self, other: "KLLSketch") -> None:
+        """Fold another sketch into this one"""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        self._compress()
+    
+    def _weighted_items(self) -> List[Tuple[float, int]]:
+        return sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+    
+    def quantiles(self, fractions: Iterable[float]) -> List[Optional[float]]:
+        """
+        Estimate values at the given ranks (0.0-1.0)
+        
+        Returns:
+            One estimate per fraction, or None entries for an empty sketch
+        """
+        fractions = list(fractions)
+        weighted = self._weighted_items()
+        if not weighted:
+            return [None] * len(fractions)
+        
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            target = fraction * total
+            cumulative = 0
+            value = weighted[-1][0]
+            for item, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    value = item
+                    break
+            results.append(value)
+        return results
+    
+    @property
+    def rank_error(self) -> float:
+        """Approximate normalized rank error (99% confidence)"""
+        return 2.296 / self.k ** 0.9723
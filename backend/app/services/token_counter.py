@@ -0,0 +1,249 @@
+"""
+Token Counter - Local prompt token estimates and context-window prechecks
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import logging
+import math
+import re
+
+from app.config import settings
+from app.exceptions import ContextWindowExceededError
+from app.metrics import registry
+from app.schemas import ModelRequest, Provider
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+context_precheck_total = registry.counter(
+    "hfrl_context_precheck_total",
+    "Requests adjusted or refused by the local context-window check",
+    ("provider", "outcome")
+)
+
+# (context window, maximum output tokens) by model name prefix; the
+# longest matching prefix wins
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gpt-4o": (128000, 16384),
+    "gpt-4-turbo": (128000, 4096),
+    "gpt-4-1106": (128000, 4096),
+    "gpt-4-0125": (128000, 4096),
+    "gpt-4-32k": (32768, 32768),
+    "gpt-4": (8192, 8192),
+    "gpt-3.5-turbo-instruct": (4096, 4096),
+    "gpt-3.5-turbo": (16385, 4096),
+    # claude-3-7 allows 128000 output tokens with the output-128k beta header
+    "claude-3-7": (200000, 64000),
+    "claude-3-5": (200000, 8192),
+    "claude-3-opus": (200000, 4096),
+    "claude-3-sonnet": (200000, 4096),
+    "claude-3-haiku": (200000, 4096),
+    "claude-3": (200000, 4096),
+    "claude-opus-4": (200000, 32000),
+    "claude-sonnet-4": (200000, 64000),
+    "claude-2": (100000, 4096),
+    "deepseek-chat": (32768, 4096),
+    "deepseek-coder": (16384, 4096),
+    "moonshot-v1-8k": (8192, 8192),
+    "moonshot-v1-32k": (32768, 32768),
+    "moonshot-v1-128k": (131072, 131072),
+}
+
+# Average characters per token for text without a local tokenizer
+CHARS_PER_TOKEN = {
+    Provider.OPENAI: 4.0,
+    Provider.ANTHROPIC: 3.5,
+    Provider.DEEPSEEK: 3.8,
+    Provider.KIMI: 3.8,
+}
+
+# Chat formatting: tokens per message, plus the assistant reply primer
+TOKENS_PER_MESSAGE = 4
+REPLY_PRIMER_TOKENS = 3
+
+# CJK ideographs and kana/hangul take roughly a token each
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """tiktoken encoding for an OpenAI model, cached; None if unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base" if model.startswith("gpt-4o") else "cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; offline hosts fall back
+        logger.warning(f"tiktoken encoding for {model} unavailable, estimating tokens: {str(e)}")
+        return None
+
+
+def heuristic_tokens(text: str, chars_per_token: float) -> int:
+    """Estimate tokens from character counts"""
+    cjk = len(_CJK.findall(text))
+    return math.ceil((len(text) - cjk) / chars_per_token + cjk)
+
+
+@dataclass
+class TokenEstimate:
+    """Outcome of a context-window precheck"""
+    prompt_tokens: int
+    exact: bool
+    max_tokens: int
+    context_window: Optional[int] = None
+    clamped: bool = False
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens locally before a request is sent
+    
+    OpenAI models are counted exactly with tiktoken when it is installed
+    (encodings are cached per model); other providers publish no local
+    tokenizer and are estimated from character counts. Counts of system
+    prompts, which evaluation runs repeat across thousands of requests, are
+    memoized. Inexact estimates get a safety margin: a request is refused
+    only if even the estimate less the margin can't fit, and clamped as if
+    the prompt were the estimate plus the margin.
+    """
+    
+    def __init__(
+        self,
+        policy: str = "clamp",
+        margin: float = 0.1,
+        cache_size: int = 1024,
+        context_overrides: Optional[Dict[str, int]] = None
+    ):
+        self.policy = policy
+        self.margin = margin
+        self.context_overrides = context_overrides or {}
+        self._prefixes = sorted(MODEL_LIMITS, key=len, reverse=True)
+        self.count_cached = lru_cache(maxsize=cache_size)(self.count)
+    
+    def warm(self) -> None:
+        """Load the OpenAI tokenizers now rather than on the first request"""
+        for model in ("gpt-4", "gpt-4o"):
+            _encoding(model)
+    
+    def limits(self, model: str) -> Optional[Tuple[int, int]]:
+        """
+        Context window and output limit of a model
+        
+        Returns:
+            (context window, maximum output tokens), or None for unknown models
+        """
+        limits = None
+        for prefix in self._prefixes:
+            if model.startswith(prefix):
+                limits = MODEL_LIMITS[prefix]
+                break
+        override = self.context_overrides.get(model)
+        if override:
+            return override, min(limits[1], override) if limits else override
+        return limits
+    
+    def count(self, provider: Provider, model: str, text: str) -> Tuple[int, bool]:
+        """
+        Count the tokens of one text
+        
+        Returns:
+            (tokens, whether the count is exact)
+        """
+        if provider == Provider.OPENAI:
+            encoding = _encoding(model)
+            if encoding is not None:
+                return len(encoding.encode(text, disallowed_special=())), True
+        return heuristic_tokens(text, CHARS_PER_TOKEN.get(provider, 4.0)), False
+    
+    def count_prompt(self, request: ModelRequest) -> Tuple[int, bool]:
+        """
+        Count the input tokens of a request, chat formatting included
+        
+        Returns:
+            (tokens, whether the count is exact)
+        """
+        tokens, exact = self.count(request.provider, request.model, request.prompt)
+        tokens += TOKENS_PER_MESSAGE + REPLY_PRIMER_TOKENS
+        if request.system_prompt:
+            system_tokens, system_exact = self.count_cached(
+                request.provider, request.model, request.system_prompt
+            )
+            tokens += system_tokens + TOKENS_PER_MESSAGE
+            exact = exact and system_exact
+        return tokens, exact
+    
+    def headroom(self, estimate: TokenEstimate) -> Optional[int]:
+        """
+        Tokens left in the context window after a checked prompt and its output
+        
+        Returns:
+            Spare tokens (with the estimate margin held back), or None for
+            unknown models
+        """
+        if estimate.context_window is None:
+            return None
+        scale = 1.0 if estimate.exact else 1 + self.margin
+        spare = estimate.context_window - math.ceil(estimate.prompt_tokens * scale) - estimate.max_tokens
+        return max(0, math.floor(spare / scale))
+    
+    def precheck(self, request: ModelRequest) -> Tuple[ModelRequest, TokenEstimate]:
+        """
+        Check that a request fits its model's context window
+        
+        With the ``clamp`` policy an oversized ``max_tokens`` is lowered to
+        what fits; with ``reject`` it is refused. A prompt that leaves no
+        room for output is always refused. Unknown models pass unchecked.
+        
+        Args:
+            request: Request about to be sent
+        
+        Returns:
+            The request (a copy if clamped) and the token estimate
+        
+        Raises:
+            ContextWindowExceededError: If the request can't fit
+        """
+        prompt_tokens, exact = self.count_prompt(request)
+        estimate = TokenEstimate(prompt_tokens=prompt_tokens, exact=exact, max_tokens=request.max_tokens)
+        limits = self.limits(request.model)
+        if limits is None:
+            return request, estimate
+        context_window, max_output = limits
+        estimate.context_window = context_window
+        
+        margin = 0.0 if exact else self.margin
+        if math.floor(prompt_tokens * (1 - margin)) >= context_window:
+            context_precheck_total.inc(request.provider.value, "rejected")
+            raise ContextWindowExceededError(request.model, prompt_tokens, context_window)
+        
+        available = min(context_window - math.ceil(prompt_tokens * (1 + margin)), max_output)
+        if request.max_tokens <= available:
+            return request, estimate
+        if self.policy == "reject" or available < 1:
+            context_precheck_total.inc(request.provider.value, "rejected")
+            raise ContextWindowExceededError(
+                request.model, prompt_tokens, context_window, request.max_tokens, available
+            )
+        
+        context_precheck_total.inc(request.provider.value, "clamped")
+        logger.info(f"Clamping max_tokens for {request.model} from {request.max_tokens} to {available}")
+        estimate.max_tokens = available
+        estimate.clamped = True
+        return request.model_copy(update={"max_tokens": available}), estimate
+
+
+# Create singleton instance
+token_counter = TokenCounter(
+    policy=settings.CONTEXT_OVERFLOW_POLICY,
+    margin=settings.TOKEN_ESTIMATE_MARGIN,
+    cache_size=settings.TOKEN_COUNT_CACHE_SIZE,
+    context_overrides=settings.MODEL_CONTEXT_WINDOWS
+)
@@ -0,0 +1,306 @@
+"""
+Usage Service - Token and latency accounting for provider calls
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+from app.config import settings
+from app.schemas import UsageBreakdown, UsageResponse, UsageStats
+from app.services.sketches import KLLSketch
+
+# Latency quantiles reported alongside usage
+LATENCY_QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class UsageCounters:
+    """Running totals for one (bucket, provider, model) or session"""
+    __slots__ = (
+        "calls", "errors", "prompt_tokens", "completion_tokens",
+        "cache_read_tokens", "cache_write_tokens", "latency", "success_latency"
+    )
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.latency = 0.0
+        # Failed calls time out or fail fast; either would skew throughput
+        self.success_latency = 0.0
+    
+    def add(self, other: "UsageCounters") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+        self.latency += other.latency
+        self.success_latency += other.success_latency
+    
+    def to_stats(self) -> UsageStats:
+        """Convert to the API schema, deriving averages and throughput"""
+        successes = self.calls - self.errors
+        return UsageStats(
+            calls=self.calls,
+            errors=self.errors,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+            cache_read_tokens=self.cache_read_tokens,
+            cache_write_tokens=self.cache_write_tokens,
+            cache_hit_ratio=(
+                round(self.cache_read_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None
+            ),
+            average_latency=round(self.success_latency / successes, 4) if successes else None,
+            tokens_per_second=(
+                round(self.completion_tokens / self.success_latency, 2) if self.success_latency > 0 else None
+            )
+        )
+
+
+class UsageService:
+    """
+    Records per-call token usage and latency
+    
+    Calls are folded into fixed-width time buckets per provider and model,
+    plus an LRU-bounded table per session, so recording is O(1) and memory
+    is bounded by the retention window rather than by call volume.
+    """
+    
+    def __init__(self):
+        self.bucket_seconds = settings.USAGE_BUCKET_SECONDS
+        self.retention_seconds = settings.USAGE_RETENTION_HOURS * 3600
+        self.max_sessions = settings.USAGE_MAX_SESSIONS
+        self._buckets: Dict[Tuple[int, str, str], UsageCounters] = {}
+        self._latencies: Dict[Tuple[int, str, str], KLLSketch] = {}
+        # Generation of each bucket's latest record, to version a window's totals
+        self._generations: Dict[Tuple[int, str, str], int] = {}
+        self._sessions: "OrderedDict[str, UsageCounters]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every record; stamps the buckets it lands in
+        self.generation = 0
+    
+    def record(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency: float = 0.0,
+        session_id: Optional[str] = None,
+        error: bool = False,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> None:
+        """
+        Record a single provider call
+        
+        Args:
+            provider: Provider that served the call
+            model: Model that served the call
+            prompt_tokens: Input tokens billed
+            completion_tokens: Output tokens billed
+            latency: Wall-clock seconds spent on the call
+            session_id: Optional session the call belongs to
+            error: Whether the call failed
+            cache_read_tokens: Input tokens served from the provider's prompt cache
+            cache_write_tokens: Input tokens written to the provider's prompt cache
+        """
+        now = time.time()
+        bucket = int(now // self.bucket_seconds) * self.bucket_seconds
+        key = (bucket, provider, model)
+        
+        with self._lock:
+            counters = self._buckets.get(key)
+            if counters is None:
+                counters = self._buckets[key] = UsageCounters()
+                self._latencies[key] = KLLSketch()
+                self._evict(now)
+            self._apply(
+                counters, prompt_tokens, completion_tokens, cache_read_tokens, cache_write_tokens, latency, error
+            )
+            
+            if not error:
+                self._latencies[key].add(latency)
+            
+            if session_id:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    session = self._sessions[session_id] = UsageCounters()
+                    if len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+                else:
+                    self._sessions.move_to_end(session_id)
+                self._apply(
+                    session, prompt_tokens, completion_tokens, cache_read_tokens, cache_write_tokens, latency, error
+                )
+            
+            self.generation += 1
+            self._generations[key] = self.generation
+    
+    @staticmethod
+    def _apply(
+        counters: UsageCounters,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cache_read_tokens: int,
+        cache_write_tokens: int,
+        latency: float,
+        error: bool
+    ) -> None:
+        counters.calls += 1
+        counters.errors += int(error)
+        counters.prompt_tokens += prompt_tokens
+        counters.completion_tokens += completion_tokens
+        counters.cache_read_tokens += cache_read_tokens
+        counters.cache_write_tokens += cache_write_tokens
+        counters.latency += latency
+        if not error:
+            counters.success_latency += latency
+    
+    def _evict(self, now: float) -> None:
+        """Drop buckets that fell out of the retention window"""
+        cutoff = now - self.retention_seconds
+        for key in [key for key in self._buckets if key[0] < cutoff]:
+            del self._buckets[key]
+            del self._latencies[key]
+            del self._generations[key]
+    
+    def _select(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        provider: Optional[str],
+        model: Optional[str]
+    ) -> List[Tuple[Tuple[int, str, str], UsageCounters]]:
+        start = start_date.timestamp() if start_date else None
+        end = end_date.timestamp() if end_date else None
+        return [
+            (key, counters)
+            for key, counters in self._buckets.items()
+            if (start is None or key[0] + self.bucket_seconds > start)
+            and (end is None or key[0] <= end)
+            and (provider is None or key[1] == provider)
+            and (model is None or key[2] == model)
+        ]
+    
+    def get_totals(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> UsageStats:
+        """Aggregate usage over buckets overlapping the range"""
+        totals = UsageCounters()
+        with self._lock:
+            for _, counters in self._select(start_date, end_date, provider, model):
+                totals.add(counters)
+        return totals.to_stats()
+    
+    def get_window_totals(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        latency: bool = False
+    ) -> Tuple[UsageStats, Optional[KLLSketch], Optional[str]]:
+        """
+        Aggregate usage over buckets overlapping the range, with a version
+        
+        Args:
+            start_date: Optional start of the range (bucket-aligned)
+            end_date: Optional end of the range (bucket-aligned)
+            provider: Optional provider filter
+            model: Optional model filter
+            latency: Also merge the buckets' latency sketches
+        
+        Returns:
+            The totals, the merged latency sketch (None unless asked for),
+            and a version that changes whenever either does: the generation
+            of the newest record in the selected buckets plus their count,
+            so an eviction changes it too. The version is None once the
+            range ended before the current bucket began, as no new call can
+            land in it.
+        """
+        totals = UsageCounters()
+        sketch = KLLSketch() if latency else None
+        newest = 0
+        with self._lock:
+            selected = self._select(start_date, end_date, provider, model)
+            for key, counters in selected:
+                totals.add(counters)
+                newest = max(newest, self._generations[key])
+                if sketch is not None:
+                    sketch.merge(self._latencies[key])
+        current_bucket = time.time() // self.bucket_seconds * self.bucket_seconds
+        if end_date is not None and end_date.timestamp() < current_bucket:
+            return totals.to_stats(), sketch, None
+        return totals.to_stats(), sketch, f"{newest}.{len(selected)}"
+    
+    def get_usage(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> UsageResponse:
+        """
+        Get usage totals, per-model breakdown, time series and latency quantiles
+        
+        Args:
+            start_date: Optional start of the range (bucket-aligned)
+            end_date: Optional end of the range (bucket-aligned)
+            provider: Optional provider filter
+            model: Optional model filter
+        
+        Returns:
+            Usage response
+        """
+        totals = UsageCounters()
+        by_model: Dict[Tuple[str, str], UsageCounters] = {}
+        over_time: Dict[int, UsageCounters] = {}
+        latency = KLLSketch()
+        
+        with self._lock:
+            selected = self._select(start_date, end_date, provider, model)
+            for key, counters in selected:
+                bucket, bucket_provider, bucket_model = key
+                totals.add(counters)
+                by_model.setdefault((bucket_provider, bucket_model), UsageCounters()).add(counters)
+                over_time.setdefault(bucket, UsageCounters()).add(counters)
+                latency.merge(self._latencies[key])
+        
+        quantiles = latency.quantiles(LATENCY_QUANTILES.values())
+        return UsageResponse(
+            totals=totals.to_stats(),
+            by_model=[
+                UsageBreakdown(provider=key[0], model=key[1], **counters.to_stats().model_dump())
+                for key, counters in sorted(by_model.items())
+            ],
+            over_time=[
+                {
+                    "bucket_start": datetime.fromtimestamp(bucket).isoformat(),
+                    **counters.to_stats().model_dump()
+                }
+                for bucket, counters in sorted(over_time.items())
+            ],
+            latency_quantiles=dict(zip(LATENCY_QUANTILES, quantiles))
+        )
+    
+    def get_session_usage(self, session_id: str) -> Optional[UsageStats]:
+        """Get usage totals for a session, if it is still tracked"""
+        with self._lock:
+            counters = self._sessions.get(session_id)
+            return counters.to_stats() if counters else None
+
+
+# Create singleton instance
+usage_service = UsageService()
@@ -0,0 +1,141 @@
+"""
+Worker Pool - Runs CPU-heavy synchronous work off the event loop
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+import asyncio
+import sys
+import threading
+import time
+
+from app.config import settings
+from app.exceptions import WorkerPoolSaturatedError
+from app.metrics import registry
+from app.tracing import record_span
+
+T = TypeVar("T")
+
+# Cancellation flag of the job running in the current worker thread
+_cancel_event: "ContextVar[Optional[threading.Event]]" = ContextVar("cancel_event", default=None)
+
+
+class WorkCancelledError(Exception):
+    """Raised inside a job whose caller has gone away"""
+
+
+def check_cancelled() -> None:
+    """
+    Cooperative cancellation point for code running in the pool
+    
+    Threads can't be interrupted, so long computations should call this
+    between phases; it raises once the awaiting request was cancelled.
+    Outside the pool it is a no-op.
+    """
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise WorkCancelledError()
+
+
+def _run_job(submitted: float, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Job entry point in the worker thread; records the time spent queued"""
+    record_span("queue", submitted, time.perf_counter() - submitted)
+    return func(*args, **kwargs)
+
+
+class WorkerPool:
+    """
+    Bounded thread pool for analytics, exports and rollups
+    
+    Keeps the event loop free so generation and feedback requests aren't
+    stalled behind large aggregations. Jobs that are still queued when their
+    caller is cancelled never start; running jobs are asked to stop at the
+    next ``check_cancelled()`` call. With ``max_workers=0`` jobs run inline.
+    
+    Jobs are pure Python and hold the GIL while they run, so the event loop
+    only gets it back when the interpreter forces a switch, every 5 ms by
+    default, after each socket read or write it makes. A shorter
+    ``switch_interval``, set once the pool starts, keeps requests served
+    alongside a running job from paying that wait many times over.
+    """
+    
+    def __init__(self, max_workers: int, max_pending: int, switch_interval: float = 0.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.switch_interval = switch_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if self.switch_interval > 0:
+                    sys.setswitchinterval(self.switch_interval)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="hfrl-worker"
+                )
+            return self._executor
+    
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a synchronous callable in the pool and await its result
+        
+        Args:
+            func: Callable to run
+            *args: Positional arguments for the callable
+            **kwargs: Keyword arguments for the callable
+        
+        Returns:
+            The callable's return value
+        
+        Raises:
+            WorkerPoolSaturatedError: If too many jobs are already waiting
+        """
+        if self.max_workers <= 0:
+            return func(*args, **kwargs)
+        
+        if self._pending >= self.max_pending:
+            raise WorkerPoolSaturatedError()
+        
+        cancel_event = threading.Event()
+        context = copy_context()
+        context.run(_cancel_event.set, cancel_event)
+        call = partial(context.run, _run_job, time.perf_counter(), func, *args, **kwargs)
+        
+        self._pending += 1
+        future = self._get_executor().submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Drop the job if it hasn't started, otherwise ask it to stop
+            future.cancel()
+            cancel_event.set()
+            raise
+        finally:
+            self._pending -= 1
+    
+    @property
+    def pending(self) -> int:
+        """Jobs submitted and not yet finished"""
+        return self._pending
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool; it is recreated lazily on the next job"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# Create singleton instance
+worker_pool = WorkerPool(
+    max_workers=settings.WORKER_POOL_SIZE,
+    max_pending=settings.WORKER_POOL_MAX_PENDING,
+    switch_interval=settings.WORKER_POOL_SWITCH_INTERVAL
+)
+registry.register_collector(lambda: [
+    ("hfrl_worker_pool_pending", "gauge", "Bulk computations queued or running", worker_pool.pending)
+])
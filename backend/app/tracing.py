@@ -0,0 +1,337 @@
+"""
+Request tracing - Per-phase spans for Server-Timing headers and OTLP export
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from fastapi.routing import APIRoute
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Span kinds from the OpenTelemetry protocol
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+
+# Ids only need to be unique, not unpredictable; getrandbits is much
+# cheaper per span than uuid4's os.urandom
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+@dataclass
+class Span:
+    """One timed phase of a request"""
+    name: str
+    span_id: str
+    parent_id: str
+    start_ns: int
+    duration: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """
+    Spans collected while serving one request
+    
+    Spans are appended from the event loop and from worker threads (the
+    pool copies the request's context), which list.append makes safe.
+    """
+    
+    def __init__(self, trace_id: Optional[str] = None, parent_id: Optional[str] = None):
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.parent_id = parent_id
+        self.root_id = _new_span_id()
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+    
+    def add(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        parent_id: Optional[str] = None,
+        span_id: Optional[str] = None,
+        **attributes: Any
+    ) -> None:
+        """Record a span measured with perf_counter() timestamps"""
+        self.spans.append(Span(
+            name=name,
+            span_id=span_id or _new_span_id(),
+            parent_id=parent_id or self.root_id,
+            start_ns=self.start_ns + int((start - self.start) * 1e9),
+            duration=duration,
+            attributes=attributes
+        ))
+    
+    def server_timing(self, total: float) -> str:
+        """
+        Format the spans as a Server-Timing header value
+        
+        Spans with the same name are summed and listed in order of first
+        start; ``total`` is the time until the response started.
+        """
+        durations: Dict[str, float] = {}
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            durations[span.name] = durations.get(span.name, 0.0) + span.duration
+        metrics = [f"{name};dur={duration * 1000:.1f}" for name, duration in durations.items()]
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_current_trace: "ContextVar[Optional[Trace]]" = ContextVar("current_trace", default=None)
+_current_span: "ContextVar[Optional[str]]" = ContextVar("current_span", default=None)
+# perf_counter() marks of the route handler being run, see TimedRoute
+_route_marks: "ContextVar[Optional[List[float]]]" = ContextVar("route_marks", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being served, if tracing is on"""
+    return _current_trace.get()
+
+
+def start_trace(trace: Trace) -> Any:
+    """Make a trace current; returns a token for end_trace()"""
+    return _current_trace.set(trace)
+
+
+def end_trace(token: Any) -> None:
+    _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """
+    Time a block as a phase of the current request
+    
+    Works in coroutines and in worker-pool threads; a no-op outside a
+    traced request. Spans opened inside the block become its children in
+    exported traces. Server-Timing names should be short tokens such as
+    ``provider`` or ``storage``.
+    
+    Args:
+        name: Phase name
+        **attributes: Extra attributes for exported spans
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    
+    span_id = _new_span_id()
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        trace.add(name, start, duration, parent_id, span_id, **attributes)
+
+
+def record_span(name: str, start: float, duration: float, **attributes: Any) -> None:
+    """Record an already measured phase (perf_counter start) on the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start, duration, _current_span.get(), **attributes)
+
+
+def parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read a W3C ``traceparent`` header
+    
+    Returns:
+        (trace id, parent span id), or (None, None) if absent or malformed
+    """
+    if not value:
+        return None, None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None, None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+class TimedRoute(APIRoute):
+    """
+    API route that splits handler time into validate, handler and serialize
+    
+    FastAPI reads the body, validates parameters, calls the endpoint and
+    serializes its return value in one function. Wrapping the endpoint
+    marks where the first and last phases end and begin, so every router
+    using this route class gets the breakdown without per-endpoint code.
+    """
+    
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if call is None or not asyncio.iscoroutinefunction(call):
+            return
+        
+        async def timed_endpoint(**values: Any) -> Any:
+            trace = _current_trace.get()
+            if trace is None:
+                return await call(**values)
+            marks = _route_marks.get()
+            if marks is not None:
+                marks[1] = time.perf_counter()
+            with span("handler"):
+                try:
+                    return await call(**values)
+                finally:
+                    if marks is not None:
+                        marks[2] = time.perf_counter()
+        
+        self.dependant.call = timed_endpoint
+    
+    def get_route_handler(self) -> Callable[..., Any]:
+        handler = super().get_route_handler()
+        
+        async def timed_handler(request: Any) -> Any:
+            trace = _current_trace.get()
+            if trace is None:
+                return await handler(request)
+            # [handler entered, endpoint called, endpoint returned]
+            marks = [time.perf_counter(), 0.0, 0.0]
+            token = _route_marks.set(marks)
+            try:
+                return await handler(request)
+            finally:
+                end = time.perf_counter()
+                _route_marks.reset(token)
+                # Without an endpoint call, the request failed validation
+                trace.add("validate", marks[0], (marks[1] or end) - marks[0])
+                if marks[2]:
+                    trace.add("serialize", marks[2], end - marks[2])
+        
+        return timed_handler
+
+
+class OTLPFileExporter:
+    """
+    Appends finished traces to a file in OTLP/JSON, one request per line
+    
+    The format is what the OpenTelemetry Collector's ``otlpjsonfile``
+    receiver reads, so traces can be replayed into Jaeger, Tempo or any
+    OTLP backend. Writes happen on a background thread; when the queue is
+    full, traces are dropped rather than slowing requests down.
+    """
+    
+    def __init__(self, path: str, service_name: str = "hfrl-backend", max_queue: int = 10000):
+        self.path = path
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._write_loop, name="hfrl-trace-export", daemon=True)
+                self._thread.start()
+    
+    def export(self, trace: Trace, name: str, duration: float, attributes: Dict[str, Any]) -> None:
+        """Queue a finished request for writing"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(self._encode(trace, name, duration, attributes))
+        except queue.Full:
+            self.dropped += 1
+    
+    def _encode(self, trace: Trace, name: str, duration: float, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        root = Span(
+            name=name,
+            span_id=trace.root_id,
+            parent_id=trace.parent_id or "",
+            start_ns=trace.start_ns,
+            duration=duration,
+            attributes=attributes
+        )
+        spans = [self._encode_span(trace, root, SPAN_KIND_SERVER)]
+        spans.extend(self._encode_span(trace, span, SPAN_KIND_INTERNAL) for span in list(trace.spans))
+        return {"resourceSpans": [{
+            "resource": {"attributes": _encode_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+        }]}
+    
+    @staticmethod
+    def _encode_span(trace: Trace, span: Span, kind: int) -> Dict[str, Any]:
+        encoded = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.start_ns + int(span.duration * 1e9)),
+            "attributes": _encode_attributes(span.attributes),
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+    
+    def _write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                try:
+                    f.write(json.dumps(item, separators=(",", ":")) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except (OSError, TypeError, ValueError) as e:
+                    logger.warning(f"Could not export trace: {str(e)}")
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued traces and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+
+def _encode_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": typed})
+    return encoded
+
+
+# Create singleton instance (None unless export is configured)
+trace_exporter: Optional[OTLPFileExporter] = (
+    OTLPFileExporter(settings.TRACING_EXPORT_FILE) if settings.TRACING_EXPORT_FILE else None
+)
@@ -0,0 +1,156 @@
+"""
+Benchmark: /api/feedback latency while heavy analytics queries run
+
+Starts the app under uvicorn in a subprocess, seeds ``--records``
+feedback records through the API, and measures POST /api/feedback
+latency over real connections on its own and while several concurrent
+clients hammer GET /api/analytics with uncached date windows. The server runs once with
+analytics computed inline on the event loop (WORKER_POOL_SIZE=0, the old
+behaviour) and once through the worker pool.
+
+Usage:
+    python benchmarks/analytics_offload.py [--records 10000] [--requests 200] [--clients 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WORKER_POOL_SIZE=str(workers),
+        # Every simulated client shares one address; measure latency, not the limiter
+        RATE_LIMIT_PER_MINUTE="0",
+        RATE_LIMIT_ROUTES="{}",
+        LOG_LEVEL="WARNING",
+        JOBS_DB_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), f".bench-jobs-{port}.db"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/ready").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not become ready")
+
+
+async def seed(base_url, records):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def writer(start):
+            for i in range(start, records, 16):
+                response = await client.post(
+                    "/api/feedback", json={"rating": i % 5 + 1, "session_id": f"bench-{i % 500}"}
+                )
+                response.raise_for_status()
+        await asyncio.gather(*(writer(start) for start in range(16)))
+
+
+async def measure_feedback(client, requests):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        response = await client.post("/api/feedback", json={"rating": i % 5 + 1})
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def analytics_load(client, stop, offset):
+    queries = 0
+    while not stop.is_set():
+        # A new window each time, so every query is a cache miss
+        start_date = (datetime(2000, 1, 1) + timedelta(seconds=offset + queries)).isoformat()
+        response = await client.get("/api/analytics", params={"start_date": start_date})
+        response.raise_for_status()
+        queries += 1
+    return queries
+
+
+async def run_scenario(base_url, analytics_clients, requests):
+    limits = httpx.Limits(max_connections=analytics_clients + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        stop = asyncio.Event()
+        loaders = [
+            asyncio.create_task(analytics_load(client, stop, offset=i * 10 ** 6))
+            for i in range(analytics_clients)
+        ]
+        # Let the analytics load build up first
+        await asyncio.sleep(0.5 if analytics_clients else 0)
+        started = time.perf_counter()
+        latencies = await measure_feedback(client, requests)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        queries = sum(await asyncio.gather(*loaders))
+    
+    return {
+        "analytics_clients": analytics_clients,
+        "feedback_p50_ms": round(percentile(latencies, 0.5), 2),
+        "feedback_p99_ms": round(percentile(latencies, 0.99), 2),
+        "feedback_mean_ms": round(statistics.mean(latencies), 2),
+        "analytics_qps": round(queries / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=10000, help="Feedback records to seed")
+    parser.add_argument("--requests", type=int, default=200, help="Feedback writes to time per scenario")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent analytics clients")
+    parser.add_argument("--workers", type=int, default=2, help="Worker pool size to compare against inline")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+    
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for workers in (0, args.workers):
+        server = start_server(args.port, workers)
+        try:
+            asyncio.run(seed(base_url, args.records))
+            for clients in (0, args.clients):
+                row = asyncio.run(run_scenario(base_url, clients, args.requests))
+                results.append({"workers": workers, **row})
+        finally:
+            server.terminate()
+            server.wait()
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    print(f"{'mode':<8} {'analytics clients':>17} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'analytics q/s':>14}")
+    for row in results:
+        mode = "inline" if row["workers"] == 0 else f"pool({row['workers']})"
+        print(
+            f"{mode:<8} {row['analytics_clients']:>17} {row['feedback_p50_ms']:>8} "
+            f"{row['feedback_p99_ms']:>8} {row['feedback_mean_ms']:>8} {row['analytics_qps']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: feedback compaction cost and its effect on writes and analytics
+
+Fills the feedback store with ``--old`` records spread over the days before
+the retention cutoff and ``--recent`` newer ones, then compacts the old
+ones into rollups (and, with ``--archive``, a gzip archive) while a writer
+keeps creating feedback. Reports the compaction time, the worst event loop
+stall and write latency during it, and the exact analytics computation time
+before and after, with the totals to show nothing was lost.
+
+Usage:
+    python benchmarks/feedback_compaction.py [--old 200000] [--recent 20000]
+        [--batch 1000] [--archive /tmp/feedback-archive.jsonl.gz]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas import AnalyticsRequest, FeedbackCreate
+from app.services.analytics_service import analytics_service
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.retention_service import RetentionService
+
+RETENTION_DAYS = 30
+
+
+def fill(old: int, recent: int) -> None:
+    rng = random.Random(0)
+    now = datetime.now()
+    span = timedelta(days=RETENTION_DAYS * 2).total_seconds()
+    # Oldest first, as the store holds records in creation order
+    ages = sorted(
+        [timedelta(days=RETENTION_DAYS, seconds=rng.random() * span) for _ in range(old)]
+        + [timedelta(seconds=rng.random() * (RETENTION_DAYS - 1) * 86400) for _ in range(recent)],
+        reverse=True
+    )
+    for age in ages:
+        feedback_id = str(uuid.uuid4())
+        timestamp = now - age
+        feedback_storage[feedback_id] = {
+            "id": feedback_id,
+            "session_id": f"session-{rng.randrange(5000)}",
+            "rating": rng.randint(1, 5),
+            "comments": "benchmark feedback",
+            "response_id": None,
+            "inline_feedback": [],
+            "learning_rate": 0.001,
+            "provider": None,
+            "model": None,
+            "compared_with": None,
+            "preference": None,
+            "timestamp": timestamp,
+            "created_at": timestamp
+        }
+
+
+def time_analytics(label: str) -> None:
+    start = time.perf_counter()
+    response = analytics_service._compute_analytics(AnalyticsRequest())
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<18} exact analytics {elapsed * 1000:8.1f} ms  total_feedback {response.total_feedback}  "
+        f"average_quality {response.average_quality}  raw records {len(feedback_storage)}"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    service = RetentionService(RETENTION_DAYS, args.archive or "", batch_size=args.batch)
+    stalls = []
+    write_latencies = []
+    done = asyncio.Event()
+    
+    async def ticker() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start - 0.001)
+    
+    async def writer() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            feedback_service.create_feedback(FeedbackCreate(rating=4, comments="written during compaction"))
+            write_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.001)
+    
+    tasks = [asyncio.create_task(ticker()), asyncio.create_task(writer())]
+    start = time.perf_counter()
+    compacted = await service.compact()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*tasks)
+    
+    write_latencies.sort()
+    print(
+        f"compacted {compacted} records in {elapsed:.2f} s ({compacted / elapsed:,.0f}/s), "
+        f"{len(write_latencies)} writes meanwhile"
+    )
+    print(
+        f"max event loop stall {max(stalls) * 1000:.2f} ms, write latency p99 "
+        f"{write_latencies[int(len(write_latencies) * 0.99)] * 1e6:.0f} us max {write_latencies[-1] * 1e6:.0f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--old", type=int, default=200000, help="Records past the retention period")
+    parser.add_argument("--recent", type=int, default=20000, help="Records within the retention period")
+    parser.add_argument("--batch", type=int, default=1000, help="Records compacted per step")
+    parser.add_argument("--archive", default=None, help="Archive file for compacted records")
+    args = parser.parse_args()
+    
+    fill(args.old, args.recent)
+    time_analytics("before compaction")
+    asyncio.run(run(args))
+    time_analytics("after compaction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: feedback search indexing rate and query latency at scale
+
+Indexes ``--comments`` synthetic comments whose words follow a Zipf
+distribution over ``--vocabulary`` terms, the way real text does, then
+times ranked searches for rare, mixed and common-word queries (the top 20
+results, as the endpoint returns by default). A substring scan over every
+comment, which is what clients did before, is timed for comparison.
+
+Usage:
+    python benchmarks/feedback_search.py [--comments 1000000] [--vocabulary 50000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.feedback_service import feedback_storage
+from app.services.search_index import SearchIndex
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--comments", type=int, default=1000000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=20, help="Mean words per comment")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per kind")
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(args.vocabulary)]
+    cumulative = list(accumulate(1 / (rank + 1) for rank in range(args.vocabulary)))
+    now = datetime.now()
+    for _ in range(args.comments):
+        feedback_id = str(uuid.uuid4())
+        length = max(1, int(rng.expovariate(1 / args.words)))
+        feedback_storage[feedback_id] = {
+            "id": feedback_id,
+            "session_id": f"session-{rng.randrange(10000)}",
+            "rating": rng.randint(1, 5),
+            "comments": " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=length)),
+            "timestamp": now
+        }
+    
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.rebuild()
+    elapsed = time.perf_counter() - start
+    print(
+        f"indexed {len(index)} comments, {index.terms} terms in {elapsed:.1f} s "
+        f"({elapsed / len(index) * 1e6:.1f} us/comment)"
+    )
+    
+    kinds = {
+        "rare": lambda: [rng.choice(vocabulary[1000:])],
+        "mixed": lambda: [rng.choice(vocabulary[:100]), rng.choice(vocabulary[1000:])],
+        "common": lambda: rng.sample(vocabulary[:20], 3),
+    }
+    for kind, make_query in kinds.items():
+        latencies = []
+        for _ in range(args.queries):
+            query = " ".join(make_query())
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            latencies.append(time.perf_counter() - start)
+        print(
+            f"{kind:<7} query p50 {percentile(latencies, 0.5) * 1000:8.2f} ms  "
+            f"p99 {percentile(latencies, 0.99) * 1000:8.2f} ms"
+        )
+    
+    needle = vocabulary[-1]
+    start = time.perf_counter()
+    matches = [data for data in feedback_storage.values() if needle in data["comments"]]
+    print(f"scan    one term over every comment {(time.perf_counter() - start) * 1000:8.2f} ms ({len(matches)} matches)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: leaderboard update cost, read latency and ranking accuracy
+
+Simulates feedback for models with known Bradley-Terry strengths: each
+event rates one model's response (noisy around its strength) and, for a
+share of events, records a preference against another model drawn from
+the true win probability. Events are fed to a LeaderboardService the way
+feedback writes are; the benchmark reports the cost per event, the time
+to read the board, the time of a full refit, and how well the online and
+refitted rankings match the true order (Spearman rank correlation).
+
+Usage:
+    python benchmarks/leaderboard_update.py [--models 50] [--events 200000] [--pairwise 0.5]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.leaderboard_service import LeaderboardService
+
+
+def spearman(true_order, estimated_order) -> float:
+    rank = {model: i for i, model in enumerate(estimated_order)}
+    n = len(true_order)
+    d2 = sum((i - rank[model]) ** 2 for i, model in enumerate(true_order))
+    return 1 - 6 * d2 / (n * (n * n - 1))
+
+
+def report(label: str, service: LeaderboardService, strengths) -> None:
+    start = time.perf_counter()
+    board = service.leaderboard()
+    read = time.perf_counter() - start
+    true_order = sorted(strengths, key=strengths.get, reverse=True)
+    estimated = [entry.model for entry in board.entries]
+    print(f"{label:<8} read {read * 1000:6.2f} ms  spearman {spearman(true_order, estimated):.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", type=int, default=50)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--pairwise", type=float, default=0.5, help="Share of events with a preference")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    strengths = {f"model-{i}": rng.gauss(0, 0.8) for i in range(args.models)}
+    names = list(strengths)
+    records = []
+    for _ in range(args.events):
+        model = rng.choice(names)
+        rating = max(1, min(5, round(3 + 2 * strengths[model] + rng.gauss(0, 1))))
+        record = {"provider": "openai", "model": model, "rating": rating, "timestamp": datetime.now()}
+        if rng.random() < args.pairwise:
+            other = rng.choice(names)
+            if other != model:
+                p = 1 / (1 + math.exp(strengths[other] - strengths[model]))
+                record["compared_with"] = {"provider": "openai", "model": other}
+                record["preference"] = "win" if rng.random() < p else "loss"
+        records.append(record)
+    
+    service = LeaderboardService(refit_interval=0)
+    start = time.perf_counter()
+    for record in records:
+        service.on_feedback_event("created", record)
+    elapsed = time.perf_counter() - start
+    print(f"{args.events} events, {args.models} models: {elapsed / args.events * 1e6:.2f} us/event")
+    report("online", service, strengths)
+    
+    start = time.perf_counter()
+    asyncio.run(service.refit())
+    print(f"refit    {(time.perf_counter() - start) * 1000:.1f} ms over {len(service._pairs)} model pairs")
+    report("refit", service, strengths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark: GET /api/feedback list throughput before and after the fast path
+
+The legacy scenario reproduces the previous route: FeedbackService builds
+one FeedbackResponse per record, FastAPI revalidates them against
+``response_model`` and encodes with jsonable_encoder + json.dumps. The
+fast scenario is the current router (stored dicts serialized by orjson),
+with and without negotiated compression. Requests are driven straight
+through the ASGI interface, so only server-side work is measured.
+
+Usage:
+    python benchmarks/list_serialization.py [--records 5000] [--requests 200] [--limit 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Query
+
+from app.middleware.compression import CompressionMiddleware
+from app.routers import feedback
+from app.schemas import FeedbackCreate, FeedbackResponse
+from app.services.feedback_service import feedback_service
+
+
+def legacy_app() -> FastAPI:
+    """The list route as it was before the fast path"""
+    app = FastAPI()
+    
+    @app.get("/api/feedback", response_model=List[FeedbackResponse])
+    async def get_all_feedback(
+        session_id: Optional[str] = Query(None),
+        limit: int = Query(100, ge=1, le=1000),
+        offset: int = Query(0, ge=0)
+    ):
+        if session_id:
+            return feedback_service.get_feedback_by_session(session_id)
+        return feedback_service.get_all_feedback(limit=limit, offset=offset)
+    
+    return app
+
+
+def fast_app(compress: bool) -> FastAPI:
+    app = FastAPI()
+    app.include_router(feedback.router, prefix="/api/feedback")
+    if compress:
+        app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return app
+
+
+async def drive(app, requests: int, limit: int, accept_encoding: str) -> dict:
+    """Send list requests through the ASGI app and measure throughput"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/feedback",
+        "raw_path": b"/api/feedback",
+        "root_path": "",
+        "query_string": f"limit={limit}".encode(),
+        "headers": [(b"host", b"bench"), (b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    never = asyncio.Event()
+    body_size = 0
+    
+    def make_receive():
+        sent = False
+        
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await never.wait()
+        
+        return receive
+    
+    async def send(message):
+        nonlocal body_size
+        if message["type"] == "http.response.body":
+            body_size += len(message.get("body", b""))
+    
+    for _ in range(5):
+        await app(dict(scope), make_receive(), send)
+    
+    body_size = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), make_receive(), send)
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "ms_per_request": round(elapsed / requests * 1000, 3),
+        "body_bytes": body_size // requests,
+    }
+
+
+def seed(records: int) -> None:
+    rng = random.Random(42)
+    for i in range(records):
+        feedback_service.create_feedback(FeedbackCreate(
+            session_id=f"session-{i % 200}",
+            rating=rng.randint(1, 5),
+            comments="Helpful answer, but the second paragraph repeats itself. " * rng.randint(1, 4),
+            response_id=f"response-{i}",
+            inline_feedback=[{"text": "repeats", "start": 12, "end": 19, "rating": -1}],
+        ))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=5000, help="Feedback records to seed")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--limit", type=int, default=1000, help="Page size requested")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+    
+    seed(args.records)
+    results = {
+        "legacy": await drive(legacy_app(), args.requests, args.limit, "identity"),
+        "fast": await drive(fast_app(compress=False), args.requests, args.limit, "identity"),
+        "fast_gzip": await drive(fast_app(compress=True), args.requests, args.limit, "gzip"),
+        "fast_br": await drive(fast_app(compress=True), args.requests, args.limit, "br, gzip"),
+    }
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    print(f"{'scenario':<12} {'req/s':>10} {'ms/request':>12} {'body bytes':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:<12} {result['requests_per_second']:>10} "
+            f"{result['ms_per_request']:>12} {result['body_bytes']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
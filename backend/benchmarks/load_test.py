@@ -0,0 +1,313 @@
+"""
+Load test: throughput and latency of the main endpoints against a mock provider
+
+Starts benchmarks/mock_provider.py (unless --mock-url is given), points the
+backend's provider base URLs at it and runs each scenario with a fixed
+number of concurrent clients. By default the app runs in-process (its
+lifespan included) behind an ASGI transport; pass --target to load a
+running server instead, which must already be configured with the mock's
+base URLs and rate limits that won't get in the way.
+
+Scenarios: generate_openai, generate_anthropic, feedback_write,
+feedback_read, analytics, analytics_approximate.
+
+Results (RPS, p50/p90/p99/mean/max latency, error counts) are printed and
+can be written as JSON with --output for regression tracking.
+
+Usage:
+    python benchmarks/load_test.py [--scenarios generate_openai,feedback_write]
+        [--concurrency 32] [--requests 1000] [--output results.json]
+        [--latency-ms 200 --error-rate 0.01 ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import httpx
+
+from mock_provider import add_mock_arguments
+
+SCENARIOS = (
+    "generate_openai",
+    "generate_anthropic",
+    "generate_cached",
+    "feedback_write",
+    "feedback_read",
+    "analytics",
+    "analytics_approximate",
+)
+
+RequestSpec = Tuple[str, str, Optional[Dict[str, Any]]]
+
+# A long evaluation rubric shared by every generate_cached request, so all
+# but the first are served from the (mock) provider's prompt cache
+CACHED_SYSTEM_PROMPT = " ".join(
+    f"Rule {i}: judge the answer for accuracy, completeness and tone." for i in range(120)
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Run the mock provider in a subprocess so it doesn't share our event loop"""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_provider.py"),
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--latency-dist", args.latency_dist,
+        "--latency-sigma", str(args.latency_sigma),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens),
+        "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status),
+        "--cache-min-tokens", str(args.cache_min_tokens),
+        "--cache-latency-factor", str(args.cache_latency_factor),
+    ]
+    process = subprocess.Popen(command)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{url}/stats", timeout=0.5)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock provider did not start")
+
+
+def configure_backend(mock_url: str) -> None:
+    """Environment for the in-process app; must run before it is imported"""
+    os.environ["OPENAI_BASE_URL"] = f"{mock_url}/v1"
+    os.environ["DEEPSEEK_BASE_URL"] = f"{mock_url}/v1"
+    os.environ["KIMI_BASE_URL"] = f"{mock_url}/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = mock_url
+    for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "DEEPSEEK_API_KEY", "KIMI_API_KEY"):
+        os.environ[name] = "mock-key"
+    # One client address generates all the load
+    os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+    os.environ["RATE_LIMIT_ROUTES"] = "{}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def scenario_request(name: str, rng: random.Random, index: int) -> RequestSpec:
+    """Method, path and JSON body for one request of a scenario"""
+    if name in ("generate_openai", "generate_anthropic"):
+        provider = name.split("_", 1)[1]
+        model = "gpt-3.5-turbo" if provider == "openai" else "claude-3-haiku-20240307"
+        return "POST", "/api/models/generate", {
+            "prompt": f"Summarize item {index} in two sentences.",
+            "provider": provider,
+            "model": model,
+            "max_tokens": 128,
+            "session_id": f"load-{index % 100}",
+        }
+    if name == "generate_cached":
+        return "POST", "/api/models/generate", {
+            "prompt": f"Summarize item {index} in two sentences.",
+            "system_prompt": CACHED_SYSTEM_PROMPT,
+            "provider": "anthropic",
+            "model": "claude-3-sonnet-20240229",
+            "max_tokens": 128,
+            "session_id": f"load-{index % 100}",
+        }
+    if name == "feedback_write":
+        return "POST", "/api/feedback", {
+            "session_id": f"load-{index % 100}",
+            "rating": rng.randint(1, 5),
+            "comments": "Load test feedback",
+            "response_id": f"response-{index}",
+        }
+    if name == "feedback_read":
+        return "GET", "/api/feedback?limit=100", None
+    if name == "analytics":
+        return "GET", "/api/analytics", None
+    if name == "analytics_approximate":
+        return "GET", "/api/analytics?approximate=true", None
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Send ``requests`` requests from ``concurrency`` concurrent clients"""
+    rng = random.Random(0)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    issued = 0
+    
+    async def worker():
+        nonlocal issued
+        while issued < requests:
+            index = issued
+            issued += 1
+            method, path, body = scenario_request(name, rng, index)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    ms: Callable[[float], float] = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 0.5)),
+        "p90_ms": ms(percentile(latencies, 0.9)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else 0.0,
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace, scenarios: List[str], mock_url: str) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(120.0)
+    
+    if args.target:
+        async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=timeout) as client:
+            for name in scenarios:
+                results[name] = await run_scenario(client, name, args.requests, args.concurrency)
+        return results
+    
+    configure_backend(mock_url)
+    from main import app
+    from app.schemas import FeedbackCreate
+    from app.services.feedback_service import feedback_service
+    
+    rng = random.Random(42)
+    for i in range(args.seed_feedback):
+        feedback_service.create_feedback(FeedbackCreate(
+            session_id=f"seed-{i % 200}", rating=rng.randint(1, 5), response_id=f"seed-{i}"
+        ))
+    
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(app=app, base_url="http://bench", limits=limits, timeout=timeout) as client:
+            for name in scenarios:
+                results[name] = await run_scenario(client, name, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients per scenario")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--seed-feedback", type=int, default=5000, help="Feedback records loaded before the run (in-process only)")
+    parser.add_argument("--target", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--mock-url", help="Use an already running mock provider")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="Print JSON results instead of a table")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    
+    mock_process = None
+    mock_url = args.mock_url
+    if mock_url is None and not args.target:
+        mock_process, mock_url = start_mock(args)
+    
+    try:
+        results = asyncio.run(run(args, scenarios, mock_url))
+    finally:
+        if mock_process is not None:
+            mock_process.terminate()
+            mock_process.wait()
+    
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "target": args.target or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed_feedback": args.seed_feedback,
+            "mock": {
+                "url": mock_url,
+                "latency_ms": args.latency_ms,
+                "latency_dist": args.latency_dist,
+                "latency_sigma": args.latency_sigma,
+                "tokens_per_second": args.tokens_per_second,
+                "completion_tokens": args.completion_tokens,
+                "error_rate": args.error_rate,
+                "error_status": args.error_status,
+            },
+        },
+        "scenarios": results,
+    }
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    
+    print(f"{'scenario':<22} {'rps':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        print(
+            f"{name:<22} {result['rps']:>9} {result['p50_ms']:>9} "
+            f"{result['p90_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Mock AI provider: OpenAI- and Anthropic-compatible endpoints for load tests
+
+Serves ``POST /v1/chat/completions`` (OpenAI, also used for Deepseek and
+Kimi) and ``POST /v1/messages`` (Anthropic), both with optional streaming.
+Latency, error rate and output size are configurable so the backend can be
+measured without calling (or paying for) a real provider. Prompt caching is
+simulated: a repeated system prompt of at least ``--cache-min-tokens`` is
+reported as cached (Anthropic only when marked with ``cache_control``) and
+its time to first token scaled by ``--cache-latency-factor``.
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:9100
+
+Usage:
+    python benchmarks/mock_provider.py [--port 9100] [--latency-ms 200]
+        [--latency-dist lognormal] [--error-rate 0.01] [--tokens-per-second 80]
+        [--cache-min-tokens 1024] [--cache-latency-factor 0.5]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock provider"""
+    latency_ms: float = 200.0
+    latency_dist: str = "lognormal"
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 0.0
+    completion_tokens: int = 64
+    error_rate: float = 0.0
+    error_status: int = 500
+    seed: int = 0
+    cache_min_tokens: int = 1024
+    cache_latency_factor: float = 0.5
+    counters: Dict[str, int] = field(default_factory=dict)
+    cached_prefixes: Set[str] = field(default_factory=set)
+
+
+def _sample_latency(config: MockConfig, rng: random.Random) -> float:
+    """Seconds before the first token, drawn from the configured distribution"""
+    mean = config.latency_ms / 1000.0
+    if config.latency_dist == "fixed" or mean <= 0:
+        return max(0.0, mean)
+    if config.latency_dist == "uniform":
+        return rng.uniform(0, 2 * mean)
+    if config.latency_dist == "exponential":
+        return rng.expovariate(1 / mean)
+    # Lognormal with the configured value as its median: a long right tail
+    return rng.lognormvariate(math.log(mean), config.latency_sigma)
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _system_text(system: Any) -> Tuple[str, bool]:
+    """Anthropic ``system`` as text, and whether any block is marked cacheable"""
+    if isinstance(system, list):
+        text = "".join(str(block.get("text", "")) for block in system if isinstance(block, dict))
+        marked = any(isinstance(block, dict) and block.get("cache_control") for block in system)
+        return text, marked
+    return str(system or ""), False
+
+
+def _completion_words(count: int) -> List[str]:
+    return [f"token{i}" for i in range(count)]
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """Build the mock provider application"""
+    app = FastAPI(title="Mock AI provider")
+    rng = random.Random(config.seed)
+    
+    def count(name: str) -> None:
+        config.counters[name] = config.counters.get(name, 0) + 1
+    
+    def should_fail() -> bool:
+        return config.error_rate > 0 and rng.random() < config.error_rate
+    
+    def prefix_cache(prefix: str) -> Tuple[int, int]:
+        """(cached tokens read, tokens written) for a cacheable prompt prefix"""
+        tokens = _count_tokens(prefix) if prefix else 0
+        if tokens < config.cache_min_tokens:
+            return 0, 0
+        if prefix in config.cached_prefixes:
+            count("cache_hits")
+            return tokens, 0
+        config.cached_prefixes.add(prefix)
+        count("cache_writes")
+        return 0, tokens
+    
+    def first_token_delay(cache_read: int) -> float:
+        delay = _sample_latency(config, rng)
+        return delay * config.cache_latency_factor if cache_read else delay
+    
+    async def token_stream(words: List[str]) -> AsyncIterator[str]:
+        delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+        for word in words:
+            if delay:
+                await asyncio.sleep(delay)
+            yield word + " "
+    
+    @app.get("/stats")
+    async def stats():
+        return config.counters
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        count("openai_requests")
+        messages = body.get("messages", [])
+        system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+        cache_read, _ = prefix_cache(str(system))
+        await asyncio.sleep(first_token_delay(cache_read))
+        if should_fail():
+            count("openai_errors")
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "Mock provider error", "type": "server_error", "code": None}}
+            )
+        
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        words = _completion_words(min(body.get("max_tokens") or config.completion_tokens, config.completion_tokens))
+        usage = {
+            "prompt_tokens": _count_tokens(prompt),
+            "completion_tokens": len(words),
+            "total_tokens": _count_tokens(prompt) + len(words),
+            "prompt_tokens_details": {"cached_tokens": cache_read},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "mock")
+        
+        if body.get("stream"):
+            async def events() -> AsyncIterator[str]:
+                async for piece in token_stream(words):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk",
+                        "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        
+        if config.tokens_per_second > 0:
+            await asyncio.sleep(len(words) / config.tokens_per_second)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+    
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        count("anthropic_requests")
+        system, marked = _system_text(body.get("system"))
+        cache_read, cache_write = prefix_cache(system) if marked else (0, 0)
+        await asyncio.sleep(first_token_delay(cache_read))
+        if should_fail():
+            count("anthropic_errors")
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"type": "error", "error": {"type": "api_error", "message": "Mock provider error"}}
+            )
+        
+        prompt = system + " ".join(
+            str(m.get("content", "")) for m in body.get("messages", [])
+        )
+        words = _completion_words(min(body.get("max_tokens") or config.completion_tokens, config.completion_tokens))
+        message_id = f"msg_{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "mock")
+        # Anthropic's input_tokens excludes the cached and newly cached prefix
+        usage = {
+            "input_tokens": max(1, _count_tokens(prompt) - cache_read - cache_write),
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_write,
+        }
+        
+        if body.get("stream"):
+            async def events() -> AsyncIterator[str]:
+                def event(name: str, data: Dict[str, Any]) -> str:
+                    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+                yield event("message_start", {"type": "message_start", "message": {
+                    "id": message_id, "type": "message", "role": "assistant", "content": [],
+                    "model": model, "stop_reason": None, "stop_sequence": None,
+                    "usage": {**usage, "output_tokens": 0},
+                }})
+                yield event("content_block_start", {
+                    "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+                })
+                async for piece in token_stream(words):
+                    yield event("content_block_delta", {
+                        "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}
+                    })
+                yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                yield event("message_delta", {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": len(words)},
+                })
+                yield event("message_stop", {"type": "message_stop"})
+            return StreamingResponse(events(), media_type="text/event-stream")
+        
+        if config.tokens_per_second > 0:
+            await asyncio.sleep(len(words) / config.tokens_per_second)
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": " ".join(words)}],
+            "model": model,
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {**usage, "output_tokens": len(words)},
+        }
+    
+    return app
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Mock behaviour flags, shared with the load test that spawns the mock"""
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean/median time to first token")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal shape (tail heaviness)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Output pacing; 0 returns at once")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="Tokens per completion (capped by max_tokens)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of failed calls (e.g. 429, 500)")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="Smallest system prompt treated as cacheable")
+    parser.add_argument(
+        "--cache-latency-factor", type=float, default=0.5, help="Time-to-first-token multiplier on cache hits"
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        cache_min_tokens=args.cache_min_tokens,
+        cache_latency_factor=args.cache_latency_factor,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    
+    import uvicorn
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
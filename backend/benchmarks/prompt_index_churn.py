@@ -0,0 +1,95 @@
+"""
+Benchmark: prompt index add and eviction latency at capacity
+
+Fills a PromptIndex to ``--entries`` prompts, then keeps adding so every
+add evicts the oldest entry, and reports add latency while filling and at
+capacity. A share of the prompts are near-copies of a few hot prompts
+(``--hot-share``), as when evaluation runs repeat the same question, which
+crowds their LSH band buckets: eviction has to find the evicted entry in
+each of them.
+
+Usage:
+    python benchmarks/prompt_index_churn.py [--entries 1000000] [--churn 200000] [--hot-share 0.3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas import ModelRequest, ModelResponse
+from app.services.prompt_index import PromptIndex, shingles, signature
+
+VOCABULARY = [f"w{i}" for i in range(5000)]
+TEMPLATE = "Rate the following answer for accuracy and helpfulness. Question: {q} Answer: {a}"
+
+
+def make_prompt(rng: random.Random) -> str:
+    question = " ".join(rng.choices(VOCABULARY, k=rng.randint(8, 20)))
+    answer = " ".join(rng.choices(VOCABULARY, k=rng.randint(20, 60)))
+    return TEMPLATE.format(q=question, a=answer)
+
+
+def perturb(prompt: str, rng: random.Random) -> str:
+    words = prompt.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def make_requests(count: int, hot: list, hot_share: float, rng: random.Random) -> list:
+    prompts = (
+        perturb(rng.choice(hot), rng) if rng.random() < hot_share else make_prompt(rng)
+        for _ in range(count)
+    )
+    return [ModelRequest(prompt=prompt, provider="openai", model="gpt-4") for prompt in prompts]
+
+
+def timed_adds(index: PromptIndex, requests: list, response: ModelResponse) -> list:
+    # Signatures are computed up front so only the index update is timed
+    signatures = [signature(shingles(request.prompt, index.shingle_size), index.num_perm) for request in requests]
+    latencies = []
+    for request, sig in zip(requests, signatures):
+        start = time.perf_counter()
+        index.add(request, response, sig=sig)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(label: str, latencies: list) -> None:
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    p999 = latencies[int(len(latencies) * 0.999)]
+    print(
+        f"{label:<18} {len(latencies):>9} adds  p50 {p50 * 1e6:7.1f} us  "
+        f"p99 {p99 * 1e6:7.1f} us  p99.9 {p999 * 1e6:8.1f} us  max {latencies[-1] * 1e3:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=1000000, help="Index capacity (max_entries)")
+    parser.add_argument("--churn", type=int, default=200000, help="Adds timed once the index is full")
+    parser.add_argument("--hot-share", type=float, default=0.3, help="Share of prompts copying a hot prompt")
+    parser.add_argument("--hot-prompts", type=int, default=5, help="Number of hot prompts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    index = PromptIndex(max_entries=args.entries)
+    response = ModelResponse(content="ok", model="gpt-4", provider="openai")
+    hot = [make_prompt(rng) for _ in range(args.hot_prompts)]
+    
+    fill = timed_adds(index, make_requests(args.entries, hot, args.hot_share, rng), response)
+    crowded = max(len(bucket) for bucket in index._buckets.values() if not isinstance(bucket, int))
+    print(f"indexed {len(index)} prompts, largest band bucket holds {crowded} entries")
+    summarize("fill (no evict)", fill)
+    
+    churn = timed_adds(index, make_requests(args.churn, hot, args.hot_share, rng), response)
+    summarize("at capacity", churn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: near-duplicate prompt index lookup latency and recall at scale
+
+Fills a PromptIndex with synthetic rater prompts built from a shared
+template (the hard case for LSH: many prompts look alike), then looks up
+perturbed copies of indexed prompts (recased, re-spaced, one or two words
+changed) and unrelated prompts. Reports lookup latency quantiles, memory,
+and how often a copy is matched given its exact shingle Jaccard similarity
+to the original: recall above the threshold, false matches below it.
+
+Usage:
+    python benchmarks/prompt_index_lookup.py [--entries 1000000] [--lookups 2000] [--threshold 0.8]
+"""
+import argparse
+import os
+import random
+import sys
+import resource
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas import ModelRequest, ModelResponse
+from app.services.prompt_index import PromptIndex, shingles
+
+VOCABULARY = [f"w{i}" for i in range(5000)]
+TEMPLATE = "Rate the following answer for accuracy and helpfulness. Question: {q} Answer: {a}"
+
+
+def make_prompt(rng: random.Random) -> str:
+    question = " ".join(rng.choices(VOCABULARY, k=rng.randint(8, 20)))
+    answer = " ".join(rng.choices(VOCABULARY, k=rng.randint(20, 60)))
+    return TEMPLATE.format(q=question, a=answer)
+
+
+def perturb(prompt: str, rng: random.Random) -> str:
+    """A near-duplicate: different casing and spacing, one or two words swapped"""
+    words = prompt.split()
+    for _ in range(rng.randint(1, 2)):
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return "  ".join(words).upper()
+
+
+def jaccard(a: str, b: str, size: int) -> float:
+    x, y = set(shingles(a, size)), set(shingles(b, size))
+    return len(x & y) / len(x | y)
+
+
+def request(prompt: str) -> ModelRequest:
+    return ModelRequest(prompt=prompt, provider="openai", model="gpt-4")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=1000000, help="Prompts indexed before measuring")
+    parser.add_argument("--lookups", type=int, default=2000, help="Lookups of each kind")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Similarity threshold")
+    parser.add_argument("--shingle-size", type=int, default=2)
+    parser.add_argument("--bands", type=int, default=24)
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    index = PromptIndex(
+        max_entries=args.entries, shingle_size=args.shingle_size, bands=args.bands, rows=args.rows
+    )
+    response = ModelResponse(content="ok", model="gpt-4", provider="openai")
+    
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    indexed = []
+    start = time.perf_counter()
+    for i in range(args.entries):
+        prompt = make_prompt(rng)
+        index.add(request(prompt), response)
+        if i < args.lookups:
+            indexed.append(prompt)
+    build = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    print(f"indexed {len(index)} prompts in {build:.1f}s, ~{memory / len(index):.0f} bytes/prompt (RSS)")
+    
+    copies = [perturb(prompt, rng) for prompt in indexed]
+    for kind, prompts in (
+        ("near-duplicate", copies),
+        ("unrelated", [make_prompt(rng) for _ in range(args.lookups)]),
+    ):
+        requests = [request(prompt) for prompt in prompts]
+        latencies = []
+        matches = []
+        for item in requests:
+            start = time.perf_counter()
+            match, _ = index.lookup(item, args.threshold)
+            latencies.append(time.perf_counter() - start)
+            matches.append(match is not None)
+        latencies.sort()
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+        print(
+            f"{kind:<15} matched {sum(matches) / len(matches):6.1%}  "
+            f"p50 {p50 * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us"
+        )
+        if kind == "near-duplicate":
+            similar = [jaccard(prompt, copy, args.shingle_size) >= args.threshold for prompt, copy in zip(indexed, copies)]
+            above = [matched for matched, is_similar in zip(matches, similar) if is_similar]
+            below = [matched for matched, is_similar in zip(matches, similar) if not is_similar]
+            print(
+                f"{'':<15} recall at Jaccard >= {args.threshold}: {sum(above) / max(len(above), 1):6.1%} "
+                f"({len(above)} copies), false matches below: {sum(below) / max(len(below), 1):6.1%}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: per-request overhead of request logging middleware
+
+Compares a bare app against the previous ``@app.middleware("http")``
+logger (BaseHTTPMiddleware with two synchronous log lines per request) and
+the pure-ASGI RequestLoggingMiddleware logging through a queue. Requests
+are driven straight through the ASGI interface so the numbers contain no
+client or network overhead; log output goes to /dev/null.
+
+Usage:
+    python benchmarks/request_logging_overhead.py [--requests 20000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from logging.handlers import QueueHandler, QueueListener
+import queue
+
+from app.middleware.request_logging import RequestLoggingMiddleware
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/ping",
+    "raw_path": b"/ping",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"bench")],
+    "client": ("127.0.0.1", 1234),
+    "server": ("bench", 80),
+}
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+    
+    return app
+
+
+def legacy_app(log: logging.Logger) -> FastAPI:
+    """The log_requests middleware as it was before the ASGI rewrite"""
+    app = make_app()
+    
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start_time = time.time()
+        log.info(f"Request: {request.method} {request.url.path}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        log.info(
+            f"Response: {request.method} {request.url.path} "
+            f"Status: {response.status_code} Time: {process_time:.3f}s"
+        )
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+    
+    return app
+
+
+async def drive(app, requests: int) -> float:
+    """Send requests through the ASGI app, returning microseconds per request"""
+    never = asyncio.Event()
+    
+    def make_receive():
+        sent = False
+        
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Like a client that stays connected
+            await never.wait()
+        
+        return receive
+    
+    async def send(message):
+        pass
+    
+    for _ in range(200):
+        await app(dict(SCOPE), make_receive(), send)
+    
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), make_receive(), send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def devnull_handler() -> logging.Handler:
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    return handler
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per scenario")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+    
+    # Old setup: synchronous stream handler on the calling thread
+    legacy_log = logging.getLogger("bench.legacy")
+    legacy_log.addHandler(devnull_handler())
+    legacy_log.setLevel(logging.INFO)
+    legacy_log.propagate = False
+    
+    # New setup: queue handler drained by a listener thread
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, devnull_handler())
+    listener.start()
+    access_log = logging.getLogger("app.access")
+    access_log.addHandler(QueueHandler(log_queue))
+    access_log.setLevel(logging.INFO)
+    access_log.propagate = False
+    
+    results = {"baseline_us": await drive(make_app(), args.requests)}
+    results["legacy_http_middleware_us"] = await drive(legacy_app(legacy_log), args.requests)
+    
+    for sample_rate in (1.0, 0.1):
+        app = make_app()
+        app.add_middleware(RequestLoggingMiddleware, sample_rate=sample_rate)
+        results[f"asgi_middleware_sample_{sample_rate}_us"] = await drive(app, args.requests)
+    listener.stop()
+    
+    results = {key: round(value, 2) for key, value in results.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    baseline = results["baseline_us"]
+    print(f"{'scenario':<32} {'us/request':>10} {'overhead us':>12}")
+    for key, value in results.items():
+        print(f"{key[:-3]:<32} {value:>10} {round(value - baseline, 2):>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
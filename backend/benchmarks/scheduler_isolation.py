@@ -0,0 +1,140 @@
+"""
+Benchmark: interactive generation latency while bulk work saturates a provider
+
+Simulates a provider that serves ``--provider-capacity`` calls at once at
+``--latency-ms`` each and slows down proportionally past that (as an
+overloaded upstream or a rate-limited key pool does). A flood of bulk
+generations from a few sessions keeps it saturated while interactive
+generations arrive at a steady rate; each interactive call's end-to-end
+latency (queueing included) is recorded. The run is repeated with every
+call going straight to the provider and with calls going through the
+ProviderScheduler, so the difference is the scheduler's isolation. A
+second line shows how bulk slots were split between a heavy session and
+light ones under fair sharing.
+
+Usage:
+    python benchmarks/scheduler_isolation.py [--bulk 2000] [--bulk-sessions 4]
+        [--interactive 200] [--interactive-rate 20] [--latency-ms 100]
+        [--provider-capacity 32] [--reserve 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.exceptions import GenerationPreemptedError, GenerationQueueFullError
+from app.schemas import Priority
+from app.services.generation_scheduler import ProviderScheduler
+
+
+class SimulatedProvider:
+    """Fixed latency up to ``capacity`` concurrent calls, proportionally slower beyond"""
+    
+    def __init__(self, capacity: int, latency: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.running = 0
+    
+    async def call(self) -> None:
+        self.running += 1
+        try:
+            await asyncio.sleep(self.latency * max(1.0, self.running / self.capacity))
+        finally:
+            self.running -= 1
+
+
+async def generate(
+    provider: SimulatedProvider,
+    scheduler: Optional[ProviderScheduler],
+    lane: Priority,
+    session: str
+) -> None:
+    if scheduler is None:
+        await provider.call()
+        return
+    await scheduler.acquire(lane, session, 500)
+    try:
+        await provider.call()
+    finally:
+        scheduler.release(lane)
+
+
+async def run(args: argparse.Namespace, scheduled: bool) -> None:
+    provider = SimulatedProvider(args.provider_capacity, args.latency_ms / 1000)
+    scheduler = ProviderScheduler(
+        "bench",
+        capacity=args.provider_capacity,
+        interactive_reserve=args.reserve,
+        max_queue=args.bulk + args.interactive
+    ) if scheduled else None
+    
+    completed: List[str] = []
+    
+    async def bulk(session: str) -> None:
+        try:
+            await generate(provider, scheduler, Priority.BULK, session)
+            completed.append(session)
+        except (GenerationQueueFullError, GenerationPreemptedError):
+            pass
+    
+    # The heavy session submits half the bulk work, the light ones share the rest
+    sessions = [
+        "heavy" if i % 2 == 0 or args.bulk_sessions == 1 else f"light-{i % (args.bulk_sessions - 1)}"
+        for i in range(args.bulk)
+    ]
+    bulk_tasks = [asyncio.create_task(bulk(session)) for session in sessions]
+    await asyncio.sleep(args.latency_ms / 1000)
+    
+    latencies = []
+    
+    async def interactive(i: int) -> None:
+        start = time.perf_counter()
+        await generate(provider, scheduler, Priority.INTERACTIVE, f"user-{i}")
+        latencies.append(time.perf_counter() - start)
+    
+    interactive_tasks = []
+    for i in range(args.interactive):
+        interactive_tasks.append(asyncio.create_task(interactive(i)))
+        await asyncio.sleep(1 / args.interactive_rate)
+    await asyncio.gather(*interactive_tasks)
+    # Bulk share while interactive traffic was flowing
+    share = Counter(completed)
+    for task in bulk_tasks:
+        task.cancel()
+    await asyncio.gather(*bulk_tasks, return_exceptions=True)
+    
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    label = "scheduled" if scheduled else "unscheduled"
+    print(
+        f"{label:<12} interactive p50 {p50 * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms  "
+        f"max {latencies[-1] * 1000:8.1f} ms  bulk completed {len(completed)}"
+    )
+    if scheduled and share:
+        heavy = share.pop("heavy", 0)
+        light = sum(share.values()) / max(len(share), 1)
+        print(f"{'':<12} bulk completed per session: heavy {heavy}, light (mean) {light:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bulk", type=int, default=2000, help="Bulk generations submitted at once")
+    parser.add_argument("--bulk-sessions", type=int, default=4, help="Sessions submitting bulk work")
+    parser.add_argument("--interactive", type=int, default=200, help="Interactive generations")
+    parser.add_argument("--interactive-rate", type=float, default=20.0, help="Interactive arrivals per second")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Provider latency when not overloaded")
+    parser.add_argument("--provider-capacity", type=int, default=32, help="Calls the provider serves at full speed")
+    parser.add_argument("--reserve", type=int, default=8, help="Slots reserved for interactive work")
+    args = parser.parse_args()
+    
+    for scheduled in (False, True):
+        asyncio.run(run(args, scheduled))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,27 @@ from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
 import logging
 import time
 
-from app.routers import models, feedback, analytics, settings
+from app.routers import models, jobs, feedback, analytics, settings, usage, metrics, profiles, conversations
 from app.config import settings as app_settings
+from app.lifecycle import lifecycle, lifespan
+from app.logging_config import setup_logging
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.request_logging import RequestLoggingMiddleware
+from app.middleware.server_timing import ServerTimingMiddleware
+from app.services.ai_service import ai_service
+from app.services.profiling_service import profiling_service
+from app.services.rate_limiter import rate_limiter
+from app.tracing import TimedRoute, trace_exporter
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -25,7 +35,17 @@ app = FastAPI(
     description="Human Feedback Reinforcement Learning Platform API",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
+)
+app.router.route_class = TimedRoute
+
+# Inbound rate limiting, inside CORS so 429s are readable by browsers
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=rate_limiter,
+    exempt_paths=("/", "/api/health", "/api/live", "/api/ready", "/api/metrics"),
+    trusted_proxy_hops=app_settings.TRUSTED_PROXY_HOPS
 )
 
 # Configure CORS
@@ -37,38 +57,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large bodies closest to the routes, so metrics and logs see the
+# compressed size
+if app_settings.COMPRESSION_MIN_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=app_settings.COMPRESSION_MIN_SIZE,
+        gzip_level=app_settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=app_settings.COMPRESSION_BROTLI_QUALITY
+    )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all requests and responses"""
-    start_time = time.time()
-    
-    # Log request
-    logger.info(f"Request: {request.method} {request.url.path}")
-    
-    try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        # Log response
-        logger.info(
-            f"Response: {request.method} {request.url.path} "
-            f"Status: {response.status_code} Time: {process_time:.3f}s"
-        )
-        
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
-    except Exception as e:
-        logger.error(f"Request failed: {request.method} {request.url.path} Error: {str(e)}")
-        raise
+# Profile flagged or sampled requests; not installed at all when disabled
+if profiling_service.enabled:
+    app.add_middleware(ProfilingMiddleware, service=profiling_service)
+
+# Per-phase Server-Timing (and trace export) around everything but metrics and logs
+if app_settings.SERVER_TIMING_ENABLED or trace_exporter is not None:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        allow_origins=app_settings.CORS_ORIGINS,
+        exporter=trace_exporter,
+        emit_header=app_settings.SERVER_TIMING_ENABLED
+    )
+
+# Request metrics, then timing and access logging (added last so it wraps everything)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLoggingMiddleware, sample_rate=app_settings.LOG_SAMPLE_RATE)
 
 
 # Include routers
 app.include_router(models.router, prefix="/api/models", tags=["models"])
+app.include_router(jobs.router, prefix="/api/models/jobs", tags=["jobs"])
 app.include_router(feedback.router, prefix="/api/feedback", tags=["feedback"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
+app.include_router(usage.router, prefix="/api/usage", tags=["usage"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(profiles.router, prefix="/api/profiles", tags=["profiles"])
+app.include_router(conversations.router, prefix="/api/conversations", tags=["conversations"])
 
 
 @app.get("/")
@@ -91,6 +117,30 @@ async def health_check():
     }
 
 
+@app.get("/api/live")
+async def liveness_check():
+    """Liveness probe: the process is up and its event loop is responsive"""
+    return {"status": "alive"}
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: startup finished and the server is not draining"""
+    if not lifecycle.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "draining" if lifecycle.draining else "starting",
+                "in_flight": ai_service.in_flight
+            }
+        )
+    return {
+        "status": "ready",
+        "uptime": round(time.time() - lifecycle.started_at, 3),
+        "in_flight": ai_service.in_flight
+    }
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors"""
@@ -98,7 +148,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
-            "detail": exc.errors(),
+            # Errors raised by validators carry the exception object in "ctx"
+            "detail": jsonable_encoder(exc.errors()),
             "message": "Invalid request data"
         }
     )
@@ -123,6 +174,8 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        # Let open requests (and their provider calls) finish on SIGTERM
+        timeout_graceful_shutdown=int(app_settings.SHUTDOWN_DRAIN_TIMEOUT)
     )
 
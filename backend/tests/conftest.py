@@ -0,0 +1,52 @@
+"""
+Shared fixtures; settings are fixed here before any app module is imported
+"""
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="hfrl-tests-")
+os.environ.update(
+    RATE_LIMIT_PER_MINUTE="0",
+    RATE_LIMIT_ROUTES="{}",
+    JOBS_DB_PATH=os.path.join(_scratch, "jobs.db"),
+    CONVERSATION_DB_PATH="",
+    FEEDBACK_RETENTION_DAYS="0",
+    FEEDBACK_ARCHIVE_PATH="",
+    LEADERBOARD_REFIT_INTERVAL="0",
+    LOG_LEVEL="WARNING",
+    # Small enough that analytics responses get compressed
+    COMPRESSION_MIN_SIZE="256",
+)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.analytics_service import analytics_service
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.search_index import search_index
+from app.services.sketch_index import feedback_rollups, sketch_index
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client for the app, started once with its lifespan"""
+    from main import app
+    
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def empty_feedback_store():
+    """Start every test with no feedback, no rollups and cold caches"""
+    yield
+    feedback_storage.clear()
+    with feedback_rollups.lock:
+        feedback_rollups._buckets.clear()
+        feedback_rollups.records = 0
+    # Writes behind the services' backs: invalidate everything derived
+    feedback_service.write_generation += 1
+    feedback_service.delete_generation += 1
+    analytics_service.cache.clear()
+    sketch_index._tracking = False
+    search_index.rebuild()
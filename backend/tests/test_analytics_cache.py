@@ -0,0 +1,81 @@
+"""
+Analytics caching: ETags, 304 revalidation and invalidation on writes
+"""
+from datetime import datetime, timedelta
+
+from app.services.analytics_service import analytics_service
+
+
+def test_matching_etag_gets_empty_304(client):
+    client.post("/api/feedback", json={"rating": 4})
+    response = client.get("/api/analytics")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    
+    revalidated = client.get("/api/analytics", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+
+def test_weak_and_listed_etags_match(client):
+    client.post("/api/feedback", json={"rating": 4})
+    etag = client.get("/api/analytics").headers["etag"]
+    
+    response = client.get("/api/analytics", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+
+def test_repeat_request_is_served_from_cache(client):
+    client.post("/api/feedback", json={"rating": 3})
+    client.get("/api/analytics")
+    hits = analytics_service.cache.hits
+    
+    client.get("/api/analytics")
+    assert analytics_service.cache.hits == hits + 1
+
+
+def test_new_feedback_invalidates_open_window(client):
+    client.post("/api/feedback", json={"rating": 5})
+    first = client.get("/api/analytics")
+    
+    client.post("/api/feedback", json={"rating": 1})
+    second = client.get("/api/analytics", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert second.json()["total_feedback"] == first.json()["total_feedback"] + 1
+    assert second.headers["cache-control"] == "private, no-cache"
+
+
+def test_closed_window_survives_new_feedback_but_not_deletes(client):
+    feedback_id = client.post("/api/feedback", json={"rating": 2}).json()["id"]
+    params = {"end_date": (datetime.now() - timedelta(days=1)).isoformat()}
+    first = client.get("/api/analytics", params=params)
+    assert first.headers["cache-control"].startswith("private, max-age=")
+    
+    client.post("/api/feedback", json={"rating": 5})
+    hits = analytics_service.cache.hits
+    still = client.get("/api/analytics", params=params, headers={"If-None-Match": first.headers["etag"]})
+    assert still.status_code == 304
+    assert analytics_service.cache.hits == hits + 1
+    
+    client.delete(f"/api/feedback/{feedback_id}")
+    misses = analytics_service.cache.misses
+    client.get("/api/analytics", params=params)
+    assert analytics_service.cache.misses == misses + 1
+
+
+def test_compressed_response_has_its_own_etag(client):
+    client.post("/api/feedback", json={"rating": 4})
+    plain = client.get("/api/analytics", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/analytics", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    
+    for response in (plain, compressed):
+        revalidated = client.get(
+            "/api/analytics",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == response.headers["etag"]
@@ -0,0 +1,114 @@
+"""
+Generation scheduler: lane priority, the interactive reserve and fair share
+"""
+import asyncio
+
+import pytest
+
+from app.exceptions import GenerationPreemptedError, GenerationQueueFullError
+from app.schemas import Priority
+from app.services.generation_scheduler import ProviderScheduler
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _grant_order(scheduler, arrivals):
+    """
+    Queue calls behind one held slot, then release slots one at a time
+    
+    Returns:
+        Labels of the queued calls in the order they got a slot
+    """
+    order = []
+    await scheduler.acquire(Priority.INTERACTIVE, "holder", 1)
+    
+    async def call(label, lane, flow, cost):
+        await scheduler.acquire(lane, flow, cost)
+        order.append(label)
+    
+    tasks = []
+    for label, lane, flow, cost in arrivals:
+        tasks.append(asyncio.create_task(call(label, lane, flow, cost)))
+        await _settle()
+    scheduler.release(Priority.INTERACTIVE)
+    while len(order) < len(arrivals):
+        await _settle()
+        lane = next(lane for label, lane, *_ in arrivals if label == order[-1])
+        scheduler.release(lane)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_interactive_overtakes_queued_bulk():
+    scheduler = ProviderScheduler("openai", capacity=1, interactive_reserve=0)
+    arrivals = [
+        ("bulk-1", Priority.BULK, "batch", 100),
+        ("bulk-2", Priority.BULK, "batch", 100),
+        ("chat", Priority.INTERACTIVE, "user", 100),
+    ]
+    order = asyncio.run(_grant_order(scheduler, arrivals))
+    assert order == ["chat", "bulk-1", "bulk-2"]
+
+
+def test_reserved_slots_are_never_given_to_bulk():
+    async def scenario():
+        scheduler = ProviderScheduler("openai", capacity=3, interactive_reserve=1)
+        await scheduler.acquire(Priority.BULK, "batch", 100)
+        await scheduler.acquire(Priority.BULK, "batch", 100)
+        waiting = asyncio.create_task(scheduler.acquire(Priority.BULK, "batch", 100))
+        await _settle()
+        assert not waiting.done()
+        # The free slot is the interactive reserve
+        assert await scheduler.acquire(Priority.INTERACTIVE, "user", 100) == 0.0
+        scheduler.release(Priority.BULK)
+        await waiting
+        assert scheduler.status()["bulk"] == {"queued": 0, "running": 2}
+    
+    asyncio.run(scenario())
+
+
+def test_sessions_share_a_lane_fairly():
+    scheduler = ProviderScheduler("openai", capacity=1, interactive_reserve=0)
+    # One session floods the lane before another shows up
+    arrivals = [(f"flood-{i}", Priority.BULK, "flood", 100) for i in range(10)]
+    arrivals += [(f"other-{i}", Priority.BULK, "other", 100) for i in range(3)]
+    order = asyncio.run(_grant_order(scheduler, arrivals))
+    # The late session waits for at most one flood call per call of its own
+    for i in range(3):
+        assert order.index(f"other-{i}") <= 2 * i + 2
+    # Each session's calls keep their own order
+    assert [label for label in order if label.startswith("flood")] == [f"flood-{i}" for i in range(10)]
+
+
+def test_weights_skew_the_share():
+    scheduler = ProviderScheduler("openai", capacity=1, interactive_reserve=0, weights={"heavy": 3.0})
+    arrivals = [(f"heavy-{i}", Priority.BULK, "heavy", 100) for i in range(6)]
+    arrivals += [(f"light-{i}", Priority.BULK, "light", 100) for i in range(6)]
+    order = asyncio.run(_grant_order(scheduler, arrivals))
+    first_eight = order[:8]
+    assert sum(label.startswith("heavy") for label in first_eight) == 6
+
+
+def test_full_queue_preempts_newest_bulk_for_interactive():
+    async def scenario():
+        scheduler = ProviderScheduler("openai", capacity=1, interactive_reserve=0, max_queue=2)
+        await scheduler.acquire(Priority.INTERACTIVE, "holder", 1)
+        older = asyncio.create_task(scheduler.acquire(Priority.BULK, "batch", 100))
+        newer = asyncio.create_task(scheduler.acquire(Priority.BULK, "batch", 100))
+        await _settle()
+        with pytest.raises(GenerationQueueFullError):
+            await scheduler.acquire(Priority.BULK, "batch", 100)
+        chat = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE, "user", 100))
+        await _settle()
+        with pytest.raises(GenerationPreemptedError):
+            await newer
+        assert not older.done()
+        scheduler.release(Priority.INTERACTIVE)
+        await chat
+        older.cancel()
+        await asyncio.gather(older, return_exceptions=True)
+    
+    asyncio.run(scenario())
@@ -0,0 +1,124 @@
+"""
+Generation job queue: lease expiry and idempotency-key replay
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.exceptions import JobConflictError
+from app.schemas import JobStatus, ModelRequest
+from app.services.job_queue import JobQueue
+
+
+def _request(prompt="Rate this answer"):
+    return ModelRequest(prompt=prompt, provider="openai", model="gpt-4", max_tokens=50)
+
+
+def _run(tmp_path, scenario, **options):
+    """Run a scenario against a queue with no workers, so claims are made by hand"""
+    async def run():
+        queue = JobQueue(db_path=str(tmp_path / "jobs.db"), workers=0, **options)
+        await queue.start()
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.stop()
+    return asyncio.run(run())
+
+
+def test_claimed_job_is_leased_until_its_timeout(tmp_path):
+    async def scenario(queue):
+        job = await queue.submit(_request())
+        now = time.time()
+        claimed = await queue._call(queue._claim, now)
+        assert claimed.job_id == job.job_id
+        assert claimed.status == JobStatus.RUNNING
+        assert claimed.attempts == 1
+        # Nobody else can take it while the lease holds
+        assert await queue._call(queue._claim, now + 59) is None
+        # Once it lapses, another worker takes the job over
+        retaken = await queue._call(queue._claim, now + 61)
+        assert retaken.job_id == job.job_id
+        assert retaken.attempts == 2
+    
+    _run(tmp_path, scenario, run_timeout=60.0)
+
+
+def test_lapsed_lease_on_last_attempt_fails_the_job(tmp_path):
+    async def scenario(queue):
+        job = await queue.submit(_request())
+        now = time.time()
+        await queue._call(queue._claim, now)
+        await queue._call(queue._claim, now + 11)
+        abandoned = await queue._call(queue._claim, now + 22)
+        assert abandoned.status == JobStatus.FAILED
+        stored = await queue.get(job.job_id)
+        assert stored.status == JobStatus.FAILED
+        assert stored.error == "Worker stopped responding"
+        assert await queue._call(queue._claim, now + 33) is None
+    
+    _run(tmp_path, scenario, run_timeout=10.0, max_attempts=2)
+
+
+def test_requeued_job_waits_for_its_backoff(tmp_path):
+    async def scenario(queue):
+        job = await queue.submit(_request())
+        now = time.time()
+        await queue._call(queue._claim, now)
+        await queue._call(queue._requeue, job.job_id, 1, now + 30, "Provider timed out")
+        assert await queue._call(queue._claim, now + 29) is None
+        retried = await queue._call(queue._claim, now + 31)
+        assert retried.attempts == 2
+        assert retried.error == "Provider timed out"
+    
+    _run(tmp_path, scenario)
+
+
+def test_idempotency_key_replays_the_original_job(tmp_path):
+    async def scenario(queue):
+        first = await queue.submit(_request(), idempotency_key="batch-1/item-7")
+        again = await queue.submit(_request(), idempotency_key="batch-1/item-7")
+        assert again.job_id == first.job_id
+        other = await queue.submit(_request(), idempotency_key="batch-1/item-8")
+        assert other.job_id != first.job_id
+        unkeyed = [await queue.submit(_request()) for _ in range(2)]
+        assert unkeyed[0].job_id != unkeyed[1].job_id
+    
+    _run(tmp_path, scenario)
+
+
+def test_idempotency_key_replays_a_finished_result(tmp_path):
+    async def scenario(queue):
+        job = await queue.submit(_request(), idempotency_key="once")
+        now = time.time()
+        await queue._call(queue._claim, now)
+        await queue._call(queue._finish, job.job_id, JobStatus.FAILED, None, "Invalid request", now)
+        replayed = await queue.submit(_request(), idempotency_key="once")
+        assert replayed.job_id == job.job_id
+        assert replayed.status == JobStatus.FAILED
+    
+    _run(tmp_path, scenario)
+
+
+def test_idempotency_key_reused_for_another_request_conflicts(tmp_path):
+    async def scenario(queue):
+        await queue.submit(_request("first prompt"), idempotency_key="shared")
+        with pytest.raises(JobConflictError):
+            await queue.submit(_request("second prompt"), idempotency_key="shared")
+    
+    _run(tmp_path, scenario)
+
+
+def test_expired_job_frees_its_idempotency_key(tmp_path):
+    async def scenario(queue):
+        job = await queue.submit(_request(), idempotency_key="reusable")
+        now = time.time()
+        await queue._call(queue._claim, now)
+        await queue._call(queue._finish, job.job_id, JobStatus.FAILED, None, "Invalid request", now - 10)
+        assert await queue.get(job.job_id) is None
+        fresh = await queue.submit(_request("a new prompt"), idempotency_key="reusable")
+        assert fresh.job_id != job.job_id
+        assert fresh.status == JobStatus.QUEUED
+    
+    _run(tmp_path, scenario, result_ttl=5.0)
@@ -0,0 +1,104 @@
+"""
+GCRA rate limiting: admission, route groups and client identification
+"""
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.services.rate_limiter import InMemoryRateLimitBackend, RateLimiter
+
+
+def _limiter(default_limit=60, route_limits=None):
+    return RateLimiter(InMemoryRateLimitBackend(), default_limit=default_limit, route_limits=route_limits)
+
+
+def _decisions(limiter, group, limit, client, count):
+    async def run():
+        return [await limiter.check(group, limit, client) for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_admits_up_to_the_limit_then_rejects():
+    decisions = _decisions(_limiter(), "/api/feedback", 5, "ip:1.2.3.4", 6)
+    assert [decision.allowed for decision in decisions] == [True] * 5 + [False]
+    assert [decision.remaining for decision in decisions[:5]] == [4, 3, 2, 1, 0]
+    rejected = decisions[-1]
+    assert rejected.remaining == 0
+    # One request's worth of allowance (60s / 5) comes back after 12s
+    assert 11.0 < rejected.retry_after <= 12.0
+
+
+def test_clients_and_groups_have_separate_allowances():
+    limiter = _limiter()
+    assert not _decisions(limiter, "/api/feedback", 2, "ip:a", 3)[-1].allowed
+    assert _decisions(limiter, "/api/feedback", 2, "ip:b", 1)[0].allowed
+    assert _decisions(limiter, "/api/analytics", 2, "ip:a", 1)[0].allowed
+
+
+def test_longest_configured_prefix_wins():
+    limiter = _limiter(route_limits={"/api/models": 30, "/api/models/generate": 20})
+    assert limiter.resolve("/api/models/generate") == ("/api/models/generate", 20)
+    assert limiter.resolve("/api/models/generate/extra") == ("/api/models/generate", 20)
+    assert limiter.resolve("/api/models/list") == ("/api/models", 30)
+    # A shared prefix that isn't a path segment boundary doesn't match
+    assert limiter.resolve("/api/models/generated") == ("/api/models", 30)
+
+
+def test_unconfigured_paths_group_by_first_two_segments():
+    limiter = _limiter(default_limit=60)
+    assert limiter.resolve("/api/feedback/123") == ("/api/feedback", 60)
+    assert limiter.resolve("/api/feedback") == ("/api/feedback", 60)
+    assert not limiter.is_configured("/api/feedback")
+
+
+def test_jobs_are_held_to_the_generate_limit():
+    limiter = _limiter(route_limits=settings.model_fields["RATE_LIMIT_ROUTES"].default)
+    group, limit = limiter.resolve("/api/models/jobs")
+    assert group == "/api/models/jobs"
+    assert limit == limiter.resolve("/api/models/generate")[1]
+    assert limiter.resolve("/api/models/jobs/abc/stream")[0] == "/api/models/jobs"
+
+
+def _app(limit, trusted_proxy_hops=0):
+    app = FastAPI()
+    
+    @app.get("/api/things")
+    async def things():
+        return {"ok": True}
+    
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=_limiter(default_limit=limit),
+        trusted_proxy_hops=trusted_proxy_hops
+    )
+    return TestClient(app)
+
+
+def test_rejection_is_a_429_with_headers():
+    client = _app(limit=1)
+    admitted = client.get("/api/things")
+    assert admitted.status_code == 200
+    assert admitted.headers["ratelimit-limit"] == "1"
+    assert admitted.headers["ratelimit-remaining"] == "0"
+    
+    rejected = client.get("/api/things")
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+    assert rejected.json()["detail"] == "Rate limit exceeded"
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    client = _app(limit=1)
+    assert client.get("/api/things", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 200
+    assert client.get("/api/things", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 429
+
+
+def test_forwarded_for_is_read_from_the_right():
+    client = _app(limit=1, trusted_proxy_hops=1)
+    assert client.get("/api/things", headers={"X-Forwarded-For": "6.6.6.6, 10.0.0.1"}).status_code == 200
+    # A different spoofed entry on the left doesn't buy a fresh allowance
+    assert client.get("/api/things", headers={"X-Forwarded-For": "7.7.7.7, 10.0.0.1"}).status_code == 429
+    assert client.get("/api/things", headers={"X-Forwarded-For": "6.6.6.6, 10.0.0.2"}).status_code == 200
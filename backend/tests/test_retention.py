@@ -0,0 +1,85 @@
+"""
+Retention compaction folds old records into rollups without changing analytics
+"""
+import gzip
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from app.services.feedback_service import feedback_storage
+from app.services.retention_service import RetentionService
+
+TOTALS = (
+    "total_feedback",
+    "average_quality",
+    "feedback_distribution",
+    "quality_over_time",
+    "total_sessions",
+    "improvement_rate",
+)
+
+
+def _store_history(now, days=60, per_day=5):
+    """Put feedback straight into the store, backdated one batch per day"""
+    rng = random.Random(1)
+    for day in range(days, 0, -1):
+        for _ in range(per_day):
+            feedback_id = str(uuid.uuid4())
+            timestamp = now - timedelta(days=day, minutes=rng.randint(0, 600))
+            feedback_storage[feedback_id] = {
+                "id": feedback_id,
+                "session_id": f"session-{rng.randint(0, 20)}",
+                "rating": rng.randint(1, 5),
+                "comments": "older feedback",
+                "response_id": None,
+                "inline_feedback": [],
+                "learning_rate": 0.001,
+                "provider": None,
+                "model": None,
+                "compared_with": None,
+                "preference": None,
+                "timestamp": timestamp,
+                "created_at": timestamp,
+            }
+
+
+def _totals(client, **params):
+    analytics = client.get("/api/analytics", params=params).json()
+    return {key: analytics[key] for key in TOTALS}
+
+
+def test_compaction_keeps_analytics_totals(client, tmp_path):
+    now = datetime.now()
+    _store_history(now)
+    for rating in (4, 5):
+        assert client.post("/api/feedback", json={"rating": rating, "session_id": "recent"}).status_code == 200
+    # Day-aligned, so rolled-up days fall wholly inside or outside it
+    since = (now - timedelta(days=45)).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    before = [_totals(client), _totals(client, approximate=True), _totals(client, start_date=since)]
+    
+    archive = tmp_path / "feedback.jsonl.gz"
+    retention = RetentionService(retention_days=30, archive_path=str(archive), batch_size=7)
+    compacted = client.portal.call(retention.compact, now)
+    # Days 30 through 60 back, each at least a minute past the cutoff
+    assert compacted == 31 * 5
+    assert len(feedback_storage) == 29 * 5 + 2
+    
+    after = [_totals(client), _totals(client, approximate=True), _totals(client, start_date=since)]
+    assert after == before
+    assert after[0]["total_feedback"] == 60 * 5 + 2
+    
+    with gzip.open(archive, "rt") as lines:
+        archived = [json.loads(line) for line in lines]
+    assert len(archived) == compacted
+    assert all(datetime.fromisoformat(record["timestamp"]) < now - timedelta(days=30) for record in archived)
+
+
+def test_nothing_to_compact_inside_the_retention_period(client):
+    now = datetime.now()
+    _store_history(now, days=10)
+    before = _totals(client)
+    assert client.portal.call(RetentionService(retention_days=30).compact, now) == 0
+    assert client.portal.call(RetentionService(retention_days=0).compact, now) == 0
+    assert len(feedback_storage) == 10 * 5
+    assert _totals(client) == before
@@ -0,0 +1,118 @@
+"""
+Comment search: BM25 ranking and pagination against a brute-force reference
+"""
+import math
+import random
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from app.schemas import FeedbackCreate
+from app.services.feedback_service import feedback_service, feedback_storage
+from app.services.search_index import search_index, tokenize
+
+# Word i shows up with weight 1 / (i + 1), so a few terms are in most
+# comments and the tail is rare
+WORDS = [f"word{i}" for i in range(200)]
+WEIGHTS = [1 / (i + 1) for i in range(len(WORDS))]
+
+
+@pytest.fixture
+def comments():
+    rng = random.Random(3)
+    for i in range(600):
+        text = " ".join(rng.choices(WORDS, WEIGHTS, k=rng.randint(3, 25)))
+        feedback_service.create_feedback(FeedbackCreate(
+            rating=rng.randint(1, 5),
+            session_id=f"session-{i % 7}",
+            comments=text
+        ))
+
+
+def _reference(query, k1=1.2, b=0.75, accept=lambda feedback_data: True):
+    """Score every comment directly from the BM25 formula, best first"""
+    documents = {}
+    for feedback_data in feedback_storage.values():
+        tokens = tokenize(feedback_data["comments"])
+        if tokens:
+            documents[feedback_data["id"]] = (Counter(tokens), len(tokens), feedback_data)
+    average_length = sum(length for _, length, _ in documents.values()) / len(documents)
+    scores = {}
+    for term in set(tokenize(query)):
+        frequency = sum(1 for counts, _, _ in documents.values() if term in counts)
+        idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+        for feedback_id, (counts, length, feedback_data) in documents.items():
+            tf = counts.get(term, 0)
+            if tf and accept(feedback_data):
+                norm = tf + k1 * (1 - b + b * length / average_length)
+                scores[feedback_id] = scores.get(feedback_id, 0.0) + idf * (k1 + 1) * tf / norm
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _assert_page_matches(page, has_more, reference, offset, limit):
+    expected = reference[offset:offset + limit]
+    assert [score for score, _ in page] == pytest.approx([score for _, score in expected], abs=1e-4)
+    scores = dict(reference)
+    for score, feedback_data in page:
+        assert score == pytest.approx(scores[feedback_data["id"]], abs=1e-4)
+    assert has_more == (len(reference) > offset + limit)
+
+
+@pytest.mark.parametrize("query", [
+    "word0",
+    "word3 word40",
+    # Rare terms fill the top few first, so the common ones are pruned to
+    # rescoring candidates only
+    "word150 word170 word0 word1",
+    "word199 word198 word197 word0",
+])
+@pytest.mark.parametrize("limit", [1, 3, 10])
+def test_ranking_matches_brute_force(comments, query, limit):
+    reference = _reference(query)
+    assert reference
+    for offset in (0, limit, 5 * limit):
+        page, has_more = search_index.search(query, limit=limit, offset=offset)
+        _assert_page_matches(page, has_more, reference, offset, limit)
+
+
+def test_paging_walks_every_match_once(comments):
+    query = "word2 word60"
+    reference = _reference(query)
+    seen, offset = [], 0
+    while True:
+        page, has_more = search_index.search(query, limit=7, offset=offset)
+        seen.extend(feedback_data["id"] for _, feedback_data in page)
+        offset += 7
+        if not has_more:
+            break
+    assert sorted(seen) == sorted(feedback_id for feedback_id, _ in reference)
+
+
+def test_filters_match_brute_force(comments):
+    query = "word120 word5 word0"
+    
+    def accept(feedback_data):
+        return feedback_data["session_id"] == "session-2" and 2 <= feedback_data["rating"] <= 4
+    
+    reference = _reference(query, accept=accept)
+    page, has_more = search_index.search(query, limit=5, session_id="session-2", min_rating=2, max_rating=4)
+    _assert_page_matches(page, has_more, reference, 0, 5)
+    assert all(feedback_data["session_id"] == "session-2" for _, feedback_data in page)
+    
+    page, has_more = search_index.search(query, limit=5, end_date=datetime(2000, 1, 1))
+    assert page == [] and not has_more
+
+
+def test_deleted_comments_leave_the_index(comments):
+    page, _ = search_index.search("word0", limit=1)
+    top = page[0][1]
+    feedback_service.delete_feedback(top["id"])
+    page, has_more = search_index.search("word0", limit=50)
+    assert top["id"] not in {feedback_data["id"] for _, feedback_data in page}
+    _assert_page_matches(page, has_more, _reference("word0"), 0, 50)
+
+
+def test_stopwords_and_unknown_terms_match_nothing(comments):
+    assert search_index.search("the and of") == ([], False)
+    assert search_index.search("notaword") == ([], False)
@@ -0,0 +1,82 @@
+"""
+HyperLogLog and KLL estimates stay within their stated error bounds
+"""
+import bisect
+import random
+
+import pytest
+
+from app.services.sketches import HyperLogLog, KLLSketch
+
+FRACTIONS = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+@pytest.mark.parametrize("count", [100, 5000, 100000])
+def test_hyperloglog_estimate_within_error(count):
+    sketch = HyperLogLog()
+    for i in range(count):
+        sketch.add(f"session-{i}")
+    # Three standard errors: fails by chance well under 1% of the time
+    assert abs(sketch.estimate() - count) <= 3 * sketch.relative_error * count
+
+
+def test_hyperloglog_ignores_repeats():
+    sketch = HyperLogLog()
+    for _ in range(10):
+        for i in range(1000):
+            sketch.add(f"session-{i}")
+    assert abs(sketch.estimate() - 1000) <= 3 * sketch.relative_error * 1000
+
+
+def test_hyperloglog_merge_counts_union():
+    left, right = HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        left.add(f"session-{i}")
+    for i in range(20000, 50000):
+        right.add(f"session-{i}")
+    left.merge(right)
+    assert abs(left.estimate() - 50000) <= 3 * left.relative_error * 50000
+
+
+def test_hyperloglog_refuses_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=10).merge(HyperLogLog(precision=12))
+
+
+def _rank_errors(sketch, values):
+    ordered = sorted(values)
+    errors = []
+    for fraction, estimate in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+        # Rank range of the estimate, which may repeat in the data
+        low = bisect.bisect_left(ordered, estimate) / len(ordered)
+        high = bisect.bisect_right(ordered, estimate) / len(ordered)
+        errors.append(0.0 if low <= fraction <= high else min(abs(fraction - low), abs(fraction - high)))
+    return errors
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_kll_quantiles_within_rank_error(seed):
+    rng = random.Random(seed)
+    values = [rng.lognormvariate(0, 1) for _ in range(100000)]
+    sketch = KLLSketch(seed=seed)
+    sketch.update(values)
+    assert max(_rank_errors(sketch, values)) <= sketch.rank_error
+
+
+def test_kll_merged_shards_within_rank_error():
+    rng = random.Random(7)
+    shards = [[rng.random() * 100 for _ in range(rng.randint(1000, 20000))] for _ in range(8)]
+    merged = KLLSketch(seed=0)
+    for i, shard in enumerate(shards):
+        sketch = KLLSketch(seed=i + 1)
+        sketch.update(shard)
+        merged.merge(sketch)
+    values = [value for shard in shards for value in shard]
+    assert max(_rank_errors(merged, values)) <= merged.rank_error
+
+
+def test_kll_small_inputs_are_exact():
+    sketch = KLLSketch()
+    sketch.update([5, 1, 4, 2, 3])
+    assert sketch.quantiles([0.0, 0.5, 1.0]) == [1, 3, 5]
+    assert KLLSketch().quantiles([0.5]) == [None]